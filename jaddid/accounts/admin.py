@@ -1,11 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
+from jaddid.admin import LargeTableAdminMixin
 from .models import User, Profile
 # Register your models here.
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(LargeTableAdminMixin, BaseUserAdmin):
     """custom user admin"""
     list_display=[
         'email', 
@@ -70,6 +71,12 @@ class UserAdmin(BaseUserAdmin):
     
     readonly_fields = ['date_joined', 'created_at', 'updated_at', 'last_login']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            # The add form bypasses create_user
+            Profile.objects.get_or_create(user=obj)
+
     class ProfileInline(admin.StackedInline):
         """Inline Profile in User Admin"""
         model = Profile
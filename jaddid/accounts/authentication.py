@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .tokens import TOKEN_VERSION_CLAIM, get_token_version
+
+
+class TokenClaimsUser(SimpleLazyObject):
+    """
+    request.user built from access token claims.
+
+    pk/id, role, is_staff and is_active are answered from the token. Any
+    other attribute, or using the object in an ORM query or comparison,
+    loads the User row once.
+    """
+
+    def __init__(self, func, token=None):
+        self.__dict__['_token'] = token
+        super().__init__(func)
+
+    def _claim(self, name):
+        token = self.__dict__['_token']
+        if self._wrapped is empty and token is not None and name in token:
+            return token[name]
+        if self._wrapped is empty:
+            self._setup()
+        return getattr(self._wrapped, name)
+
+    @property
+    def pk(self):
+        if self._wrapped is empty and self.__dict__['_token'] is not None:
+            return User._meta.pk.to_python(self.__dict__['_token'][api_settings.USER_ID_CLAIM])
+        if self._wrapped is empty:
+            self._setup()
+        return self._wrapped.pk
+
+    id = pk
+
+    @property
+    def role(self):
+        return self._claim('role')
+
+    @property
+    def is_staff(self):
+        return self._claim('is_staff')
+
+    @property
+    def is_active(self):
+        return self._claim('is_active')
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def __bool__(self):
+        return True
+
+
+class _ValidatedVersions:
+    """Small thread-safe LRU of (user id, token version) pairs checked recently"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            expires_at = self.entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return False
+            self.entries.move_to_end(key)
+            return True
+
+    def add(self, key, ttl):
+        with self.lock:
+            self.entries[key] = time.monotonic() + ttl
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+validated_versions = _ValidatedVersions()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that skips the per-request User query.
+
+    The token version claim is checked against the shared cache at most once
+    per TOKEN_VERSION_CACHE_TTL seconds per worker, so revocation takes effect
+    within that window. Tokens issued before claims were added fall back to
+    the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        version = validated_token[TOKEN_VERSION_CLAIM]
+        key = (str(user_id), version)
+        if key not in validated_versions:
+            current = get_token_version(user_id)
+            if current is None:
+                raise AuthenticationFailed(_("User not found or inactive"), code="user_inactive")
+            if current != version:
+                raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+            validated_versions.add(key, settings.TOKEN_VERSION_CACHE_TTL)
+
+        def load_user():
+            try:
+                return User.objects.get(pk=user_id, is_active=True)
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        return TokenClaimsUser(load_user, validated_token)
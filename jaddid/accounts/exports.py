@@ -0,0 +1,14 @@
+"""Columns of the user export (see jaddid.exports)"""
+
+USER_COLUMNS = [
+    ('id', 'id'),
+    ('email', 'email'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('role', 'role'),
+    ('is_verified', 'is_verified'),
+    ('is_active', 'is_active'),
+    ('phone', 'profile__phone'),
+    ('date_joined', 'date_joined'),
+    ('last_login', 'last_login'),
+]
@@ -0,0 +1,23 @@
+"""
+Password hashers with their work factor taken from settings.
+
+The algorithm names are unchanged, so existing hashes keep verifying. When
+the configured cost (or PASSWORD_HASHER) changes, Django re-hashes the
+password on the user's next successful login.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = settings.PBKDF2_ITERATIONS
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    rounds = settings.BCRYPT_ROUNDS
@@ -0,0 +1,199 @@
+"""
+Bulk user import.
+
+Rows are read from CSV or JSON Lines as a stream and processed in batches:
+validate every row, check the batch's emails with one query, hash the
+passwords in a process pool, then insert users and profiles with
+bulk_create inside one transaction per batch. Rows that fail are reported
+with their line number (the first USER_IMPORT_MAX_ERRORS of them; the rest
+are counted) and never stop the import.
+
+Uploads through the API are saved to USER_IMPORT_ROOT and imported by a
+Celery task (accounts.tasks.import_users_task); the job's state is kept
+in the cache under its id.
+"""
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+
+from jaddid.bulk import RowError, batched, iter_rows
+from .models import Profile, User
+from .serializers import UserImportSerializer
+
+
+IMPORT_JOB_KEY = 'accounts:user_import:{job_id}'
+
+
+def _init_worker():
+    # Needed when the pool spawns instead of forking
+    django.setup()
+
+
+def _hash(password):
+    # Rows without a password get an unusable one and must reset it
+    return make_password(password or None)
+
+
+class ImportResult:
+    def __init__(self, max_errors=None):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors if max_errors is not None else settings.USER_IMPORT_MAX_ERRORS
+
+    def add_error(self, line, errors, email=None):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'email': email, 'errors': errors})
+
+    @property
+    def errors_omitted(self):
+        return self.failed - len(self.errors)
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_omitted': self.errors_omitted,
+        }
+
+
+class UserImporter:
+    """Import users from a text stream of CSV or JSONL rows"""
+
+    def __init__(self, batch_size=None, workers=None):
+        self.batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+        self.workers = workers if workers is not None else settings.USER_IMPORT_WORKERS
+        self.result = ImportResult()
+        self.seen_emails = set()
+
+    def run(self, stream, fmt):
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            for batch in batched(iter_rows(stream, fmt), self.batch_size):
+                self._import_batch(batch, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return self.result
+
+    def _validate(self, batch):
+        valid = []
+        for line, row in batch:
+            if isinstance(row, RowError):
+                self.result.add_error(line, {'row': [str(row)]})
+                continue
+
+            # Empty cells mean "not given"
+            row = {key: value for key, value in row.items() if value not in ('', None)}
+            serializer = UserImportSerializer(data=row)
+            if not serializer.is_valid():
+                self.result.add_error(line, serializer.errors, row.get('email'))
+                continue
+
+            data = serializer.validated_data
+            if data['email'] in self.seen_emails:
+                self.result.add_error(line, {'email': ['Duplicate email in this file']}, data['email'])
+                continue
+            self.seen_emails.add(data['email'])
+            valid.append((line, data))
+
+        existing = set(User.objects.filter(
+            email__in=[data['email'] for _, data in valid]
+        ).values_list('email', flat=True))
+
+        rows = []
+        for line, data in valid:
+            if data['email'] in existing:
+                self.result.add_error(line, {'email': ['A user with this email already exists']}, data['email'])
+            else:
+                rows.append((line, data))
+        return rows
+
+    def _import_batch(self, batch, pool):
+        rows = self._validate(batch)
+        if not rows:
+            return
+
+        passwords = [data.get('password') for _, data in rows]
+        if pool is not None:
+            hashes = list(pool.map(_hash, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))))
+        else:
+            hashes = [_hash(password) for password in passwords]
+
+        users, profiles = [], []
+        for (line, data), password_hash in zip(rows, hashes):
+            user = User(
+                email=data['email'],
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                role=data['role'],
+                password=password_hash,
+            )
+            users.append(user)
+            profiles.append(Profile(
+                user=user,
+                phone=data.get('phone', ''),
+                address=data.get('address', ''),
+                bio=data.get('bio', ''),
+            ))
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                Profile.objects.bulk_create(profiles)
+        except IntegrityError:
+            # Someone registered one of these emails meanwhile; fall back to row by row
+            self._insert_one_by_one(rows, users, profiles)
+            return
+        self.result.created += len(users)
+
+    def _insert_one_by_one(self, rows, users, profiles):
+        for (line, data), user, profile in zip(rows, users, profiles):
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+                    profile.save(force_insert=True)
+            except IntegrityError:
+                self.result.add_error(line, {'email': ['A user with this email already exists']}, data['email'])
+            else:
+                self.result.created += 1
+
+
+def import_users(stream, fmt, batch_size=None, workers=None):
+    """Import users from `stream` and return an ImportResult"""
+    return UserImporter(batch_size, workers).run(stream, fmt)
+
+
+def import_storage():
+    return FileSystemStorage(location=settings.USER_IMPORT_ROOT)
+
+
+def set_import_job(job_id, status, **extra):
+    cache.set(
+        IMPORT_JOB_KEY.format(job_id=job_id),
+        {'id': job_id, 'status': status, **extra},
+        settings.USER_IMPORT_JOB_TIMEOUT
+    )
+
+
+def get_import_job(job_id):
+    """State of an import job, or None once it expired"""
+    return cache.get(IMPORT_JOB_KEY.format(job_id=job_id))
+
+
+def create_import_job(upload):
+    """Save an uploaded file for a worker and return (job_id, stored name)"""
+    job_id = uuid.uuid4().hex
+    name = import_storage().save(f'{job_id}.upload', upload)
+    set_import_job(job_id, 'queued')
+    return job_id, name
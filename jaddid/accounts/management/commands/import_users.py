@@ -0,0 +1,41 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importer import import_users
+from jaddid.bulk import FORMATS, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Import users (with profiles) from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Defaults to the file extension, then csv')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+
+        if path == '-':
+            result = import_users(sys.stdin, fmt, options['batch_size'], options['workers'])
+        else:
+            try:
+                stream = open(path, encoding='utf-8-sig', newline='')
+            except OSError as e:
+                raise CommandError(str(e))
+            with stream:
+                result = import_users(stream, fmt, options['batch_size'], options['workers'])
+
+        for error in result.errors:
+            self.stderr.write(json.dumps(error, default=str))
+        if result.errors_omitted:
+            self.stderr.write(f'... {result.errors_omitted} more row errors not shown')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} users, {result.failed} rows failed'
+        ))
@@ -0,0 +1,36 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from accounts.tokens import RefreshToken
+from marketplace.seeding import SEED_EMAIL_DOMAIN
+
+
+class Command(BaseCommand):
+    help = (
+        'Print long-lived access tokens for seeded users as JSON, '
+        'so load tests skip the (rate limited, CPU heavy) login endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--lifetime', type=int, default=120, help='Token lifetime in minutes')
+
+    def handle(self, *args, **options):
+        # Only synthetic accounts, never real users
+        users = User.objects.filter(
+            email__endswith=f'@{SEED_EMAIL_DOMAIN}',
+            is_active=True
+        ).order_by('email')[:options['users']]
+
+        tokens = []
+        for user in users:
+            access = RefreshToken.for_user(user).access_token
+            access.set_exp(lifetime=timedelta(minutes=options['lifetime']))
+            tokens.append({'id': str(user.pk), 'access': str(access)})
+
+        if not tokens:
+            raise CommandError('No seeded users found; run manage.py seed_marketplace first')
+        self.stdout.write(json.dumps(tokens))
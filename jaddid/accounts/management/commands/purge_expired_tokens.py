@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.tasks import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired JWT outstanding/blacklisted tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        total = purge_expired_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} expired tokens'))
@@ -1,4 +1,5 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
 class CustomUserManager(BaseUserManager):
@@ -6,13 +7,18 @@ class CustomUserManager(BaseUserManager):
     for authentication instead of username."""
 
     def create_user(self, email, password, **args):
-        """Create and save a user with the given email and password."""
+        """Create and save a user with the given email and password,
+        together with their profile."""
+        from .models import Profile
+
         if not email:
             raise ValueError("Email field is required")
         email = self.normalize_email(email)
         user = self.model(email=email, **args)
         user.set_password(password)
-        user.save()
+        with transaction.atomic(using=self._db):
+            user.save(using=self._db)
+            Profile.objects.using(self._db).create(user=user)
         return user
     
     def create_superuser(self, email, password, **extra_fields):
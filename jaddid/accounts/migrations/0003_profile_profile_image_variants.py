@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_fix_date_joined'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='profile_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='profile Image Variants'),
+        ),
+    ]
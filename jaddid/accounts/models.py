@@ -3,12 +3,15 @@ from tabnanny import verbose
 from django.db import models
 import uuid
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from jaddid.dirty import DirtyFieldsMixin
 from .managers import CustomUserManager
 # Create your models here.
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(DirtyFieldsMixin, AbstractBaseUser, PermissionsMixin):
     """Uses email instead of username for authentication"""
     #Role_Choices
     Individual="Individual"
@@ -47,6 +50,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_verified=models.BooleanField(_("verified"), default=False)
     is_staff=models.BooleanField(_("Staff"), default=False)
     is_active=models.BooleanField(_("Avtive"), default=True)
+    token_version=models.PositiveIntegerField(_("token version"), default=0, editable=False)
     date_joined=models.DateTimeField(_("date joined"), default=timezone.now)
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now=True)
@@ -56,14 +60,21 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD="email"
     REQUIRED_FIELDS=["first_name", "last_name"]
 
-    class meta:
+    class Meta:
         verbose_name=_('user')
         verbose_name_plural=('users')
         ordering=['-created_at']
         indexes=[
-            models.Index(fields=['email']),
-            models.Index(fields=['role']),
-            models.Index(fields=['-created_at'])
+            models.Index(fields=['role'], name='user_role_idx'),
+            models.Index(fields=['-created_at'], name='user_created_at_idx'),
+            # prefix search: LOWER(col) LIKE 'term%'
+            models.Index(OpClass(Lower('email'), name='text_pattern_ops'), name='user_email_lower_idx'),
+            models.Index(OpClass(Lower('first_name'), name='text_pattern_ops'), name='user_first_name_lower_idx'),
+            models.Index(OpClass(Lower('last_name'), name='text_pattern_ops'), name='user_last_name_lower_idx'),
+            # substring search: LOWER(col) LIKE '%term%' (pg_trgm)
+            GinIndex(OpClass(Lower('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+            GinIndex(OpClass(Lower('first_name'), name='gin_trgm_ops'), name='user_first_name_trgm_idx'),
+            GinIndex(OpClass(Lower('last_name'), name='gin_trgm_ops'), name='user_last_name_trgm_idx'),
             ]
         
     def __str__(self):
@@ -79,8 +90,9 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 
 
-class Profile(models.Model):
-    """User Profile Model"""
+class Profile(DirtyFieldsMixin, models.Model):
+    """User Profile Model
+    Only changed fields are written on save"""
 
     id=models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user=models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -92,11 +104,16 @@ class Profile(models.Model):
         null=True,
         blank=True
         )
+    profile_image_variants=models.JSONField(_("profile Image Variants"),
+        default=dict,
+        blank=True,
+        editable=False
+        )
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now=True)
 
 
-    class meta:
+    class Meta:
         verbose_name=_("profile")
         verbose_name_plural=_("profiles")
 
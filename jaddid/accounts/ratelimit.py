@@ -0,0 +1,60 @@
+"""
+Sliding-window rate limiting backed by the cache.
+
+Each key keeps a counter for the current and the previous fixed window.
+The previous window is weighted by how much of it still overlaps the
+sliding window, which approximates a true sliding log with two counters.
+"""
+import hashlib
+import math
+import time
+
+from django.core.cache import cache
+
+
+class SlidingWindowLimiter:
+    """Allow at most `limit` hits per `window` seconds for each key"""
+
+    def __init__(self, scope, limit, window):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+
+    def _key(self, ident, index):
+        return f'ratelimit:{self.scope}:{ident}:{index}'
+
+    def hit(self, ident):
+        """
+        Count one hit for `ident`.
+        Returns (allowed, retry_after) where retry_after is in seconds.
+        """
+        now = time.time()
+        index = int(now // self.window)
+        current_key = self._key(ident, index)
+
+        if cache.add(current_key, 1, timeout=self.window * 2):
+            current = 1
+        else:
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                # Expired between add and incr
+                cache.add(current_key, 1, timeout=self.window * 2)
+                current = 1
+
+        previous = cache.get(self._key(ident, index - 1), 0)
+        elapsed = (now % self.window) / self.window
+        weighted = previous * (1 - elapsed) + current
+
+        if weighted <= self.limit:
+            return True, 0
+        return False, math.ceil(self.window - now % self.window)
+
+    def reset(self, ident):
+        index = int(time.time() // self.window)
+        cache.delete_many([self._key(ident, index), self._key(ident, index - 1)])
+
+
+def hash_ident(value):
+    """Fixed length cache-safe identifier for user supplied values"""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
@@ -0,0 +1,177 @@
+"""
+Cached revocation checks for refresh tokens.
+
+simplejwt looks every refresh token up in the blacklist tables. Here the
+lookup goes through three layers instead:
+
+1. an exact key per revoked jti in the shared cache, written when a token
+   is blacklisted,
+2. a bloom filter of all blacklisted, unexpired jtis, built from the
+   database and shared through the shared cache. Each blacklist bumps a
+   shared generation once committed; a filter built for an older generation
+   (or older than REVOCATION_FILTER_TTL) is rebuilt,
+3. the database, only when the filter reports a (possibly false) positive.
+
+If the generation is missing from the shared cache (flushed or evicted),
+revocations may be missing from both cache layers, so a new generation is
+started and the filter rebuilt from the database before it is trusted.
+
+A jti that is missing from a current filter and has no revoked key is not
+revoked, so the common case never reaches the blacklist tables.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from jaddid import metrics
+from jaddid.cache import shared_cache
+
+
+REVOKED_KEY = 'accounts:revoked:{jti}'
+# (generation, dumped bloom filter)
+FILTER_KEY = 'accounts:revocation_filter'
+GENERATION_KEY = 'accounts:revocation_generation'
+
+
+class BloomFilter:
+    """Fixed size bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate=0.001, bits=None, hashes=None):
+        capacity = max(capacity, 1)
+        self.size = bits or max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(value)
+        )
+
+    def dump(self):
+        return (self.size, self.hashes, bytes(self.bits))
+
+    @classmethod
+    def load(cls, data):
+        size, hashes, bits = data
+        bloom = cls(1, bits=size, hashes=hashes)
+        bloom.bits = bytearray(bits)
+        return bloom
+
+
+class _LocalFilter:
+    """Per-process copy of the shared filter"""
+
+    def __init__(self):
+        self.bloom = None
+        self.generation = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+
+    def _current(self, generation):
+        return (
+            self.bloom is not None
+            and self.generation == generation
+            and time.monotonic() < self.expires_at
+        )
+
+    def get(self, generation):
+        """The filter for `generation`, loaded from the shared cache or rebuilt"""
+        if self._current(generation):
+            return self.bloom
+
+        with self.lock:
+            if not self._current(generation):
+                data = shared_cache.get(FILTER_KEY)
+                if data is None or data[0] != generation:
+                    data = (generation, build_filter().dump())
+                    shared_cache.set(FILTER_KEY, data, settings.REVOCATION_FILTER_TTL)
+                self.bloom = BloomFilter.load(data[1])
+                self.generation = generation
+                self.expires_at = time.monotonic() + settings.REVOCATION_FILTER_TTL
+        return self.bloom
+
+    def add(self, jti):
+        if self.bloom is not None:
+            self.bloom.add(jti)
+
+
+local_filter = _LocalFilter()
+
+
+def build_filter():
+    """Build a bloom filter of every blacklisted token that has not expired"""
+    jtis = list(BlacklistedToken.objects.filter(
+        token__expires_at__gt=timezone.now()
+    ).values_list('token__jti', flat=True).iterator(chunk_size=5000))
+
+    # Leave room for the tokens revoked before the next rebuild
+    bloom = BloomFilter(len(jtis) * 2 + 1024, settings.REVOCATION_FILTER_ERROR_RATE)
+    for jti in jtis:
+        bloom.add(jti)
+    return bloom
+
+
+def _timeout(exp):
+    return max(int(exp - time.time()), 1)
+
+
+def invalidate_filter():
+    """Make every process rebuild its filter on the next check"""
+    try:
+        shared_cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Already missing: checks go to the database until it is reset
+        pass
+
+
+def mark_revoked(jti, exp):
+    """Record a freshly blacklisted token in the cache layers"""
+    shared_cache.set(REVOKED_KEY.format(jti=jti), True, _timeout(exp))
+    local_filter.add(jti)
+    # A filter rebuilt before the commit would not have the blacklist row
+    transaction.on_commit(invalidate_filter)
+
+
+def is_revoked(jti, exp):
+    """Return True if the token with this jti has been blacklisted"""
+    key = REVOKED_KEY.format(jti=jti)
+    cached = shared_cache.get_many([key, GENERATION_KEY])
+    if cached.get(key):
+        metrics.record_cache('revocation', True)
+        return True
+
+    generation = cached.get(GENERATION_KEY)
+    if generation is None:
+        # A new starting value, so no filter of a lost generation matches it
+        shared_cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = shared_cache.get(GENERATION_KEY)
+
+    if generation is not None and jti not in local_filter.get(generation):
+        metrics.record_cache('revocation', True)
+        return False
+
+    metrics.record_cache('revocation', False)
+
+    # Filter hit: a false positive or a revoked token whose key was evicted
+    revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if revoked:
+        shared_cache.set(key, True, _timeout(exp))
+    return revoked
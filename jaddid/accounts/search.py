@@ -0,0 +1,51 @@
+"""
+User search backed by the LOWER() prefix and trigram indexes on User.
+
+Short terms use prefix matching (btree text_pattern_ops); terms of three or
+more characters use substring matching, which pg_trgm GIN indexes serve.
+
+Result pages are ordered newest first. When few users match, PostgreSQL
+would still walk the created_at index and filter every row it passes
+(seconds at 1M users), so small match sets are ranked instead: prefix
+matches first, then newest. That ordering makes it collect the matches
+through the search indexes and sort them.
+"""
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+
+
+SEARCH_FIELDS = ['first_name', 'last_name', 'email']
+
+# pg_trgm needs at least one full trigram to use the index
+TRIGRAM_MIN_LENGTH = 3
+
+# Up to this many matches are ranked and sorted rather than read in index order
+RANKED_MATCHES_LIMIT = 5000
+
+
+def search_users(queryset, term):
+    """Filter `queryset` to users whose name or email matches `term`"""
+    term = term.strip().lower()
+    if not term:
+        return queryset
+
+    lookup = 'contains' if len(term) >= TRIGRAM_MIN_LENGTH else 'startswith'
+    queryset = queryset.alias(**{
+        f'{field}_lower': Lower(field) for field in SEARCH_FIELDS
+    })
+
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}_lower__{lookup}': term})
+    queryset = queryset.filter(condition)
+
+    # Bounded count: stops after RANKED_MATCHES_LIMIT + 1 rows
+    if queryset.order_by()[:RANKED_MATCHES_LIMIT + 1].count() > RANKED_MATCHES_LIMIT:
+        return queryset
+
+    rank = Case(
+        *(When(**{f'{field}_lower__startswith': term}, then=Value(0)) for field in SEARCH_FIELDS),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    return queryset.alias(search_rank=rank).order_by('search_rank', '-created_at')
@@ -3,10 +3,13 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password as django_validate_password, validate_password
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from jaddid.images import variant_url, variant_urls
 from .models import User, Profile
 
 
 class ProfileSerializer(serializers.ModelSerializer):
+    profile_image_variants=serializers.SerializerMethodField()
+
     class Meta:
         model=Profile
         fields=[
@@ -15,11 +18,19 @@ class ProfileSerializer(serializers.ModelSerializer):
             'address',
             'bio',
             'profile_image',
+            'profile_image_variants',
             'created_at',
             'updated_at'
         ]
         read_only_fields=['id', 'created_at', 'updated_at']
 
+    def get_profile_image_variants(self, obj):
+        return variant_urls(
+            obj.profile_image,
+            obj.profile_image_variants,
+            self.context.get('request')
+        )
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializers for GET requests only"""
     profile=ProfileSerializer(read_only=True)
@@ -213,6 +224,13 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
             'profile_image'
         ]
     
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Nothing listens for unchanged profiles, so a no-op form skips the write
+        instance.save(skip_unchanged=True)
+        return instance
+    
     def validate_phone(self, value):
         """Validate phone number format"""
         if value and len(value) < 10:
@@ -301,11 +319,40 @@ class ProfileImageUploadSerializer(serializers.ModelSerializer):
         
         return value
 
+class UserImportSerializer(serializers.Serializer):
+    """Validates one row of a bulk user import"""
+    email=serializers.EmailField(max_length=254)
+    first_name=serializers.CharField(max_length=100)
+    last_name=serializers.CharField(max_length=100)
+    role=serializers.ChoiceField(
+        choices=[choice for choice in User.Role_Choices if choice[0] != User.Admin],
+        default=User.Individual
+    )
+    password=serializers.CharField(required=False, min_length=8, write_only=True)
+    phone=serializers.CharField(required=False, max_length=11)
+    address=serializers.CharField(required=False)
+    bio=serializers.CharField(required=False, max_length=500)
+
+    def validate_email(self, value):
+        return value.lower()
+
+    def validate(self, attrs):
+        password = attrs.get('password')
+        if password:
+            user = User(
+                email=attrs['email'], first_name=attrs['first_name'], last_name=attrs['last_name']
+            )
+            try:
+                django_validate_password(password, user)
+            except ValidationError as e:
+                raise serializers.ValidationError({'password': list(e.messages)})
+        return attrs
+
 class UserListSerializer(serializers.ModelSerializer):
     """Lightweight serializer for user lists"""
     
     full_name = serializers.CharField(source='get_full_name', read_only=True)
-    profile_image = serializers.ImageField(source='profile.profile_image', read_only=True)
+    profile_image = serializers.SerializerMethodField()
     
     class Meta:
         model = User
@@ -318,4 +365,14 @@ class UserListSerializer(serializers.ModelSerializer):
             'role',
             'is_verified',
             'profile_image'
-        ]
\ No newline at end of file
+        ]
+
+    def get_profile_image(self, obj):
+        """Thumbnail of the profile image for list rows"""
+        profile = obj.profile
+        return variant_url(
+            profile.profile_image,
+            profile.profile_image_variants,
+            'thumbnail',
+            request=self.context.get('request')
+        )
@@ -1,16 +1,31 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import User, Profile
+from jaddid.images import schedule_variants
+from .models import Profile, User
+from .tokens import CLAIM_FIELDS, revoke_tokens
+
+# Profiles are created by CustomUserManager.create_user, in the same
+# transaction as the user.
+
+
+@receiver(post_save, sender=Profile)
+def profile_image_saved(sender, instance, **kwargs):
+    """Generate responsive sizes for a new profile image"""
+    schedule_variants(instance, 'profile_image', 'profile_image_variants')
+
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Automatically create a profile when a user is created"""
+def user_claims_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Revoke issued tokens when a field copied into token claims changes"""
     if created:
-        Profile.objects.create(user=instance)
+        return
 
+    dirty = instance.get_dirty_fields()
+    if dirty is None:
+        # Not loaded from the database, so any written claim field may have changed
+        changed = update_fields is None or CLAIM_FIELDS & set(update_fields)
+    else:
+        changed = CLAIM_FIELDS & set(dirty)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save the profile whenever the user is saved"""
-    if hasattr(instance, "profile"):
-        instance.profile.save()
\ No newline at end of file
+    if changed:
+        revoke_tokens(instance)
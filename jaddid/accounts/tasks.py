@@ -0,0 +1,53 @@
+"""
+Background tasks for the accounts app.
+"""
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from jaddid.bulk import text_stream
+from .importer import import_storage, import_users, set_import_job
+
+
+def purge_expired_tokens(batch_size=None):
+    """
+    Delete expired outstanding tokens (and their blacklist rows) in batches.
+    Returns the number of outstanding tokens removed.
+    """
+    batch_size = batch_size or settings.TOKEN_PURGE_BATCH_SIZE
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+
+    total = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        # BlacklistedToken rows go with them through the cascade
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
+
+
+@shared_task(ignore_result=True)
+def purge_expired_tokens_task():
+    """Periodic cleanup of the token blacklist tables"""
+    return purge_expired_tokens()
+
+
+@shared_task
+def import_users_task(job_id, name, fmt):
+    """Import an uploaded user file saved by create_import_job()"""
+    set_import_job(job_id, 'running')
+    storage = import_storage()
+    try:
+        with storage.open(name, 'rb') as upload:
+            # Prefork workers are daemonic and cannot start a process pool;
+            # Celery's own concurrency spreads imports over the cores instead
+            result = import_users(text_stream(upload), fmt, workers=1)
+    except Exception:
+        set_import_job(job_id, 'failed')
+        raise
+    finally:
+        storage.delete(name)
+
+    set_import_job(job_id, 'done', **result.as_dict())
@@ -1,3 +1,346 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from jaddid.cache import shared_cache
+from . import revocation
+from .models import User
+from .revocation import REVOKED_KEY, BloomFilter, is_revoked
+from .tokens import TOKEN_VERSION_KEY, RefreshToken, revoke_tokens
+
+
+@override_settings(TOKEN_VERSION_CACHE_TTL=0)
+class TokenClaimRevocationTests(TestCase):
+    """Tokens carry role/is_staff/is_active, so changing them must revoke the tokens"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='seller@example.com', password='Str0ng-pass!', first_name='Sara', last_name='Ali'
+        )
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def me(self):
+        return self.client.get(reverse('user-detail'))
+
+    def refresh_access(self):
+        return APIClient().post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+
+    def reload(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_token_works_until_a_claim_changes(self):
+        self.assertEqual(self.me().status_code, 200)
+
+        user = self.reload()
+        user.first_name = 'Mona'
+        user.save()
+
+        self.assertEqual(self.me().status_code, 200)
+        self.assertEqual(self.refresh_access().status_code, 201)
+
+    def test_deactivation_revokes_tokens(self):
+        self.assertEqual(self.me().status_code, 200)
+
+        user = self.reload()
+        user.is_active = False
+        user.save()
+
+        self.assertEqual(self.me().status_code, 401)
+        self.assertEqual(self.refresh_access().status_code, 401)
+
+    def test_demotion_revokes_tokens(self):
+        user = self.reload()
+        user.is_staff = True
+        user.save()
+        staff = RefreshToken.for_user(self.reload())
+
+        user = self.reload()
+        user.is_staff = False
+        user.save(update_fields=['is_staff'])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {staff.access_token}')
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_role_change_revokes_tokens(self):
+        user = self.reload()
+        user.role = User.Company
+        user.save()
+
+        self.assertEqual(self.me().status_code, 401)
+        self.assertEqual(self.refresh_access().status_code, 401)
+
+    def test_revocation_inside_a_transaction_applies_after_commit(self):
+        key = TOKEN_VERSION_KEY.format(user_id=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                revoke_tokens(self.reload())
+                # A concurrent request reads the uncommitted row's old version
+                cache.set(key, self.refresh['token_version'])
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_new_login_after_revocation_carries_new_claims(self):
+        user = self.reload()
+        user.role = User.Factory
+        user.save()
+
+        token = RefreshToken.for_user(self.reload())
+        self.assertEqual(token['role'], User.Factory)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        self.assertEqual(self.me().status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginRateLimitTests(TestCase):
+    """Login floods are refused before any password is hashed"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, email, password='not-the-password', **meta):
+        return self.client.post(
+            reverse('login'), {'email': email, 'password': password}, format='json', **meta
+        )
+
+    def test_forged_forwarded_for_does_not_bypass_ip_limit(self):
+        limit, _ = settings.LOGIN_RATE_LIMITS['ip']
+        for i in range(limit):
+            response = self.login(f'guess{i}@example.com', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            self.assertEqual(response.status_code, 400)
+
+        response = self.login('guess@example.com', HTTP_X_FORWARDED_FOR='203.0.113.250')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_email_limit_applies_across_addresses(self):
+        limit, _ = settings.LOGIN_RATE_LIMITS['email']
+        for i in range(limit):
+            self.assertEqual(self.login('victim@example.com', REMOTE_ADDR=f'198.51.100.{i}').status_code, 400)
+
+        self.assertEqual(self.login('victim@example.com', REMOTE_ADDR='198.51.100.250').status_code, 429)
+
+    def test_successful_login_resets_email_limit(self):
+        User.objects.create_user(email='owner@example.com', password='Str0ng-pass!')
+        limit, _ = settings.LOGIN_RATE_LIMITS['email']
+        for i in range(limit - 1):
+            self.login('owner@example.com', REMOTE_ADDR=f'198.51.100.{i}')
+
+        self.assertEqual(self.login('owner@example.com', 'Str0ng-pass!').status_code, 200)
+        self.assertEqual(self.login('owner@example.com').status_code, 400)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], TOKEN_VERSION_CACHE_TTL=0
+)
+class QueryCountTests(TestCase):
+    """Login and profile updates only write the rows and columns that changed"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@example.com', password='Str0ng-pass!')
+        self.client = APIClient()
+
+    def authenticate(self):
+        token = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+    def test_login(self):
+        # user lookup, outstanding token insert, profile for the response
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                reverse('login'), {'email': 'owner@example.com', 'password': 'Str0ng-pass!'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_update(self):
+        self.authenticate()
+
+        # token version, profile lookup, update of the changed column
+        with self.assertNumQueries(3) as context:
+            response = self.client.patch(reverse('profile-update'), {'bio': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('"address"', context.captured_queries[-1]['sql'])
+
+    def test_unchanged_profile_update_skips_the_write(self):
+        self.user.profile.bio = 'Hello'
+        self.user.profile.save()
+        self.authenticate()
+
+        with self.assertNumQueries(2):
+            response = self.client.patch(reverse('profile-update'), {'bio': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_save_still_saves(self):
+        user = User.objects.get(pk=self.user.pk)
+        updated_at = user.updated_at
+        saved = []
+
+        def receiver(sender, instance, **kwargs):
+            saved.append(instance.pk)
+
+        post_save.connect(receiver, sender=User)
+        self.addCleanup(post_save.disconnect, receiver, sender=User)
+        with self.assertNumQueries(1):
+            user.save()
+
+        self.assertEqual(saved, [user.pk])
+        self.assertGreater(User.objects.get(pk=user.pk).updated_at, updated_at)
+
+    def test_refresh_from_db_resets_dirty_fields(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Mona'
+        self.assertEqual(user.get_dirty_fields(), ['first_name'])
+
+        user.refresh_from_db()
+        self.assertEqual(user.get_dirty_fields(), [])
+
+        user.first_name = 'Mona'
+        User.objects.filter(pk=user.pk).update(last_name='Ali')
+        user.refresh_from_db(fields=['last_name'])
+        self.assertEqual(user.get_dirty_fields(), ['first_name'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTests(TestCase):
+    """Imports run as a background job and apply the password validators"""
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_superuser(email='admin@example.com', password='Str0ng-pass!')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def upload(self, content):
+        upload = SimpleUploadedFile('users.csv', content.encode(), content_type='text/csv')
+        return self.client.post(reverse('user-import'), {'file': upload}, format='multipart')
+
+    def test_import_returns_a_job(self):
+        response = self.upload(
+            'email,first_name,last_name,password\n'
+            'mona@example.com,Mona,Ali,Gr33n-bottles\n'
+            'omar@example.com,Omar,Adel,password\n'
+        )
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(response.data['status_url']).data
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['created'], 1)
+        self.assertEqual(job['errors'][0]['email'], 'omar@example.com')
+        self.assertIn('password', job['errors'][0]['errors'])
+        self.assertTrue(User.objects.get(email='mona@example.com').check_password('Gr33n-bottles'))
+
+    @override_settings(USER_IMPORT_MAX_ERRORS=2)
+    def test_job_keeps_the_first_row_errors_and_counts_the_rest(self):
+        rows = ''.join(f'not-an-email-{i},Bad,Row,Gr33n-bottles\n' for i in range(5))
+        response = self.upload('email,first_name,last_name,password\n' + rows)
+
+        job = self.client.get(response.data['status_url']).data
+        self.assertEqual(job['failed'], 5)
+        self.assertEqual([error['line'] for error in job['errors']], [2, 3])
+        self.assertEqual(job['errors_omitted'], 3)
+
+    def test_unknown_job_is_not_found(self):
+        response = self.client.get(reverse('user-import-status', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+
+class RevocationTests(TestCase):
+    """Refresh token revocation is cached in every process and falls back to the database"""
+
+    def setUp(self):
+        cache.clear()
+        shared_cache.clear()
+        self.user = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.jti = self.refresh['jti']
+        self.exp = self.refresh['exp']
+
+    def blacklist(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.refresh.blacklist()
+
+    def refresh_access(self):
+        return APIClient().post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.001)
+        values = [str(uuid.uuid4()) for _ in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        loaded = BloomFilter.load(bloom.dump())
+        self.assertTrue(all(value in loaded for value in values))
+        false_positives = sum(str(uuid.uuid4()) in loaded for _ in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_logout_revokes_the_refresh_token(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 205)
+
+        self.assertEqual(self.refresh_access().status_code, 401)
+
+    def test_unrevoked_token_skips_the_database_once_the_filter_is_loaded(self):
+        self.assertFalse(is_revoked(self.jti, self.exp))
+
+        with self.assertNumQueries(0):
+            self.assertFalse(is_revoked(self.jti, self.exp))
+
+    def test_other_processes_rebuild_their_filter_after_a_revocation(self):
+        other_process = revocation._LocalFilter()
+        with mock.patch.object(revocation, 'local_filter', other_process):
+            self.assertFalse(is_revoked(self.jti, self.exp))
+            self.assertFalse(is_revoked(self.jti, self.exp))
+
+        self.blacklist()
+        shared_cache.delete(REVOKED_KEY.format(jti=self.jti))
+
+        with mock.patch.object(revocation, 'local_filter', other_process):
+            self.assertTrue(is_revoked(self.jti, self.exp))
+            self.assertIn(self.jti, other_process.bloom)
+
+    def test_lost_shared_state_fails_closed_against_the_database(self):
+        self.assertFalse(is_revoked(self.jti, self.exp))
+        self.blacklist()
+        shared_cache.clear()
+
+        # The filter is rebuilt, then its hit confirmed
+        with self.assertNumQueries(2):
+            self.assertTrue(is_revoked(self.jti, self.exp))
+        self.assertTrue(shared_cache.get(REVOKED_KEY.format(jti=self.jti)))
+
+    def test_purge_removes_only_expired_tokens(self):
+        self.blacklist()
+        now = timezone.now()
+        for i in range(3):
+            expired = OutstandingToken.objects.create(
+                user=self.user, jti=f'expired-{i}', token='x', expires_at=now - timedelta(minutes=1)
+            )
+            BlacklistedToken.objects.create(token=expired)
+
+        stdout = StringIO()
+        call_command('purge_expired_tokens', batch_size=2, stdout=stdout)
+
+        self.assertIn('Purged 3 expired tokens', stdout.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [self.jti])
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, self.jti)
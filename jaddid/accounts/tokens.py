@@ -0,0 +1,97 @@
+"""
+JWT helpers.
+
+Access tokens carry role/is_staff/is_active claims and a per-user token
+version. Bumping the version (revoke_tokens) invalidates every token issued
+before it, so stateless authentication can still be revoked. Any change to
+a claim field revokes the user's tokens (see accounts.signals), so claims
+are never stale for longer than TOKEN_VERSION_CACHE_TTL.
+
+Refresh token blacklist checks go through the cached revocation list in
+accounts.revocation instead of querying the blacklist tables every time.
+"""
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from jaddid import metrics
+
+from .models import User
+from .revocation import is_revoked, mark_revoked
+
+
+TOKEN_VERSION_CLAIM = 'token_version'
+TOKEN_VERSION_KEY = 'accounts:token_version:{user_id}'
+TOKEN_VERSION_CACHE_TIMEOUT = 60 * 60
+
+# User fields copied into token claims
+CLAIM_FIELDS = {'role', 'is_staff', 'is_active'}
+
+# Cached marker for "user missing or inactive"
+REVOKED = -1
+
+
+class RefreshToken(tokens.RefreshToken):
+    """Refresh token whose access tokens carry the user's role claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['is_staff'] = user.is_staff
+        token['is_active'] = user.is_active
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM], self.payload['exp']):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        mark_revoked(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        return result
+
+
+def get_token_version(user_id):
+    """
+    Return the current token version of an active user, or None if the user
+    is missing or inactive. Backed by the shared cache, falling back to one query.
+    """
+    key = TOKEN_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    metrics.record_cache('token_version', version is not None)
+    if version is None:
+        version = User.objects.filter(
+            pk=user_id,
+            is_active=True
+        ).values_list('token_version', flat=True).first()
+        if version is None:
+            version = REVOKED
+        cache.set(key, version, TOKEN_VERSION_CACHE_TIMEOUT)
+    return None if version == REVOKED else version
+
+
+def check_token_version(token):
+    """Raise TokenError if `token` was issued before its user's tokens were revoked"""
+    if TOKEN_VERSION_CLAIM not in token:
+        return
+    current = get_token_version(token[api_settings.USER_ID_CLAIM])
+    if current is None or current != token[TOKEN_VERSION_CLAIM]:
+        raise TokenError(_("Token has been revoked"))
+
+
+def revoke_tokens(user):
+    """Invalidate every token issued to `user` so far, once the current transaction commits"""
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    key = TOKEN_VERSION_KEY.format(user_id=user.pk)
+    cache.delete(key)
+    # Until the commit other requests still read the old version and may cache it again
+    transaction.on_commit(partial(cache.delete, key))
+    user.refresh_from_db(fields=['token_version'])
@@ -16,6 +16,9 @@ urlpatterns = [
     
     # User List & Detail
     path('users/', views.list_users, name='user-list'),
+    path('users/import/', views.bulk_import_users, name='user-import'),
+    path('users/import/<str:job_id>/', views.user_import_status, name='user-import-status'),
+    path('users/export/', views.export_users, name='user-export'),
     path('users/<uuid:user_id>/', views.get_user_by_id, name='user-by-id'),
     
     # Profile
@@ -1,17 +1,28 @@
 from functools import partial
 import stat
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes,parser_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import api_view, permission_classes,parser_classes, renderer_classes
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.throttling import BaseThrottle
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Q
+from django.urls import reverse
 from yaml import serialize
 
 from accounts.admin import UserAdmin
+from jaddid.bulk import FORMATS, detect_format
+from jaddid.exports import EXPORT_RENDERERS, export_format, export_response
+from jaddid.images import delete_variants
+from jaddid.instrumentation import query_budget
 from .models import User, Profile
+from .ratelimit import SlidingWindowLimiter, hash_ident
+from .search import search_users
+from .importer import create_import_job, get_import_job
+from .exports import USER_COLUMNS
+from .tasks import import_users_task
+from .tokens import RefreshToken, check_token_version, revoke_tokens
 from .serializers import (
     ProfileSerializer,
     ProfileUpdateSerializer,
@@ -24,6 +35,11 @@ from .serializers import (
 )
 from accounts import serializers
 
+login_limiters = {
+    scope: SlidingWindowLimiter(f'login:{scope}', limit, window)
+    for scope, (limit, window) in settings.LOGIN_RATE_LIMITS.items()
+}
+
 # Create your views here.
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -57,6 +73,18 @@ def login_user(request):
             'error': 'both email and password are required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    # Refuse floods before paying for a password hash
+    idents = {
+        'ip': BaseThrottle().get_ident(request),
+        'email': hash_ident(email.lower()),
+    }
+    for scope, limiter in login_limiters.items():
+        allowed, retry_after = limiter.hit(idents[scope])
+        if not allowed:
+            return Response({
+                'error':'too many login attempts, please try again later'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(retry_after)})
+
     user = authenticate(email=email.lower(), password=password)
     if user is None:
         return Response({
@@ -68,6 +96,8 @@ def login_user(request):
             'error':'account is disabled, please contact support'
         }, status=status.HTTP_403_FORBIDDEN)
     
+    login_limiters['email'].reset(idents['email'])
+
     refresh = RefreshToken.for_user(user)
     user_data = UserSerializer(user).data
 
@@ -116,6 +146,8 @@ def refresh_token(request):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         token = RefreshToken(refresh_token)
+        # Claims are copied from the refresh token, so it must still be current
+        check_token_version(token)
 
         return Response({
             'access': str(token.access_token)
@@ -127,6 +159,7 @@ def refresh_token(request):
         }, status=status.HTTP_401_UNAUTHORIZED)
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_current_user(request):
@@ -187,16 +220,18 @@ def delete_user(request):
 
     user = request.user
     user.is_active = False
-    user.save()
+    # Revokes the user's tokens, see accounts.signals
+    user.save(update_fields=['is_active', 'updated_at'])
 
     return Response({
         'message':'account deleted successfully'
     }, status=status.HTTP_204_NO_CONTENT)
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_users(request):
-    queryset = User.objects.filter(is_active=True)
+    queryset = User.objects.filter(is_active=True).select_related('profile')
 
     #filter by role
     role = request.query_params.get('role', None)
@@ -206,29 +241,80 @@ def list_users(request):
     #search bt name or email
     search= request.query_params.get('search', None)
     if search:
-        queryset = queryset.filter(
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search) |
-            Q(email__icontains=search)
-        )
+        queryset = search_users(queryset, search)
 
     #Pagination
     from rest_framework.pagination import PageNumberPagination
     paginator = PageNumberPagination()
     paginator.page_size = request.query_params.get('page_size', 20)
     result_page  = paginator.paginate_queryset(queryset, request)
-    serializer = UserListSerializer(result_page, many=True)
+    serializer = UserListSerializer(result_page, many=True, context={'request': request})
 
     return paginator.get_paginated_response(serializer.data)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser, FormParser])
+def bulk_import_users(request):
+    """
+    Queue an import of users from an uploaded CSV or JSONL file (staff only).
+    Returns the job id; poll user-import-status for the result.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({
+            'error': 'file is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    fmt = request.data.get('format') or detect_format(upload.name)
+    if fmt not in FORMATS:
+        return Response({
+            'error': f"format must be one of: {', '.join(FORMATS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    job_id, name = create_import_job(upload)
+    import_users_task.delay(job_id, name, fmt)
+    return Response({
+        'job_id': job_id,
+        'status_url': request.build_absolute_uri(reverse('user-import-status', args=[job_id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def user_import_status(request, job_id):
+    """State of a bulk user import: queued, running, done (with the result) or failed"""
+    job = get_import_job(job_id)
+    if job is None:
+        return Response({
+            'error': 'Import job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response(job)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes(EXPORT_RENDERERS)
+def export_users(request):
+    """Stream all users as CSV or JSON Lines (staff only)"""
+    queryset = User.objects.order_by('created_at', 'pk')
+
+    role = request.query_params.get('role', None)
+    if role:
+        queryset = queryset.filter(role=role)
+
+    return export_response(queryset, USER_COLUMNS, export_format(request), 'users')
+
+
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_by_id(request, user_id):
     """get user by id (public profile)"""
     try:
-        user = User.objects.filter(id=user_id, is_active=True)
-        serializer=UserSerializer(user)
+        user = User.objects.select_related('profile').get(id=user_id, is_active=True)
+        serializer=UserSerializer(user, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
     except User.DoesNotExist:
         return Response({
@@ -240,11 +326,12 @@ def get_user_by_id(request, user_id):
 #Profile CRUD
 
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_profile(request):
     """Get Current User Profile"""
-    profile = request.user.profile
+    profile = Profile.objects.get(user_id=request.user.pk)
     # Return profile data using the ProfileSerializer
     serializer = ProfileSerializer(profile)
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -255,7 +342,7 @@ def get_profile(request):
 @permission_classes([IsAuthenticated])
 def update_profile(request):
     """Update Profile Info Only"""
-    profile = request.user.profile
+    profile = Profile.objects.get(user_id=request.user.pk)
     partial = request.method == 'PATCH'
 
     # Update only the Profile model fields
@@ -276,7 +363,7 @@ def update_profile(request):
 @permission_classes([IsAuthenticated])
 def upload_profile_image(request):
     """upload profile Image"""
-    profile = request.user.profile
+    profile = Profile.objects.get(user_id=request.user.pk)
     serializer = ProfileImageUploadSerializer(profile, data=request.data, partial=True)
     
     if serializer.is_valid():
@@ -294,9 +381,11 @@ def upload_profile_image(request):
 @permission_classes([IsAuthenticated])
 def delete_profile_image(request):
     """Delete Profile Image"""
-    profile = request.user.profile
+    profile = Profile.objects.get(user_id=request.user.pk)
 
     if profile.profile_image:
+        delete_variants(profile.profile_image.storage, profile.profile_image_variants)
+        profile.profile_image_variants = {}
         profile.profile_image.delete()
         profile.save()
 
@@ -318,9 +407,17 @@ def change_password(request):
     serializer = ChangeOldPasswordSerializer(data=request.data, context={'request':request})
 
     if serializer.is_valid():
-        serializer.save()
+        user = serializer.save()
+
+        # Tokens issued with the old password stop working; hand out fresh ones
+        revoke_tokens(user)
+        refresh = RefreshToken.for_user(user)
 
         return Response({
+            'tokens':{
+                'refresh':str(refresh),
+                'access':str(refresh.access_token)
+            },
             'message':'password changed successfully.'
         }, status=status.HTTP_200_OK)
 
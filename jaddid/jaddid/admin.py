@@ -0,0 +1,302 @@
+"""
+Admin helpers for very large tables.
+
+LargeTableAdminMixin swaps the exact COUNT(*) of the changelist paginator
+for PostgreSQL's own estimates once a table is big, and caches the choices
+of relation / distinct-value list filters instead of querying them on
+every page load. The estimate is only shown and used for the page links;
+the last pages are sliced with an exact count, so every row stays
+reachable.
+
+BulkActionAdminMixin runs admin actions over large selections as chunked
+background jobs and reports their progress on the changelist. Progress is
+kept in cache counters (done and failed rows); the user's jobs are found
+through numbered slots handed out by an atomic cache.incr, so concurrent
+jobs never overwrite each other's registration.
+"""
+import json
+import logging
+import uuid
+from functools import partial
+from itertools import chain
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, models, transaction
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from .bulk import batched
+
+
+logger = logging.getLogger(__name__)
+
+BULK_JOB_KEY = 'admin:bulk_job:{job_id}'
+BULK_JOB_DONE_KEY = 'admin:bulk_job:{job_id}:done'
+BULK_JOB_FAILED_KEY = 'admin:bulk_job:{job_id}:failed'
+BULK_JOBS_KEY = 'admin:bulk_jobs:{user_id}'
+BULK_JOBS_SLOT_KEY = 'admin:bulk_jobs:{user_id}:{slot}'
+# Only the user's most recent jobs are reported
+BULK_JOBS_TRACKED = 50
+BULK_JOB_TIMEOUT = 60 * 60 * 24
+
+
+def _filter_cache_key(model, field_path):
+    return f'admin:filter:{model._meta.label_lower}:{field_path}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the planner's row estimate for large result sets.
+
+    Unfiltered tables use pg_class.reltuples; filtered querysets use the row
+    estimate of EXPLAIN. Below ADMIN_EXACT_COUNT_THRESHOLD the exact count
+    is used, so small tables and narrow filters stay precise.
+
+    An estimate can be off either way, which would leave the real last
+    pages unlinked or the estimated ones empty. Requests for the last
+    estimated page or beyond therefore count exactly before slicing.
+    """
+    estimated = False
+
+    def _estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        if not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            # -1 / 0 means the table was never analyzed
+            if row and row[0] > 0:
+                return row[0]
+
+        plan = json.loads(queryset.explain(format='json'))
+        return plan[0]['Plan']['Plan Rows']
+
+    @cached_property
+    def count(self):
+        estimate = self._estimate()
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_THRESHOLD:
+            return super().count
+        self.estimated = True
+        return int(estimate)
+
+    def page(self, number):
+        try:
+            near_end = int(number) >= self.num_pages - 1
+        except (TypeError, ValueError):
+            near_end = False
+        if self.estimated and near_end:
+            # Replace the cached estimate and the page total derived from it
+            self.__dict__['count'] = super().count
+            self.__dict__.pop('num_pages', None)
+            self.estimated = False
+        return super().page(number)
+
+
+class CachedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """Related field filter whose choices are cached"""
+
+    def field_choices(self, field, request, model_admin):
+        return cache.get_or_set(
+            _filter_cache_key(model_admin.model, self.field_path),
+            lambda: list(super(CachedRelatedFieldListFilter, self).field_choices(
+                field, request, model_admin
+            )),
+            settings.ADMIN_FILTER_CACHE_TIMEOUT
+        )
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """Distinct-values filter whose SELECT DISTINCT result is cached"""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        lookup_choices = self.lookup_choices
+        self.lookup_choices = cache.get_or_set(
+            _filter_cache_key(model, field_path),
+            lambda: list(lookup_choices),
+            settings.ADMIN_FILTER_CACHE_TIMEOUT
+        )
+
+
+def _cached_filter(field):
+    """The cached counterpart of the filter Django picks for `field`, if it queries"""
+    if field.is_relation:
+        return CachedRelatedFieldListFilter
+    if field.choices or isinstance(field, (models.BooleanField, models.DateField)):
+        # Fixed choices, no query to cache
+        return None
+    return CachedAllValuesFieldListFilter
+
+
+class LargeTableAdminMixin:
+    """
+    ModelAdmin mixin for tables with millions of rows:
+    estimated changelist counts and cached filter choices.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_list_filter(self, request):
+        list_filter = []
+        for item in super().get_list_filter(request):
+            if isinstance(item, str):
+                filter_class = _cached_filter(get_fields_from_path(self.model, item)[-1])
+                if filter_class is not None:
+                    item = (item, filter_class)
+            list_filter.append(item)
+        return list_filter
+
+
+def _add_progress(key, job_id, count):
+    try:
+        cache.incr(key.format(job_id=job_id), count)
+    except ValueError:
+        # Progress expired; nobody is waiting for it any more
+        pass
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3,
+)
+def run_bulk_action_chunk(self, job_id, func_path, model_label, ids, params):
+    """
+    Apply one chunk of a bulk admin action and record its progress.
+    A failing chunk is counted and logged rather than raised (database errors
+    are retried first), so the job finishes in every mode, eager included.
+    """
+    func = import_string(func_path)
+    try:
+        with transaction.atomic():
+            func(apps.get_model(model_label), ids, **params)
+    except Exception as e:
+        if isinstance(e, DatabaseError) and self.request.retries < self.max_retries:
+            raise
+        logger.exception('Bulk action %s failed for %d %s rows', func_path, len(ids), model_label)
+        _add_progress(BULK_JOB_FAILED_KEY, job_id, len(ids))
+        return
+
+    _add_progress(BULK_JOB_DONE_KEY, job_id, len(ids))
+
+
+class BulkActionAdminMixin:
+    """
+    ModelAdmin mixin for actions over large selections.
+
+    Actions call run_bulk_action() with a function taking (model, ids,
+    **params). Selections that fit in one chunk are applied inline; larger
+    ones are split into chunks of ADMIN_BULK_ACTION_CHUNK_SIZE primary keys
+    that run as background tasks, with progress shown on the changelist.
+    """
+
+    def run_bulk_action(self, request, queryset, func, message, **params):
+        model = queryset.model
+        chunk_size = settings.ADMIN_BULK_ACTION_CHUNK_SIZE
+        pks = queryset.order_by('pk').values_list('pk', flat=True)
+        chunks = batched((str(pk) for pk in pks.iterator(chunk_size=chunk_size)), chunk_size)
+
+        first, second = next(chunks, []), next(chunks, None)
+        if second is None:
+            with transaction.atomic():
+                if first:
+                    func(model, first, **params)
+            self.message_user(request, f'{len(first)} {message}.')
+            return
+
+        # The total is only known once every chunk is queued
+        job_id = uuid.uuid4().hex
+        job_key = BULK_JOB_KEY.format(job_id=job_id)
+        cache.set(job_key, {'total': None, 'message': message}, BULK_JOB_TIMEOUT)
+        cache.set_many({
+            BULK_JOB_DONE_KEY.format(job_id=job_id): 0,
+            BULK_JOB_FAILED_KEY.format(job_id=job_id): 0,
+        }, BULK_JOB_TIMEOUT)
+        self.register_bulk_job(request.user.pk, job_id)
+
+        func_path = f'{func.__module__}.{func.__qualname__}'
+        total = 0
+        for chunk in chain([first, second], chunks):
+            total += len(chunk)
+            # Sent right away outside a transaction, so the pks are never all held
+            transaction.on_commit(partial(
+                run_bulk_action_chunk.delay,
+                job_id, func_path, model._meta.label, chunk, params
+            ))
+        cache.set(job_key, {'total': total, 'message': message}, BULK_JOB_TIMEOUT)
+
+        self.message_user(
+            request,
+            f'Started in the background: {total} {message}. '
+            f'Progress is shown on this page.'
+        )
+
+    def register_bulk_job(self, user_id, job_id):
+        """Store the job in the next free slot of the user's registry"""
+        jobs_key = BULK_JOBS_KEY.format(user_id=user_id)
+        cache.add(jobs_key, 0, BULK_JOB_TIMEOUT)
+        slot = cache.incr(jobs_key)
+        # The counter must outlive every slot it handed out
+        cache.touch(jobs_key, BULK_JOB_TIMEOUT)
+        cache.set(BULK_JOBS_SLOT_KEY.format(user_id=user_id, slot=slot), job_id, BULK_JOB_TIMEOUT)
+
+    def report_bulk_jobs(self, request):
+        """Show the progress of the user's bulk jobs, dropping finished ones"""
+        user_id = request.user.pk
+        last = cache.get(BULK_JOBS_KEY.format(user_id=user_id))
+        if not last:
+            return
+
+        slots = cache.get_many([
+            BULK_JOBS_SLOT_KEY.format(user_id=user_id, slot=slot)
+            for slot in range(max(last - BULK_JOBS_TRACKED, 0) + 1, last + 1)
+        ])
+        for slot_key, job_id in slots.items():
+            keys = [key.format(job_id=job_id) for key in (
+                BULK_JOB_KEY, BULK_JOB_DONE_KEY, BULK_JOB_FAILED_KEY
+            )]
+            job, done, failed = (cache.get_many(keys).get(key) for key in keys)
+            if job is None or done is None:
+                cache.delete(slot_key)
+                continue
+
+            failed = failed or 0
+            if job['total'] is None:
+                self.message_user(request, f"In progress: {done + failed} {job['message']}.", messages.INFO)
+                continue
+            if done + failed < job['total']:
+                self.message_user(
+                    request,
+                    f"In progress: {done + failed} of {job['total']} {job['message']}.",
+                    messages.INFO
+                )
+                continue
+
+            if failed:
+                self.message_user(
+                    request,
+                    f"{done} of {job['total']} {job['message']}; {failed} failed.",
+                    messages.ERROR
+                )
+            else:
+                self.message_user(request, f"{job['total']} {job['message']}.")
+            cache.delete_many([slot_key, *keys])
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method == 'GET':
+            self.report_bulk_jobs(request)
+        return super().changelist_view(request, extra_context)
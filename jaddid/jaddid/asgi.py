@@ -3,6 +3,13 @@ ASGI config for jaddid project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with uvicorn, and set ASYNC_VIEWS=True so the long-poll/SSE message
+endpoints are served by the native async views:
+
+    gunicorn jaddid.asgi -w 4 -k uvicorn.workers.UvicornWorker
+
+Sync DRF views still work under ASGI; each one runs in a thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -0,0 +1,70 @@
+"""
+Streaming CSV / JSON Lines readers shared by the bulk import endpoints and
+management commands. Rows are yielded one at a time, so files of any size
+are processed in constant memory.
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+
+FORMATS = ('csv', 'jsonl')
+
+
+class RowError(ValueError):
+    """A row that could not be parsed"""
+
+
+def detect_format(name, default='csv'):
+    """Guess the format from a file name"""
+    name = (name or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def text_stream(file, encoding='utf-8-sig'):
+    """Decode a binary file object lazily, line by line"""
+    return codecs.getreader(encoding)(file)
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line_number, row) pairs from a text stream.
+    A row that cannot be parsed is yielded as a RowError instead of a dict.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {
+                key.strip(): (value.strip() if isinstance(value, str) else value)
+                for key, value in row.items() if key
+            }
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowError('Each line must be a JSON object')
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def batched(iterable, size):
+    """Split an iterable into lists of at most `size` items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,13 @@
+"""
+The 'shared' cache: Redis when REDIS_URL is set, otherwise a file-based
+cache shared by the processes of one host (see CACHES in settings).
+
+Use it for state another worker has to see, e.g. a version that wakes up
+long-polls served by other processes. The default cache may be local to
+the process.
+"""
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+
+shared_cache = ConnectionProxy(caches, 'shared')
@@ -0,0 +1,22 @@
+"""
+Celery config for jaddid project.
+
+Start a worker with:
+    celery -A jaddid worker -l info
+and the periodic scheduler with:
+    celery -A jaddid beat -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jaddid.settings')
+
+app = Celery('jaddid')
+
+# Read CELERY_* settings from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Load tasks.py from every installed app
+app.autodiscover_tasks()
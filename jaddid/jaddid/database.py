@@ -0,0 +1,68 @@
+"""
+Database connection settings read from the environment.
+
+Connections are persistent by default: a worker keeps its PostgreSQL
+connection for DB_CONN_MAX_AGE seconds instead of opening one per request,
+and CONN_HEALTH_CHECKS replaces a connection that died while idle.
+
+DB_POOL_MODE selects how the app reaches PostgreSQL:
+
+- "direct" (default): straight to PostgreSQL, or through pgbouncer in
+  session pooling mode.
+- "transaction": through pgbouncer in transaction pooling mode. A server
+  connection only belongs to the app for one transaction, so server-side
+  cursors (which outlive it) are disabled; large exports page by keyset
+  instead, see jaddid.exports.
+"""
+import os
+
+
+POOL_MODES = ('direct', 'transaction')
+
+
+def _env(prefix, name, default=None):
+    # Replica settings fall back to the primary's, so usually only HOST differs
+    return os.getenv(f'{prefix}{name}', os.getenv(f'DB_{name}', default))
+
+
+def database_config(prefix='DB_'):
+    """Return a DATABASES entry built from {prefix}NAME, {prefix}HOST, ..."""
+    pool_mode = _env(prefix, 'POOL_MODE', 'direct')
+    if pool_mode not in POOL_MODES:
+        raise ValueError(f'{prefix}POOL_MODE must be one of {", ".join(POOL_MODES)}')
+
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': _env(prefix, 'NAME'),
+        'USER': _env(prefix, 'USER'),
+        'PASSWORD': _env(prefix, 'PASSWORD'),
+        'HOST': _env(prefix, 'HOST'),
+        'PORT': _env(prefix, 'PORT', '5432'),
+        # Seconds to keep a connection open; 0 closes it after every request
+        'CONN_MAX_AGE': int(_env(prefix, 'CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': _env(prefix, 'CONN_HEALTH_CHECKS', 'True') == 'True',
+        'OPTIONS': {
+            'connect_timeout': int(_env(prefix, 'CONNECT_TIMEOUT', '10')),
+        },
+    }
+
+    if pool_mode == 'transaction':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+    return config
+
+
+def replica_configs(aliases):
+    """DATABASES entries for read replicas, read from DB_<ALIAS>_HOST, ..."""
+    configs = {}
+    for alias in aliases:
+        config = database_config(f'DB_{alias.upper()}_')
+        # Tests read replicas through the primary's connection
+        config['TEST'] = {'MIRROR': 'default'}
+        configs[alias] = config
+    return configs
+
+
+def server_side_cursors(connection):
+    """Whether QuerySet.iterator() on this connection streams through a named cursor"""
+    return not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS')
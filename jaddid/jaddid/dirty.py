@@ -0,0 +1,84 @@
+"""
+Dirty-field tracking for models.
+
+Instances remember the field values they were loaded with. save() on an
+existing row then writes only the fields that changed. When nothing did,
+it does a normal save (post_save is sent and auto_now fields move on),
+unless the caller passes skip_unchanged=True to skip the UPDATE entirely.
+"""
+import copy
+
+from django.db import models
+
+
+def _comparable(field, value):
+    if isinstance(field, models.FileField):
+        if value and not getattr(value, '_committed', True):
+            # A new upload is always a change
+            return object()
+        return value.name if value else None
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class DirtyFieldsMixin(models.Model):
+    """Model mixin that saves changed fields only"""
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self):
+        self._loaded_values = {
+            field.attname: _comparable(field, getattr(self, field.attname))
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or fields is None:
+            self._remember_loaded_values()
+            return
+
+        # Only the reloaded fields are clean again
+        fields = set(fields)
+        for field in self._meta.concrete_fields:
+            if (field.name in fields or field.attname in fields) and field.attname in self.__dict__:
+                loaded[field.attname] = _comparable(field, getattr(self, field.attname))
+
+    def get_dirty_fields(self):
+        """Names of the loaded fields whose value changed since the last load or save"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.attname not in loaded or field.primary_key:
+                continue
+            if _comparable(field, getattr(self, field.attname)) != loaded[field.attname]:
+                dirty.append(field.name)
+        return dirty
+
+    def save(self, *args, skip_unchanged=False, **kwargs):
+        adding = self._state.adding or kwargs.get('force_insert')
+        dirty = None if adding else self.get_dirty_fields()
+        if dirty and kwargs.get('update_fields') is None and not args:
+            auto_now = [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            ]
+            kwargs['update_fields'] = set(dirty) | set(auto_now)
+        elif dirty == [] and skip_unchanged:
+            return
+
+        super().save(*args, **kwargs)
+        self._remember_loaded_values()
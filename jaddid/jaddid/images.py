@@ -0,0 +1,150 @@
+"""
+Responsive image derivatives (thumbnail / medium / large in WebP and JPEG).
+
+Variants are generated in the background after an upload is committed and
+their storage names are kept in a JSON field next to the original image.
+Until they exist, the helpers below fall back to the original file. An
+image that cannot be decoded is marked `failed` and never retried.
+"""
+import logging
+import os
+from functools import partial
+from io import BytesIO
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _prepare(image, pil_format):
+    """Convert an image to a mode the target format can encode"""
+    if pil_format == 'JPEG':
+        if _has_alpha(image):
+            rgba = image.convert('RGBA')
+            background = Image.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            return background
+        return image.convert('RGB') if image.mode != 'RGB' else image
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    return image
+
+
+def build_variants(field):
+    """Render every configured size/format of `field` and save it next to the original"""
+    base, _ = os.path.splitext(field.name)
+
+    with field.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    variants = {'source': field.name}
+    for size_name, max_side in settings.IMAGE_VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+
+        for fmt, (pil_format, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            _prepare(resized, pil_format).save(buffer, pil_format, **options)
+            name = f'{base}_{size_name}.{fmt}'
+            entry[fmt] = field.storage.save(name, ContentFile(buffer.getvalue()))
+
+        variants[size_name] = entry
+    return variants
+
+
+def delete_variants(storage, variants):
+    """Remove the files of a previously generated variant set"""
+    for size_name in settings.IMAGE_VARIANT_SIZES:
+        for fmt in VARIANT_FORMATS:
+            name = (variants or {}).get(size_name, {}).get(fmt)
+            if name:
+                storage.delete(name)
+
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3,
+)
+def generate_image_variants(model_label, pk, field_name, variants_field):
+    """Generate derivatives for one image field; a no-op if they are already current"""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    field = getattr(instance, field_name)
+    old_variants = getattr(instance, variants_field) or {}
+    if not field or old_variants.get('source') == field.name:
+        return
+
+    try:
+        variants = build_variants(field)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        logger.warning('Could not build variants for %s %s', model_label, pk, exc_info=True)
+        # Keeps `source` so the same file is not retried; URLs fall back to the original
+        variants = {'source': field.name, 'failed': True}
+
+    model.objects.filter(pk=pk).update(**{variants_field: variants})
+    delete_variants(field.storage, old_variants)
+
+
+def schedule_variants(instance, field_name, variants_field):
+    """Queue variant generation once the current transaction commits"""
+    field = getattr(instance, field_name)
+    variants = getattr(instance, variants_field) or {}
+    if not field or variants.get('source') == field.name:
+        return
+
+    transaction.on_commit(partial(
+        generate_image_variants.delay,
+        instance._meta.label,
+        str(instance.pk),
+        field_name,
+        variants_field,
+    ))
+
+
+def variant_url(field, variants, size, fmt='jpeg', request=None):
+    """URL of one variant, falling back to the original until it is generated"""
+    if not field:
+        return None
+
+    name = (variants or {}).get(size, {}).get(fmt)
+    url = field.storage.url(name) if name else field.url
+    if request:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def variant_urls(field, variants, request=None):
+    """URLs of every size/format of an image"""
+    if not field:
+        return None
+
+    return {
+        size_name: {
+            fmt: variant_url(field, variants, size_name, fmt, request)
+            for fmt in VARIANT_FORMATS
+        }
+        for size_name in settings.IMAGE_VARIANT_SIZES
+    }
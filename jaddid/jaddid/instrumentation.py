@@ -0,0 +1,200 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware (enabled with QUERY_INSTRUMENTATION) records
+the number of queries, total SQL time, repeated statements and the time
+spent rendering the response (TimedJSONRenderer, the API's JSON renderer).
+The rest of the request time, serializer data included, is reported as
+`app`. The numbers are returned in a Server-Timing header and logged as one
+JSON line per request.
+
+Views declare how many queries they may run with `query_budget`, either
+an int or a dict keyed by viewset action with 'default' as fallback:
+
+    class ProductViewSet(viewsets.ModelViewSet):
+        query_budget = {'list': 6, 'default': 10}
+
+Function views use the @query_budget(n) decorator. Requests over budget
+are logged as warnings and, with QUERY_BUDGET_STRICT (set it in tests),
+raise QueryBudgetExceeded.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+
+logger = logging.getLogger('jaddid.queries')
+
+# Collapse "IN (%s, %s, ...)" so lists of any length share one fingerprint
+PLACEHOLDER_LIST_RE = re.compile(r'%s(?:, %s)+')
+
+_current = ContextVar('request_query_stats', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its declared budget"""
+
+
+def query_budget(budget):
+    """Declare the query budget of a function view; apply above @api_view"""
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def get_query_budget(view_func, action=None):
+    """Return the budget of a view (and viewset action), or None"""
+    cls = getattr(view_func, 'cls', None)
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(cls, 'query_budget', None)
+
+    if isinstance(budget, dict):
+        budget = budget.get(action, budget.get('default'))
+    return budget
+
+
+class RequestStats:
+    """Query and render timings of one request; used as a DB execute wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[PLACEHOLDER_LIST_RE.sub('%s', sql)] += 1
+
+    def duplicates(self, limit=5):
+        return [
+            {'sql': sql[:300], 'count': count}
+            for sql, count in self.fingerprints.most_common(limit)
+            if count > 1
+        ]
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that adds the time it takes to the request's render time"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            stats.render_time += time.perf_counter() - start
+
+
+class QueryInstrumentationMiddleware:
+    """Measure SQL and render cost per request and enforce query budgets"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cls = getattr(view_func, 'cls', None)
+        action = (getattr(view_func, 'actions', None) or {}).get(request.method.lower())
+        request._query_view = (
+            f'{cls.__name__}.{action}' if cls is not None and action
+            else getattr(view_func, '__name__', repr(view_func))
+        )
+        request._query_budget = get_query_budget(view_func, action)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with self.wrap_connections(stats):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        # Async views query through the request's thread-sensitive executor
+        # thread, whose connections are not the ones this thread sees. Only
+        # wrapping and unwrapping them hops there; the view stays on the loop.
+        wrappers = await sync_to_async(self.wrap_connections)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+            _current.reset(token)
+        return self.report(request, response, stats, time.perf_counter() - start)
+
+    def wrap_connections(self, stats):
+        """Route every query on this thread's connections through `stats`"""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def report(self, request, response, stats, total_time):
+        """Add Server-Timing to the response, log the request and check its budget"""
+        app_time = max(total_time - stats.sql_time - stats.render_time, 0)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries"',
+            f'render;dur={stats.render_time * 1000:.1f}',
+            f'app;dur={app_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ])
+
+        view = getattr(request, '_query_view', None)
+        budget = getattr(request, '_query_budget', None)
+        over_budget = budget is not None and stats.queries > budget
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'query_budget': budget,
+            'db_ms': round(stats.sql_time * 1000, 1),
+            'render_ms': round(stats.render_time * 1000, 1),
+            'app_ms': round(app_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            'duplicates': stats.duplicates(),
+        }
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps(record))
+
+        if over_budget and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(
+                f'{view} ran {stats.queries} queries, budget is {budget}: '
+                f'{record["duplicates"]}'
+            )
+        return response
@@ -0,0 +1,290 @@
+"""
+Runtime metrics in the Prometheus text format.
+
+Every web and celery worker process keeps its own counters and histograms
+in plain dicts: no locks and no shared state on the hot path (concurrent
+threads may rarely lose an increment, which is fine for monitoring). Every
+METRICS_PUBLISH_INTERVAL seconds a process writes a snapshot to the cache.
+Each process registers itself by claiming one of METRICS_MAX_PROCESSES
+slot keys with cache.add, so registration needs no shared read-modify-write;
+the slot and the snapshot expire when the process stops publishing.
+The metrics endpoint renders the snapshots of all live processes with a
+`process` label and leaves aggregation to Prometheus (`sum by (route)`).
+"""
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+PROCESS_SLOT_KEY = 'metrics:slot:{slot}'
+SNAPSHOT_KEY = 'metrics:process:{process}'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 15, 60, 300)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Requests by route, method and status code', None),
+    'http_request_duration_seconds': (
+        'histogram', 'Request latency by route and method', LATENCY_BUCKETS),
+    'db_queries_total': (
+        'counter', 'SQL queries run by route', None),
+    'db_query_duration_seconds_total': (
+        'counter', 'Time spent in SQL by route', None),
+    'cache_requests_total': (
+        'counter', 'Application cache lookups by cache and result', None),
+    'counter_flush_lag_seconds': (
+        'histogram', 'Delay between a counter bump and its database write', LAG_BUCKETS),
+    'task_queue_depth': (
+        'gauge', 'Messages waiting in a celery queue', None),
+}
+
+_counters = defaultdict(float)
+_histograms = {}
+_last_publish = 0.0
+_slot = None
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add `value` to a counter"""
+    _counters[(name, _labels(labels))] += value
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram"""
+    key = (name, _labels(labels))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        buckets = METRICS[name][2]
+        histogram = _histograms.setdefault(key, [[0] * (len(buckets) + 1), 0.0])
+
+    counts, _ = histogram
+    for index, bound in enumerate(METRICS[name][2]):
+        if value <= bound:
+            break
+    else:
+        index = len(counts) - 1
+    counts[index] += 1
+    histogram[1] += value
+
+
+def record_cache(name, hit):
+    """Count a hit or miss of one of the application caches"""
+    inc('cache_requests_total', cache=name, result='hit' if hit else 'miss')
+
+
+def process_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def snapshot():
+    return {
+        'counters': dict(_counters),
+        'histograms': {key: (list(counts), total) for key, (counts, total) in _histograms.items()},
+    }
+
+
+def _claim_slot(process, timeout):
+    for slot in range(settings.METRICS_MAX_PROCESSES):
+        if cache.add(PROCESS_SLOT_KEY.format(slot=slot), process, timeout):
+            return slot
+    logger.warning('No free metrics slot for %s; raise METRICS_MAX_PROCESSES', process)
+    return None
+
+
+def register(process, timeout):
+    """Keep this process's slot alive, claiming a free one if it has none or lost it"""
+    global _slot
+    key = PROCESS_SLOT_KEY.format(slot=_slot)
+    if _slot is not None and cache.get(key) == process:
+        cache.touch(key, timeout)
+    else:
+        _slot = _claim_slot(process, timeout)
+
+
+def live_processes():
+    keys = [PROCESS_SLOT_KEY.format(slot=slot) for slot in range(settings.METRICS_MAX_PROCESSES)]
+    return list(cache.get_many(keys).values())
+
+
+def publish():
+    """Write this process's metrics to the cache and register it as live"""
+    global _last_publish
+    _last_publish = time.monotonic()
+    timeout = settings.METRICS_PROCESS_TIMEOUT
+    process = process_name()
+
+    cache.set(SNAPSHOT_KEY.format(process=process), snapshot(), timeout)
+    register(process, timeout)
+
+
+def publish_due():
+    return time.monotonic() - _last_publish >= settings.METRICS_PUBLISH_INTERVAL
+
+
+def maybe_publish():
+    if publish_due():
+        try:
+            publish()
+        except Exception:
+            logger.warning('Could not publish metrics', exc_info=True)
+
+
+def task_queue_depths():
+    """Number of waiting messages per celery queue, read from the broker"""
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        return {}
+
+    from celery import current_app
+
+    depths = {}
+    try:
+        with current_app.connection_for_read() as connection:
+            channel = connection.default_channel
+            for queue in settings.METRICS_TASK_QUEUES:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception:
+        logger.warning('Could not read task queue depth', exc_info=True)
+    return depths
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(name, labels, value, extra=()):
+    pairs = list(labels) + list(extra)
+    if pairs:
+        label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in pairs)
+        return f'{name}{{{label_text}}} {value}'
+    return f'{name} {value}'
+
+
+def render():
+    """Collect every live process's snapshot and render the text exposition format"""
+    publish()
+
+    processes = live_processes()
+    snapshots = cache.get_many([SNAPSHOT_KEY.format(process=name) for name in processes])
+
+    series = defaultdict(list)
+    for name in processes:
+        data = snapshots.get(SNAPSHOT_KEY.format(process=name))
+        if data is None:
+            continue
+        process = (('process', name),)
+
+        for (metric, labels), value in data['counters'].items():
+            series[metric].append(_series(metric, process + labels, value))
+
+        for (metric, labels), (counts, total) in data['histograms'].items():
+            cumulative = 0
+            bounds = list(METRICS[metric][2]) + ['+Inf']
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                series[metric].append(_series(
+                    f'{metric}_bucket', process + labels, cumulative, [('le', bound)]
+                ))
+            series[metric].append(_series(f'{metric}_sum', process + labels, total))
+            series[metric].append(_series(f'{metric}_count', process + labels, cumulative))
+
+    for queue, depth in task_queue_depths().items():
+        series['task_queue_depth'].append(
+            _series('task_queue_depth', (('queue', queue),), depth)
+        )
+
+    lines = []
+    for metric, (kind, help_text, _) in METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        lines.extend(series.get(metric, []))
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryCounter:
+    """Execute wrapper counting queries and their time"""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Record latency and SQL work per route name (e.g. product-list)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = _QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        route = self.record(request, response, elapsed)
+        inc('db_queries_total', queries.queries, route=route)
+        inc('db_query_duration_seconds_total', queries.duration, route=route)
+
+        maybe_publish()
+        return response
+
+    async def __acall__(self, request):
+        # Async views query from executor threads whose connections are not
+        # visible here, so only latency is recorded
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+
+        # Check the interval here so most requests skip the thread hop
+        if publish_due():
+            await sync_to_async(maybe_publish)()
+        return response
+
+    def record(self, request, response, elapsed):
+        route = route_name(request)
+        inc('http_requests_total', route=route, method=request.method,
+            status=str(response.status_code))
+        observe('http_request_duration_seconds', elapsed, route=route, method=request.method)
+        return route
+
+
+def route_name(request):
+    match = request.resolver_match
+    # Unmatched paths share one label so scanners can't blow up cardinality
+    return match.view_name if match and match.view_name else 'unmatched'
@@ -0,0 +1,121 @@
+"""
+Read-replica routing.
+
+Catalog viewsets opt in with ReplicaReadMixin: safe requests to their
+`replica_actions` read from one of REPLICA_DATABASES. Every other query,
+every write and anything inside a transaction goes to the primary.
+
+Replicas lag behind the primary, so a user who just wrote something is
+pinned to the primary for REPLICA_PIN_SECONDS (read-your-writes).
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+PIN_KEY = 'db:pinned:{user_id}'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def pin_to_primary(user_id):
+    cache.set(PIN_KEY.format(user_id=user_id), 1, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(PIN_KEY.format(user_id=user_id)) is not None
+
+
+def use_replica(user):
+    """Send the rest of this request's reads to a replica, unless `user` is pinned"""
+    if not settings.REPLICA_DATABASES:
+        return
+    if user.is_authenticated and is_pinned(user.pk):
+        return
+    _read_alias.set(random.choice(settings.REPLICA_DATABASES))
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request, if any"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """ViewSet mixin: serve safe requests to `replica_actions` from a replica"""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            use_replica(request.user)
+
+
+class ReplicaPinningMiddleware:
+    """Scope replica routing to one request and pin users who wrote to the primary"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        user = self.writer(request, response)
+        if user is not None:
+            pin_to_primary(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        user = self.writer(request, response)
+        if user is not None:
+            await sync_to_async(pin_to_primary)(user.pk)
+        return response
+
+    def writer(self, request, response):
+        """The authenticated user behind a successful write, if any"""
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        # DRF stores the user it authenticated on the Django request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user
+        return None
@@ -11,15 +11,20 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .database import database_config, replica_configs
+
 # Load environment variables
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -43,6 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -55,12 +61,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'jaddid.metrics.MetricsMiddleware',
+    # Only active with QUERY_INSTRUMENTATION=True
+    'jaddid.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Only active when DB_REPLICAS is set
+    'jaddid.routing.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # i18n
@@ -91,20 +102,20 @@ WSGI_APPLICATION = 'jaddid.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Persistent connections and pgbouncer pooling modes, see jaddid/database.py
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('DB_NAME'),
-        'USER': os.getenv('DB_USER'),
-        'PASSWORD': os.getenv('DB_PASSWORD'),
-        'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT', '5432'),
-        'OPTIONS': {
-            'connect_timeout': 10,
-        },
-    }
+    'default': database_config('DB_'),
 }
 
+# Read replicas for catalog reads, e.g. DB_REPLICAS=replica with
+# DB_REPLICA_HOST=... (unset DB_REPLICA_* values fall back to DB_*)
+REPLICA_DATABASES = [alias for alias in os.getenv('DB_REPLICAS', '').split(',') if alias]
+DATABASES.update(replica_configs(REPLICA_DATABASES))
+DATABASE_ROUTERS = ['jaddid.routing.ReplicaRouter']
+# Seconds a user reads from the primary after a write
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -124,6 +135,76 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing: PASSWORD_HASHER picks the algorithm for new hashes
+# (pbkdf2, argon2 or bcrypt). Hashes made with the others still verify and
+# are upgraded on the next login. argon2/bcrypt need argon2-cffi/bcrypt.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'bcrypt': 'accounts.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', '600000'))
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '102400'))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '8'))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+
+# Login rate limits: (attempts, window in seconds), checked before the
+# password is hashed
+LOGIN_RATE_LIMITS = {
+    'ip': (30, 5 * 60),
+    'email': (10, 15 * 60),
+}
+
+# Bulk user import
+USER_IMPORT_BATCH_SIZE = 500
+USER_IMPORT_WORKERS = int(os.getenv('USER_IMPORT_WORKERS', str(min(os.cpu_count() or 1, 4))))
+# Uploaded files wait here (outside MEDIA_ROOT) until a worker imports them;
+# it must be shared with the Celery workers
+USER_IMPORT_ROOT = os.getenv('USER_IMPORT_ROOT', os.path.join(BASE_DIR, 'imports'))
+if TESTING:
+    USER_IMPORT_ROOT = os.path.join(BASE_DIR, '.test_imports')
+USER_IMPORT_JOB_TIMEOUT = 60 * 60 * 24
+# Row errors kept in a job's result; the rest are only counted
+USER_IMPORT_MAX_ERRORS = 1000
+
+# Streaming exports: rows fetched per server-side cursor round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# Bulk listing import
+LISTING_IMPORT_MAX_ROWS = 5000
+LISTING_IMPORT_BATCH_SIZE = 500
+
+# Batch price/quantity/status updates
+INVENTORY_UPDATE_MAX_ITEMS = 1000
+
+# Admin on large tables: above this many (estimated) rows changelists show
+# the planner's estimate instead of running COUNT(*)
+ADMIN_EXACT_COUNT_THRESHOLD = 10000
+ADMIN_FILTER_CACHE_TIMEOUT = 10 * 60
+# Admin actions over more rows than this run as chunked background jobs
+ADMIN_BULK_ACTION_CHUNK_SIZE = int(os.getenv('ADMIN_BULK_ACTION_CHUNK_SIZE', '1000'))
+
+# Per-request query counts, SQL/render timings (Server-Timing header and
+# the 'jaddid.queries' logger). Strict mode raises when a view exceeds its
+# query_budget; turn it on in tests.
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'False') == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# Runtime metrics served at /metrics/. Each process publishes its counters
+# to the cache every METRICS_PUBLISH_INTERVAL seconds; processes silent for
+# METRICS_PROCESS_TIMEOUT seconds are dropped. At most METRICS_MAX_PROCESSES
+# processes are reported.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_PUBLISH_INTERVAL = 15
+METRICS_PROCESS_TIMEOUT = 5 * 60
+METRICS_MAX_PROCESSES = int(os.getenv('METRICS_MAX_PROCESSES', '256'))
+METRICS_TASK_QUEUES = ['celery']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -153,6 +234,118 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+if TESTING:
+    MEDIA_ROOT = os.path.join(BASE_DIR, '.test_media')
+
+# Uploads are named by content hash (see jaddid/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'jaddid.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Media serving
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365  # content-addressed files
+MEDIA_LEGACY_CACHE_MAX_AGE = 60 * 60  # files uploaded before content addressing
+# e.g. /protected-media/ -> nginx `internal` location aliased to MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+
+# Cache (shared across workers when REDIS_URL is set)
+REDIS_URL = os.getenv('REDIS_URL')
+
+# State other processes must see (notification versions, the revocation
+# filter) goes to the 'shared' cache. Without Redis it is a file-based cache
+# shared by the processes of one host; run Redis when serving from several.
+SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', os.path.join(BASE_DIR, '.shared_cache'))
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': SHARED_CACHE_DIR,
+        },
+    }
+if TESTING:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    }
+
+# Notifications long-poll / SSE (seconds)
+NOTIFICATIONS_LONGPOLL_TIMEOUT = int(os.getenv('NOTIFICATIONS_LONGPOLL_TIMEOUT', '25'))
+NOTIFICATIONS_POLL_INTERVAL = float(os.getenv('NOTIFICATIONS_POLL_INTERVAL', '1'))
+NOTIFICATIONS_STREAM_DURATION = int(os.getenv('NOTIFICATIONS_STREAM_DURATION', '300'))
+# The sync SSE action holds a worker thread, so it closes sooner; EventSource
+# reconnects with Last-Event-ID and misses nothing
+NOTIFICATIONS_SYNC_STREAM_DURATION = int(os.getenv('NOTIFICATIONS_SYNC_STREAM_DURATION', '30'))
+
+# Serve long-poll/SSE/inbox message endpoints from native async views (ASGI only)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Public seller profiles (seconds)
+SELLER_PROFILE_CACHE_TIMEOUT = 5 * 60
+
+# Celery (background tasks)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_TASK_IGNORE_RESULT = True
+# Run tasks inline in tests and when no broker is configured
+CELERY_TASK_ALWAYS_EAGER = TESTING or not CELERY_BROKER_URL
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_IMPORTS = ['jaddid.images', 'jaddid.admin']
+
+# View/favorite counters are buffered in Redis and written in batches by
+# celery beat; without Redis and a broker every bump is its own task
+COUNTER_BUFFERING = os.getenv(
+    'COUNTER_BUFFERING', str(bool(REDIS_URL) and not CELERY_TASK_ALWAYS_EAGER)
+) == 'True'
+COUNTER_FLUSH_INTERVAL = int(os.getenv('COUNTER_FLUSH_INTERVAL', '10'))
+COUNTER_BUFFER_TIMEOUT = 24 * 60 * 60
+
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-tokens': {
+        'task': 'accounts.tasks.purge_expired_tokens_task',
+        'schedule': 60 * 60,
+    },
+    'flush-counters': {
+        'task': 'marketplace.tasks.flush_counters_task',
+        'schedule': COUNTER_FLUSH_INTERVAL,
+    },
+}
+
+# Image uploads
+MAX_UPLOAD_IMAGES = 10
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024  # bytes
+MAX_IMAGE_PIXELS = 40_000_000
+# Larger request bodies are streamed to a temp file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2_621_440
+
+# Responsive image variants: size name -> longest side in pixels
+IMAGE_VARIANT_SIZES = {
+    'thumbnail': 320,
+    'medium': 800,
+    'large': 1600,
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -170,18 +363,37 @@ CORS_ALLOW_CREDENTIALS = True
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # JSONRenderer that reports its time to QueryInstrumentationMiddleware
+    'DEFAULT_RENDERER_CLASSES': (
+        'jaddid.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
+    # Reverse proxies in front of the app (nginx = 1). Client addresses for
+    # throttles and login limits come from REMOTE_ADDR when 0, otherwise from
+    # the entry that many hops from the right of X-Forwarded-For, so clients
+    # cannot forge them.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
-AUTH_USER_MODEL = 'accounts.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'accounts.User'
+
+# Seconds a worker trusts a checked token version before asking the cache again;
+# revoked tokens stop working within this window
+TOKEN_VERSION_CACHE_TTL = int(os.getenv('TOKEN_VERSION_CACHE_TTL', '30'))
+
+# Refresh token revocation list (see accounts.revocation)
+REVOCATION_FILTER_TTL = int(os.getenv('REVOCATION_FILTER_TTL', '300'))
+REVOCATION_FILTER_ERROR_RATE = 0.001
+TOKEN_PURGE_BATCH_SIZE = 5000
@@ -0,0 +1,155 @@
+"""
+Content-addressed media storage.
+
+Files are named after the SHA-256 of their bytes, e.g.
+    3f/a2/3fa2...c9.jpg
+so a name never changes meaning (safe to cache forever) and identical
+uploads share one file on disk. Because a file can back several rows,
+deleting a row never deletes its file; `manage.py sweep_media` removes
+files no row references any more.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils import timezone
+
+
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+
+def hashed_digest(name):
+    """Return the content hash encoded in a storage name, or None for legacy names"""
+    match = HASHED_NAME_RE.match(name)
+    return match.group('digest') if match else None
+
+
+class ContentAddressedMixin:
+    """
+    Storage mixin that ignores the requested directory and names files by content.
+    Combine it with a concrete storage backend.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        digest = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return posixpath.join(digest[:2], digest[2:4], f'{digest}{ext}')
+
+    def get_available_name(self, name, max_length=None):
+        # Equal names mean equal bytes, so an existing file is reused, never renamed
+        return name
+
+    def delete(self, name):
+        # Files can be shared by several rows; see sweep_unreferenced()
+        pass
+
+    def purge(self, name):
+        """Really delete a file; only for files no row references"""
+        super().delete(name)
+
+
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    """Local filesystem implementation, used in development and tests"""
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        full_path = self.path(name)
+        try:
+            # Reuse the file, touched so sweep_unreferenced() treats it as a fresh upload
+            os.utime(full_path)
+            return name
+        except FileNotFoundError:
+            pass
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temp file and rename, so concurrent uploads of the same
+        # bytes never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    out.write(chunk)
+            # mkstemp creates files as 0600; make them readable by the web server
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return name
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def referenced_names(storage):
+    """Every name stored in a file field on `storage` or in an image variants JSON field"""
+    names = set()
+    for model in apps.get_models():
+        fields = [
+            field for field in model._meta.concrete_fields
+            if (isinstance(field, models.FileField) and field.storage == storage)
+            or (isinstance(field, models.JSONField) and field.name.endswith('variants'))
+        ]
+        if not fields:
+            continue
+
+        rows = model._base_manager.values_list(*(field.attname for field in fields))
+        for row in rows.iterator(chunk_size=5000):
+            for value in row:
+                names.update(_strings(value))
+    names.discard('')
+    return names
+
+
+def _walk(storage, path=''):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from _walk(storage, posixpath.join(path, directory))
+
+
+def sweep_unreferenced(storage, min_age=timedelta(days=1), dry_run=False):
+    """
+    Delete content-addressed files that no row references.
+
+    Files younger than `min_age` are kept: an upload is stored before the
+    row that points to it is committed. Returns the names removed (or that
+    would be removed with `dry_run`).
+    """
+    cutoff = timezone.now() - min_age
+    referenced = referenced_names(storage)
+
+    removed = []
+    for name in _walk(storage):
+        if name in referenced or not hashed_digest(name):
+            continue
+        if storage.get_modified_time(name) > cutoff:
+            continue
+        if not dry_run:
+            storage.purge(name)
+        removed.append(name)
+    return removed
@@ -0,0 +1,189 @@
+"""
+Bounded image upload pipeline for listing/product images.
+
+Uploads are checked for file size and pixel count from the header alone,
+before any pixel data is decoded. Metadata (EXIF/XMP, comments, PNG text
+chunks) is stripped. Files are deduplicated by the hash of the stored
+bytes and image rows are inserted in one bulk_create.
+"""
+import hashlib
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils.translation import gettext_lazy as _
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+from .images import schedule_variants
+
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+# Formats that are re-encoded when they carry metadata
+STRIP_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'WEBP': {'quality': 90},
+    'PNG': {'optimize': True},
+    'GIF': {'save_all': True},
+}
+
+# `info` keys Pillow fills from metadata blocks; PNG text chunks are in `image.text`
+METADATA_KEYS = ('exif', 'xmp', 'comment', 'photoshop')
+
+TOO_MANY_IMAGES = _('A listing cannot have more than {max_images} images.')
+
+PreparedImage = namedtuple('PreparedImage', ['content_hash', 'name', 'content'])
+
+
+class BoundedImageField(serializers.FileField):
+    """
+    Image field that rejects oversized files and pixel bombs before decoding.
+    Only the image header is parsed here.
+    """
+    default_error_messages = {
+        'file_too_large': _('Image file size cannot exceed {max_mb}MB.'),
+        'too_many_pixels': _('Image dimensions cannot exceed {max_pixels} pixels.'),
+        'invalid_image': _('Upload a valid image. Allowed formats: JPEG, PNG, GIF, WEBP.'),
+    }
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+
+        max_size = settings.MAX_IMAGE_UPLOAD_SIZE
+        if file.size > max_size:
+            self.fail('file_too_large', max_mb=max_size // (1024 * 1024))
+
+        try:
+            image = Image.open(file)
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+
+        if image.format not in ALLOWED_FORMATS:
+            self.fail('invalid_image')
+
+        if image.width * image.height > settings.MAX_IMAGE_PIXELS:
+            self.fail('too_many_pixels', max_pixels=settings.MAX_IMAGE_PIXELS)
+
+        file.seek(0)
+        return file
+
+
+def content_hash(upload):
+    """SHA-256 of an upload, read chunk by chunk"""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def has_metadata(image):
+    """Whether an opened image carries metadata worth stripping"""
+    if any(key in image.info for key in METADATA_KEYS):
+        return True
+    return image.format == 'PNG' and bool(image.text)
+
+
+def strip_metadata(upload):
+    """
+    Return the upload without its metadata.
+    Files without metadata are passed through untouched so they stream to storage as is.
+    """
+    image = Image.open(upload)
+    options = STRIP_OPTIONS.get(image.format)
+    if options is None or not has_metadata(image):
+        upload.seek(0)
+        return upload
+
+    image_format = image.format
+    icc_profile = image.info.get('icc_profile')
+    if image_format != 'GIF':
+        # GIFs have no orientation, and transposing would drop their other frames
+        image = ImageOps.exif_transpose(image)
+    # Pillow writes some of these back from `info` when saving
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+
+    buffer = BytesIO()
+    if icc_profile:
+        options = dict(options, icc_profile=icc_profile)
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def prepare_image(upload):
+    """Clean one upload and hash the bytes that will be stored"""
+    content = strip_metadata(upload)
+    return PreparedImage(
+        content_hash=content_hash(content),
+        name=os.path.basename(upload.name),
+        content=content,
+    )
+
+
+def save_images(model, parent_field, parent, uploads, start=0):
+    """
+    Store uploads for `parent` and insert their rows with one bulk_create.
+
+    Files already stored under the same content hash are reused instead of
+    being written again. Images the parent already has are skipped. Raises
+    ValidationError if the parent would end up with more than
+    MAX_UPLOAD_IMAGES images; `start` is the number it already has.
+    """
+    if not uploads:
+        return []
+
+    field = model._meta.get_field('image')
+    prepared = [prepare_image(upload) for upload in uploads]
+
+    known = {}
+    attached = set()
+    existing = model.objects.filter(
+        content_hash__in={image.content_hash for image in prepared}
+    ).values_list('content_hash', 'image', 'variants', f'{parent_field}_id')
+    for digest, name, variants, parent_id in existing:
+        known.setdefault(digest, (name, variants))
+        if parent_id == parent.pk:
+            attached.add(digest)
+
+    new_images = []
+    for image in prepared:
+        if image.content_hash not in attached:
+            attached.add(image.content_hash)
+            new_images.append(image)
+
+    max_images = settings.MAX_UPLOAD_IMAGES
+    if start + len(new_images) > max_images:
+        raise serializers.ValidationError({'uploaded_images': [
+            TOO_MANY_IMAGES.format(max_images=max_images)
+        ]})
+
+    rows = []
+    for image in new_images:
+        if image.content_hash in known:
+            name, variants = known[image.content_hash]
+        else:
+            filename = field.generate_filename(model(**{parent_field: parent}), image.name)
+            name = field.storage.save(filename, image.content)
+            variants = {}
+            known[image.content_hash] = (name, variants)
+
+        order = start + len(rows)
+        rows.append(model(
+            **{parent_field: parent},
+            image=name,
+            variants=variants,
+            content_hash=image.content_hash,
+            is_primary=(order == 0),
+            order=order,
+        ))
+
+    model.objects.bulk_create(rows)
+
+    # bulk_create skips post_save, so queue the responsive sizes here
+    for row in rows:
+        schedule_variants(row, 'image', 'variants')
+    return rows
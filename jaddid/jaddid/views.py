@@ -0,0 +1,77 @@
+import mimetypes
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+
+from . import metrics as runtime_metrics
+from .storage import hashed_digest
+
+
+def _cache_headers(response, path):
+    """Content-addressed files never change, so they can be cached forever"""
+    digest = hashed_digest(path)
+    if digest:
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+        response['ETag'] = f'"{digest}"'
+    else:
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_LEGACY_CACHE_MAX_AGE}'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve an uploaded file.
+
+    With MEDIA_ACCEL_REDIRECT_PREFIX set, nginx sends the bytes through
+    X-Accel-Redirect. Otherwise files are only served in DEBUG, streamed
+    with FileResponse; production servers without the prefix must serve
+    MEDIA_ROOT themselves.
+    """
+    if not (settings.DEBUG or settings.MEDIA_ACCEL_REDIRECT_PREFIX):
+        raise Http404('Media is served by the web server')
+
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+
+    digest = hashed_digest(path)
+    if digest and request.META.get('HTTP_IF_NONE_MATCH') == f'"{digest}"':
+        return _cache_headers(HttpResponseNotModified(), path)
+
+    if not default_storage.exists(path):
+        raise Http404('File not found')
+
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Last-Modified'] = http_date(default_storage.get_modified_time(path).timestamp())
+    if encoding:
+        response['Content-Encoding'] = encoding
+
+    return _cache_headers(response, path)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Prometheus scrape endpoint (staff only)"""
+    return HttpResponse(
+        runtime_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
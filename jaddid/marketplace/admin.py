@@ -1,5 +1,10 @@
 from django.contrib import admin
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
+from jaddid.admin import BulkActionAdminMixin, LargeTableAdminMixin
+from jaddid.images import variant_url
+from .bulk_actions import set_listing_status, set_report_status, set_review_approval
 from .models import (
     Category, Material, MaterialListing, MaterialImage,
     Product, ProductImage, Cart, CartItem, Favorite,
@@ -22,13 +27,14 @@ class ProductImageInline(admin.TabularInline):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Category model"""
     list_display = ['name', 'name_ar', 'parent', 'is_active', 'product_count', 'created_at']
     list_filter = ['is_active', 'parent', 'created_at']
     search_fields = ['name', 'name_ar', 'description']
     ordering = ['name']
     list_per_page = 50
+    list_select_related = ['parent']
     
     fieldsets = (
         ('Basic Information', {
@@ -39,19 +45,26 @@ class CategoryAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_product_count=Count('products', filter=Q(products__status='active'))
+        )
+    
     def product_count(self, obj):
-        return obj.products.filter(status='active').count()
+        return obj.active_product_count
     product_count.short_description = 'Active Products'
+    product_count.admin_order_field = 'active_product_count'
 
 
 @admin.register(Material)
-class MaterialAdmin(admin.ModelAdmin):
+class MaterialAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Material (Master Data) model"""
     list_display = ['name', 'name_ar', 'category', 'default_unit', 'is_active', 'listing_count', 'created_at']
     list_filter = ['is_active', 'category', 'created_at']
     search_fields = ['name', 'name_ar', 'description']
     ordering = ['name']
     list_per_page = 50
+    list_select_related = ['category']
     
     fieldsets = (
         ('Basic Information', {
@@ -65,13 +78,19 @@ class MaterialAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_listing_count=Count('listings', filter=Q(listings__status='active'))
+        )
+    
     def listing_count(self, obj):
-        return obj.listings.filter(status='active').count()
+        return obj.active_listing_count
     listing_count.short_description = 'Active Listings'
+    listing_count.admin_order_field = 'active_listing_count'
 
 
 @admin.register(MaterialListing)
-class MaterialListingAdmin(admin.ModelAdmin):
+class MaterialListingAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Material Listing model"""
     list_display = [
         'title', 'material', 'seller_info', 'quantity', 'unit',
@@ -84,6 +103,7 @@ class MaterialListingAdmin(admin.ModelAdmin):
     search_fields = ['title', 'title_ar', 'description', 'location', 'seller__email', 'material__name']
     ordering = ['-created_at']
     list_per_page = 50
+    list_select_related = ['seller', 'material']
     inlines = [MaterialImageInline]
     readonly_fields = ['total_price', 'views_count', 'favorites_count', 'created_at', 'updated_at', 'published_at']
     
@@ -121,35 +141,44 @@ class MaterialListingAdmin(admin.ModelAdmin):
     def seller_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.seller.id,
+            obj.seller_id,
             obj.seller.email
         )
     seller_info.short_description = 'Seller'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            total_price_value=F('quantity') * F('price_per_unit')
+        )
+    
     def total_price_display(self, obj):
-        return f'{obj.total_price:.2f}'
+        return f'{obj.total_price_value:.2f}'
     total_price_display.short_description = 'Total Price'
+    total_price_display.admin_order_field = 'total_price_value'
     
     actions = ['make_active', 'make_draft', 'make_sold']
     
     def make_active(self, request, queryset):
-        updated = queryset.update(status='active')
-        self.message_user(request, f'{updated} listings marked as active.')
+        self.run_bulk_action(
+            request, queryset, set_listing_status, 'listings marked as active', status='active'
+        )
     make_active.short_description = 'Mark selected listings as active'
     
     def make_draft(self, request, queryset):
-        updated = queryset.update(status='draft')
-        self.message_user(request, f'{updated} listings marked as draft.')
+        self.run_bulk_action(
+            request, queryset, set_listing_status, 'listings marked as draft', status='draft'
+        )
     make_draft.short_description = 'Mark selected listings as draft'
     
     def make_sold(self, request, queryset):
-        updated = queryset.update(status='sold')
-        self.message_user(request, f'{updated} listings marked as sold.')
+        self.run_bulk_action(
+            request, queryset, set_listing_status, 'listings marked as sold', status='sold'
+        )
     make_sold.short_description = 'Mark selected listings as sold'
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Product model"""
     list_display = [
         'title', 'seller_info', 'category', 'price', 'quantity',
@@ -161,6 +190,7 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['title', 'title_ar', 'description', 'location', 'seller__email']
     ordering = ['-created_at']
     list_per_page = 50
+    list_select_related = ['seller', 'category']
     inlines = [ProductImageInline]
     readonly_fields = ['views_count', 'favorites_count', 'created_at', 'updated_at', 'published_at']
     
@@ -195,7 +225,7 @@ class ProductAdmin(admin.ModelAdmin):
     def seller_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.seller.id,
+            obj.seller_id,
             obj.seller.email
         )
     seller_info.short_description = 'Seller'
@@ -203,34 +233,38 @@ class ProductAdmin(admin.ModelAdmin):
     actions = ['make_active', 'make_draft', 'make_sold']
     
     def make_active(self, request, queryset):
-        updated = queryset.update(status='active')
-        self.message_user(request, f'{updated} products marked as active.')
+        self.run_bulk_action(
+            request, queryset, set_listing_status, 'products marked as active', status='active'
+        )
     make_active.short_description = 'Mark selected products as active'
     
     def make_draft(self, request, queryset):
-        updated = queryset.update(status='draft')
-        self.message_user(request, f'{updated} products marked as draft.')
+        self.run_bulk_action(
+            request, queryset, set_listing_status, 'products marked as draft', status='draft'
+        )
     make_draft.short_description = 'Mark selected products as draft'
     
     def make_sold(self, request, queryset):
-        updated = queryset.update(status='sold')
-        self.message_user(request, f'{updated} products marked as sold.')
+        self.run_bulk_action(
+            request, queryset, set_listing_status, 'products marked as sold', status='sold'
+        )
     make_sold.short_description = 'Mark selected products as sold'
 
 
 @admin.register(ProductImage)
-class ProductImageAdmin(admin.ModelAdmin):
+class ProductImageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for ProductImage model"""
     list_display = ['product', 'is_primary', 'order', 'image_preview', 'created_at']
     list_filter = ['is_primary', 'created_at']
     search_fields = ['product__title']
     ordering = ['product', 'order']
+    list_select_related = ['product__seller']
     
     def image_preview(self, obj):
         if obj.image:
             return format_html(
                 '<img src="{}" width="50" height="50" style="object-fit: cover;" />',
-                obj.image.url
+                variant_url(obj.image, obj.variants, 'thumbnail')
             )
         return '-'
     image_preview.short_description = 'Preview'
@@ -244,6 +278,11 @@ class CartItemInline(admin.TabularInline):
     readonly_fields = ['item_display', 'unit_price_display', 'subtotal_display']
     can_delete = True
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'product', 'material_listing__material'
+        )
+    
     def item_display(self, obj):
         """Display the cart item"""
         if obj.product:
@@ -271,7 +310,7 @@ class CartItemInline(admin.TabularInline):
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Cart model"""
     list_display = ['user_info', 'total_items_display', 'total_price_display', 'updated_at', 'created_at']
     list_filter = ['created_at', 'updated_at']
@@ -279,6 +318,7 @@ class CartAdmin(admin.ModelAdmin):
     ordering = ['-updated_at']
     readonly_fields = ['created_at', 'updated_at']
     inlines = [CartItemInline]
+    list_select_related = ['user']
     
     fieldsets = (
         ('Cart Information', {
@@ -293,22 +333,36 @@ class CartAdmin(admin.ModelAdmin):
     def user_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.user.id,
+            obj.user_id,
             obj.user.email
         )
     user_info.short_description = 'User'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            item_count=Count('items'),
+            total_price_value=Sum(
+                F('items__quantity') * Coalesce(
+                    F('items__product__price'),
+                    F('items__material_listing__price_per_unit')
+                ),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        )
+    
     def total_items_display(self, obj):
-        return obj.total_items
+        return obj.item_count
     total_items_display.short_description = 'Total Items'
+    total_items_display.admin_order_field = 'item_count'
     
     def total_price_display(self, obj):
-        return f'{obj.total_price:.2f}'
+        return f'{obj.total_price_value or 0:.2f}'
     total_price_display.short_description = 'Total Price'
+    total_price_display.admin_order_field = 'total_price_value'
 
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for CartItem model"""
     list_display = ['cart_user', 'item_type_display', 'item_display', 'quantity', 'unit_price_display', 'subtotal_display', 'created_at']
     list_filter = ['created_at', 'updated_at']
@@ -318,6 +372,7 @@ class CartItemAdmin(admin.ModelAdmin):
     ]
     ordering = ['-created_at']
     readonly_fields = ['unit_price_display', 'subtotal_display', 'created_at', 'updated_at']
+    list_select_related = ['cart__user', 'product', 'material_listing__material']
     
     fieldsets = (
         ('Cart', {
@@ -343,16 +398,16 @@ class CartItemAdmin(admin.ModelAdmin):
     def cart_user(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.cart.user.id,
+            obj.cart.user_id,
             obj.cart.user.email
         )
     cart_user.short_description = 'User'
     
     def item_type_display(self, obj):
         """Display item type"""
-        if obj.product:
+        if obj.product_id:
             return format_html('<span style="color: #28a745;">📦 Product</span>')
-        elif obj.material_listing:
+        elif obj.material_listing_id:
             return format_html('<span style="color: #fd7e14;">🧱 Material</span>')
         return '-'
     item_type_display.short_description = 'Type'
@@ -384,29 +439,30 @@ class CartItemAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Favorite model"""
     list_display = ['user_info', 'item_type_display', 'item_display', 'created_at']
     list_filter = ['created_at']
     search_fields = [
         'user__email', 'product__title', 
-        'material_listing__material__name_en'
+        'material_listing__material__name'
     ]
     ordering = ['-created_at']
+    list_select_related = ['user', 'product', 'material_listing__material']
     
     def user_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.user.id,
+            obj.user_id,
             obj.user.email
         )
     user_info.short_description = 'User'
     
     def item_type_display(self, obj):
         """Display favorite type"""
-        if obj.product:
+        if obj.product_id:
             return format_html('<span style="color: #28a745;">📦 Product</span>')
-        elif obj.material_listing:
+        elif obj.material_listing_id:
             return format_html('<span style="color: #fd7e14;">🧱 Material</span>')
         return '-'
     item_type_display.short_description = 'Type'
@@ -423,14 +479,14 @@ class FavoriteAdmin(admin.ModelAdmin):
             return format_html(
                 '<a href="/admin/marketplace/materiallisting/{}/change/">{}</a>',
                 obj.material_listing.id,
-                obj.material_listing.material.name_en
+                obj.material_listing.material.name
             )
         return '-'
     item_display.short_description = 'Item'
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Order model"""
     list_display = [
         'order_number', 'buyer_info', 'seller_info', 'order_type_display',
@@ -443,9 +499,10 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     search_fields = [
         'order_number', 'buyer__email', 'seller__email', 
-        'product__title', 'material_listing__material__name_en'
+        'product__title', 'material_listing__material__name'
     ]
     ordering = ['-created_at']
+    list_select_related = ['buyer', 'seller', 'product', 'material_listing__material']
     readonly_fields = [
         'order_number', 'order_type', 'total_price', 'created_at', 
         'updated_at', 'confirmed_at', 'completed_at'
@@ -481,7 +538,7 @@ class OrderAdmin(admin.ModelAdmin):
     def buyer_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.buyer.id,
+            obj.buyer_id,
             obj.buyer.email
         )
     buyer_info.short_description = 'Buyer'
@@ -489,7 +546,7 @@ class OrderAdmin(admin.ModelAdmin):
     def seller_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.seller.id,
+            obj.seller_id,
             obj.seller.email
         )
     seller_info.short_description = 'Seller'
@@ -521,7 +578,7 @@ class OrderAdmin(admin.ModelAdmin):
             return format_html(
                 '<a href="/admin/marketplace/materiallisting/{}/change/">{} ({})</a>',
                 obj.material_listing.id,
-                obj.material_listing.material.name_en,
+                obj.material_listing.material.name,
                 obj.material_listing.get_condition_display()
             )
         return '-'
@@ -529,7 +586,7 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Review model"""
     list_display = [
         'item_type_display', 'item_display', 'reviewer_info', 'rating', 
@@ -539,10 +596,11 @@ class ReviewAdmin(admin.ModelAdmin):
         'rating', 'is_verified_purchase', 'is_approved', 'created_at'
     ]
     search_fields = [
-        'product__title', 'material_listing__material__name_en',
+        'product__title', 'material_listing__material__name',
         'reviewer__email', 'title', 'comment'
     ]
     ordering = ['-created_at']
+    list_select_related = ['reviewer', 'product', 'material_listing__material']
     readonly_fields = ['is_verified_purchase', 'created_at', 'updated_at']
     
     fieldsets = (
@@ -567,9 +625,9 @@ class ReviewAdmin(admin.ModelAdmin):
     
     def item_type_display(self, obj):
         """Display review type"""
-        if obj.product:
+        if obj.product_id:
             return format_html('<span style="color: #28a745;">📦 Product</span>')
-        elif obj.material_listing:
+        elif obj.material_listing_id:
             return format_html('<span style="color: #fd7e14;">🧱 Material</span>')
         return '-'
     item_type_display.short_description = 'Type'
@@ -586,7 +644,7 @@ class ReviewAdmin(admin.ModelAdmin):
             return format_html(
                 '<a href="/admin/marketplace/materiallisting/{}/change/">{}</a>',
                 obj.material_listing.id,
-                obj.material_listing.material.name_en
+                obj.material_listing.material.name
             )
         return '-'
     item_display.short_description = 'Item'
@@ -594,7 +652,7 @@ class ReviewAdmin(admin.ModelAdmin):
     def reviewer_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.reviewer.id,
+            obj.reviewer_id,
             obj.reviewer.email
         )
     reviewer_info.short_description = 'Reviewer'
@@ -602,18 +660,20 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=True)
-        self.message_user(request, f'{updated} reviews approved.')
+        self.run_bulk_action(
+            request, queryset, set_review_approval, 'reviews approved', is_approved=True
+        )
     approve_reviews.short_description = 'Approve selected reviews'
     
     def disapprove_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=False)
-        self.message_user(request, f'{updated} reviews disapproved.')
+        self.run_bulk_action(
+            request, queryset, set_review_approval, 'reviews disapproved', is_approved=False
+        )
     disapprove_reviews.short_description = 'Disapprove selected reviews'
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Message model"""
     list_display = [
         'sender_info', 'recipient_info', 'item_type_display', 
@@ -623,9 +683,10 @@ class MessageAdmin(admin.ModelAdmin):
     search_fields = [
         'sender__email', 'recipient__email', 
         'subject', 'message', 'product__title',
-        'material_listing__material__name_en'
+        'material_listing__material__name'
     ]
     ordering = ['-created_at']
+    list_select_related = ['sender', 'recipient', 'product', 'material_listing__material']
     readonly_fields = ['created_at', 'read_at']
     
     fieldsets = (
@@ -650,7 +711,7 @@ class MessageAdmin(admin.ModelAdmin):
     def sender_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.sender.id,
+            obj.sender_id,
             obj.sender.email
         )
     sender_info.short_description = 'Sender'
@@ -658,16 +719,16 @@ class MessageAdmin(admin.ModelAdmin):
     def recipient_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.recipient.id,
+            obj.recipient_id,
             obj.recipient.email
         )
     recipient_info.short_description = 'Recipient'
     
     def item_type_display(self, obj):
         """Display message item type"""
-        if obj.product:
+        if obj.product_id:
             return format_html('<span style="color: #28a745;">📦 Product</span>')
-        elif obj.material_listing:
+        elif obj.material_listing_id:
             return format_html('<span style="color: #fd7e14;">🧱 Material</span>')
         return '-'
     item_type_display.short_description = 'Type'
@@ -684,14 +745,14 @@ class MessageAdmin(admin.ModelAdmin):
             return format_html(
                 '<a href="/admin/marketplace/materiallisting/{}/change/">{}</a>',
                 obj.material_listing.id,
-                obj.material_listing.material.name_en
+                obj.material_listing.material.name
             )
         return '-'
     item_display.short_description = 'Item'
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """Admin for Report model"""
     list_display = [
         'reporter_info', 'item_type_display', 'item_display', 'reason', 
@@ -700,10 +761,11 @@ class ReportAdmin(admin.ModelAdmin):
     list_filter = ['status', 'reason', 'created_at', 'resolved_at']
     search_fields = [
         'reporter__email', 'product__title', 
-        'material_listing__material__name_en',
+        'material_listing__material__name',
         'description', 'admin_notes'
     ]
     ordering = ['-created_at']
+    list_select_related = ['reporter', 'product', 'material_listing__material']
     readonly_fields = ['created_at', 'updated_at', 'resolved_at']
     
     fieldsets = (
@@ -729,16 +791,16 @@ class ReportAdmin(admin.ModelAdmin):
     def reporter_info(self, obj):
         return format_html(
             '<a href="/admin/accounts/user/{}/change/">{}</a>',
-            obj.reporter.id,
+            obj.reporter_id,
             obj.reporter.email
         )
     reporter_info.short_description = 'Reporter'
     
     def item_type_display(self, obj):
         """Display reported item type"""
-        if obj.product:
+        if obj.product_id:
             return format_html('<span style="color: #28a745;">📦 Product</span>')
-        elif obj.material_listing:
+        elif obj.material_listing_id:
             return format_html('<span style="color: #fd7e14;">🧱 Material</span>')
         return '-'
     item_type_display.short_description = 'Type'
@@ -755,7 +817,7 @@ class ReportAdmin(admin.ModelAdmin):
             return format_html(
                 '<a href="/admin/marketplace/materiallisting/{}/change/">{}</a>',
                 obj.material_listing.id,
-                obj.material_listing.material.name_en
+                obj.material_listing.material.name
             )
         return '-'
     item_display.short_description = 'Item'
@@ -763,26 +825,21 @@ class ReportAdmin(admin.ModelAdmin):
     actions = ['mark_reviewing', 'mark_resolved', 'mark_dismissed']
     
     def mark_reviewing(self, request, queryset):
-        updated = queryset.update(status='reviewing')
-        self.message_user(request, f'{updated} reports marked as reviewing.')
+        self.run_bulk_action(
+            request, queryset, set_report_status, 'reports marked as reviewing', status='reviewing'
+        )
     mark_reviewing.short_description = 'Mark as reviewing'
     
     def mark_resolved(self, request, queryset):
-        from django.utils import timezone
-        updated = queryset.update(
-            status='resolved',
-            resolved_by=request.user,
-            resolved_at=timezone.now()
+        self.run_bulk_action(
+            request, queryset, set_report_status, 'reports marked as resolved',
+            status='resolved', resolved_by_id=str(request.user.pk)
         )
-        self.message_user(request, f'{updated} reports marked as resolved.')
     mark_resolved.short_description = 'Mark as resolved'
     
     def mark_dismissed(self, request, queryset):
-        from django.utils import timezone
-        updated = queryset.update(
-            status='dismissed',
-            resolved_by=request.user,
-            resolved_at=timezone.now()
+        self.run_bulk_action(
+            request, queryset, set_report_status, 'reports marked as dismissed',
+            status='dismissed', resolved_by_id=str(request.user.pk)
         )
-        self.message_user(request, f'{updated} reports marked as dismissed.')
     mark_dismissed.short_description = 'Mark as dismissed'
@@ -0,0 +1,127 @@
+"""
+Native async versions of the long-lived messaging / notification endpoints.
+
+Long-polls and SSE streams spend nearly all their time waiting. As DRF
+actions each one holds a worker thread for up to a minute; these views
+wait on the event loop instead, so one ASGI worker holds thousands of
+them. They are mounted over the DRF routes (same paths, same responses)
+when ASYNC_VIEWS is on, which only makes sense under an ASGI server.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from accounts.authentication import ClaimsJWTAuthentication
+from .models import Message
+from .notifications import aevent_stream, aget_snapshot, await_change, parse_version
+from .serializers import MessageSerializer
+
+
+_authentication = ClaimsJWTAuthentication()
+
+
+def _error(exc):
+    data = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = _authentication.authenticate_header(None)
+    return response
+
+
+def async_api_view(view):
+    """Authenticate a GET-only async view with the API's JWT authentication"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return _error(exceptions.MethodNotAllowed(request.method))
+
+        try:
+            # Token checks may touch the cache or the database
+            result = await sync_to_async(_authentication.authenticate)(request)
+        except exceptions.APIException as e:
+            return _error(e)
+        if result is None:
+            return _error(exceptions.NotAuthenticated())
+
+        request.user = result[0]
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_api_view
+async def poll(request):
+    """Long-poll for unread count / order changes (see MessageViewSet.poll)"""
+    since = parse_version(request.GET.get('since'))
+    timeout = settings.NOTIFICATIONS_LONGPOLL_TIMEOUT
+    requested = parse_version(request.GET.get('timeout'))
+    if requested is not None:
+        timeout = max(0, min(requested, timeout))
+
+    if since is not None and await await_change(request.user.pk, since, timeout) == since:
+        return HttpResponseNotModified()
+    return JsonResponse(await aget_snapshot(request.user.pk))
+
+
+@async_api_view
+async def stream(request):
+    """Server-Sent Events stream of unread count / order changes"""
+    since = parse_version(
+        request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('since')
+    )
+    response = StreamingHttpResponse(
+        aevent_stream(request.user.pk, since),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@async_api_view
+async def unread_count(request):
+    snapshot = await aget_snapshot(request.user.pk)
+    return JsonResponse({'unread_count': snapshot['unread_count']})
+
+
+@async_api_view
+async def inbox(request):
+    """Received messages, paginated like the DRF action"""
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        return _error(exceptions.NotFound('Invalid page.'))
+
+    # Everything the serializer reads is joined, so it never queries lazily
+    queryset = Message.objects.filter(
+        recipient_id=request.user.pk
+    ).select_related(
+        'sender', 'recipient', 'product', 'material_listing'
+    ).order_by('-created_at')
+
+    count = await queryset.acount()
+    offset = (page - 1) * page_size
+    if page > 1 and offset >= count:
+        return _error(exceptions.NotFound('Invalid page.'))
+    messages = [message async for message in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = (
+            remove_query_param(url, 'page') if page == 2
+            else replace_query_param(url, 'page', page - 1)
+        )
+    return JsonResponse({
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': previous,
+        'results': MessageSerializer(messages, many=True, context={'request': request}).data,
+    })
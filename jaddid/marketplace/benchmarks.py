@@ -0,0 +1,350 @@
+"""
+In-process API benchmarks.
+
+Every scenario is a request sent through the DRF test client against the
+current database (seed it with `manage.py seed_marketplace`). For each
+scenario the runner reports p50/p95/p99 latency and the number of SQL
+queries as JSON, so results can be stored per commit and compared.
+"""
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from accounts.tokens import RefreshToken
+from .models import Category, Material, MaterialListing, Order, Product
+from .seeding import SEED_EMAIL_DOMAIN, SEED_PASSWORD
+
+
+# name: (url name, needs auth, kwargs/query builder)
+SCENARIOS = {
+    'category-list': ('marketplace:category-list', False, lambda ctx: ({}, {})),
+    'material-list': ('marketplace:material-list', False, lambda ctx: ({}, {})),
+    'listing-list': ('marketplace:material-listing-list', False, lambda ctx: ({}, {})),
+    'listing-search': (
+        'marketplace:material-listing-list', False,
+        lambda ctx: ({}, {'search': 'Listing 1', 'ordering': '-price_per_unit'})
+    ),
+    'listing-filter-material': (
+        'marketplace:material-listing-list', False,
+        lambda ctx: ({}, {'material': ctx['material'], 'status': 'active'})
+    ),
+    'listing-detail': (
+        'marketplace:material-listing-detail', False,
+        lambda ctx: ({'pk': ctx['listing']}, {})
+    ),
+    'product-list': ('marketplace:product-list', False, lambda ctx: ({}, {})),
+    'product-filter-category': (
+        'marketplace:product-list', False,
+        lambda ctx: ({}, {'category': ctx['category']})
+    ),
+    'product-detail': (
+        'marketplace:product-detail', False,
+        lambda ctx: ({'pk': ctx['product']}, {})
+    ),
+    'review-list': ('marketplace:review-list', False, lambda ctx: ({}, {})),
+    'seller-profile': (
+        'marketplace:seller-detail', False,
+        lambda ctx: ({'pk': ctx['seller']}, {})
+    ),
+    'cart': ('marketplace:cart-list', True, lambda ctx: ({}, {})),
+    'favorite-list': ('marketplace:favorite-list', True, lambda ctx: ({}, {})),
+    'order-list': ('marketplace:order-list', True, lambda ctx: ({}, {})),
+    'order-sales': ('marketplace:order-sales', True, lambda ctx: ({}, {})),
+    'message-inbox': ('marketplace:message-inbox', True, lambda ctx: ({}, {})),
+    'message-unread-count': ('marketplace:message-unread-count', True, lambda ctx: ({}, {})),
+    # User search; seed_marketplace --only users --users 1000000 for the 1M-user case
+    'user-list-role': ('user-list', True, lambda ctx: ({}, {'role': 'Factory'})),
+    'user-search-prefix': ('user-list', True, lambda ctx: ({}, {'search': 'sa'})),
+    'user-search-name': ('user-list', True, lambda ctx: ({}, {'search': 'ibrahim'})),
+    'user-search-email': ('user-list', True, lambda ctx: ({}, {'search': 'user4242.'})),
+}
+
+
+# Scenarios whose side effects (counter updates) run as celery tasks
+OFFLOADED_SCENARIOS = ['listing-detail', 'product-detail']
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_context():
+    """Pick the objects the scenarios point at: a busy seller and their items"""
+    order = Order.objects.order_by('pk').only('seller_id').first()
+    listing = MaterialListing.objects.filter(status='active').order_by('pk').only('pk').first()
+    product = Product.objects.filter(status='active').order_by('pk').only('pk').first()
+    material = Material.objects.order_by('pk').only('pk').first()
+    category = Category.objects.order_by('pk').only('pk').first()
+    if None in (order, listing, product, material, category):
+        raise BenchmarkError('The database is empty; run manage.py seed_marketplace first')
+
+    return {
+        'seller': str(order.seller_id),
+        'listing': str(listing.pk),
+        'product': str(product.pk),
+        'material': str(material.pk),
+        'category': str(category.pk),
+    }
+
+
+def run_scenario(client, url, query, iterations, warmup):
+    timings = []
+    queries = []
+    for run in range(warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(url, query)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise BenchmarkError(f'{url} returned {response.status_code}')
+        if run >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+
+    return dict(summarize(timings), queries=max(queries))
+
+
+def connection_overhead(iterations=200):
+    """
+    Latency of a trivial query on a fresh connection (CONN_MAX_AGE = 0:
+    connect, authenticate, query on every request) versus a persistent one.
+    The test client never closes connections between requests, so this is
+    measured directly.
+    """
+    def timed(reconnect):
+        timings = []
+        for _ in range(iterations):
+            if reconnect:
+                connection.close()
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            timings.append((time.perf_counter() - start) * 1000)
+        return summarize(timings)
+
+    fresh = timed(reconnect=True)
+    persistent = timed(reconnect=False)
+    return {
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'fresh': fresh,
+        'persistent': persistent,
+        'connect_overhead_p50_ms': round(fresh['p50_ms'] - persistent['p50_ms'], 2),
+    }
+
+
+OFFLOAD_MODES = ('inline', 'queued', 'buffered')
+
+
+def _reset_broker_pools(app):
+    # Connection and producer pools keep the broker they were created for
+    app._pool = None
+    app.amqp._producer_pool = None
+
+
+@contextmanager
+def celery_mode(mode):
+    """
+    'inline' runs tasks inside the request, which is what the request paid
+    before the work was offloaded; 'queued' only publishes them (to the
+    configured broker, or an in-memory one when there is none); 'buffered'
+    also buffers counter bumps in the shared cache (COUNTER_BUFFERING).
+    """
+    from jaddid.celery import app
+
+    # Settings come from Django under the CELERY_ namespace, so override those keys
+    saved = {
+        'CELERY_TASK_ALWAYS_EAGER': app.conf.task_always_eager,
+        'CELERY_BROKER_URL': app.conf.broker_url,
+    }
+    app.conf.update(
+        CELERY_TASK_ALWAYS_EAGER=mode == 'inline',
+        CELERY_BROKER_URL=saved['CELERY_BROKER_URL'] or 'memory://',
+    )
+    _reset_broker_pools(app)
+    try:
+        with override_settings(COUNTER_BUFFERING=mode == 'buffered'):
+            yield
+    finally:
+        app.conf.update(saved)
+        _reset_broker_pools(app)
+
+
+def api_clients(context):
+    """Anonymous and authenticated (as the context's seller) test clients"""
+    user = User.objects.get(pk=context['seller'])
+    access = str(RefreshToken.for_user(user).access_token)
+
+    authenticated = APIClient()
+    authenticated.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    return APIClient(), authenticated
+
+
+def offload_latency(scenarios=None, iterations=50, warmup=5):
+    """
+    Latency of the selected scenarios (by default the ones that bump
+    counters) in every OFFLOAD_MODES mode
+    """
+    context = build_context()
+    anonymous, authenticated = api_clients(context)
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for name in scenarios or OFFLOADED_SCENARIOS:
+            url_name, needs_auth, params = SCENARIOS[name]
+            kwargs, query = params(context)
+            url = reverse(url_name, kwargs=kwargs)
+            client = authenticated if needs_auth else anonymous
+            results[name] = {}
+            for mode in OFFLOAD_MODES:
+                with celery_mode(mode):
+                    results[name][mode] = run_scenario(client, url, query, iterations, warmup)
+            inline = results[name]['inline']['p50_ms']
+            results[name]['p50_saved_ms'] = {
+                mode: round(inline - results[name][mode]['p50_ms'], 2)
+                for mode in OFFLOAD_MODES[1:]
+            }
+    return results
+
+
+def login_throughput(attempts=50):
+    """
+    Login latency for normal traffic (one correct login per client address)
+    and for a guessing flood from one client that rotates emails and forges
+    X-Forwarded-For. Flood attempts past the per-IP limit must be refused
+    (429) before any password is hashed.
+    """
+    emails = list(User.objects.filter(
+        email__endswith=f'@{SEED_EMAIL_DOMAIN}',
+        is_active=True
+    ).order_by('email').values_list('email', flat=True)[:attempts])
+    if not emails:
+        raise BenchmarkError('No seeded users; run manage.py seed_marketplace first')
+
+    # Fresh addresses each run, so counters left by earlier runs don't apply
+    rng = random.Random()
+    def address():
+        return f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}'
+
+    client = APIClient()
+    url = reverse('login')
+
+    def measure(requests):
+        timings, statuses = [], Counter()
+        for data, meta in requests:
+            start = time.perf_counter()
+            response = client.post(url, data, format='json', **meta)
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses[str(response.status_code)] += 1
+        return dict(
+            summarize(timings),
+            per_second=round(len(timings) / (sum(timings) / 1000), 1),
+            statuses=dict(statuses),
+        )
+
+    attacker = address()
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        return {
+            'hasher': settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1],
+            'normal': measure(
+                ({'email': email, 'password': SEED_PASSWORD}, {'REMOTE_ADDR': address()})
+                for email in emails
+            ),
+            'flood': measure(
+                (
+                    {'email': emails[i % len(emails)], 'password': 'not-the-password'},
+                    {'REMOTE_ADDR': attacker, 'HTTP_X_FORWARDED_FOR': address()},
+                )
+                for i in range(attempts * 4)
+            ),
+        }
+
+
+def run_benchmarks(scenarios=None, iterations=50, warmup=5):
+    """Run the selected scenarios (all by default) and return the report dict"""
+    context = build_context()
+    anonymous, authenticated = api_clients(context)
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for name in scenarios or SCENARIOS:
+            url_name, needs_auth, params = SCENARIOS[name]
+            kwargs, query = params(context)
+            try:
+                results[name] = run_scenario(
+                    authenticated if needs_auth else anonymous,
+                    reverse(url_name, kwargs=kwargs), query, iterations, warmup
+                )
+            except BenchmarkError as e:
+                results[name] = {'error': str(e)}
+
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'iterations': iterations,
+        'rows': {
+            'listings': MaterialListing.objects.count(),
+            'products': Product.objects.count(),
+            'orders': Order.objects.count(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """Per-scenario change of p50/p95 latency and queries against a baseline report"""
+    changes = {}
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or 'error' in before or 'error' in result:
+            continue
+        changes[name] = {
+            metric: f'{(result[metric] - before[metric]) / before[metric] * 100:+.1f}%'
+            if before[metric] else None
+            for metric in ('p50_ms', 'p95_ms')
+        }
+        changes[name]['queries'] = result['queries'] - before['queries']
+    return changes
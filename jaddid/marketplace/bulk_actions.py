@@ -0,0 +1,51 @@
+"""
+Bulk admin actions.
+
+Each function takes (model, ids, **params) and is run by
+BulkActionAdminMixin, inline or in background chunks. Unlike a bare
+queryset.update() they keep the side effects of a normal save:
+updated_at, published_at and the sellers' denormalized stats.
+"""
+from django.db.models.functions import Coalesce, Now
+
+from .stats import schedule_stats_refresh
+
+
+def _refresh_sellers(seller_ids):
+    for seller_id in set(seller_ids):
+        schedule_stats_refresh(seller_id)
+
+
+def set_listing_status(model, ids, status):
+    """Change the status of products / material listings"""
+    queryset = model.objects.filter(pk__in=ids)
+    fields = {'status': status, 'updated_at': Now()}
+    if status == model.ACTIVE:
+        fields['published_at'] = Coalesce('published_at', Now())
+
+    updated = queryset.update(**fields)
+    _refresh_sellers(queryset.order_by().values_list('seller_id', flat=True).distinct())
+    return updated
+
+
+def set_review_approval(model, ids, is_approved):
+    """Approve or hide reviews and recount the reviewed sellers' ratings"""
+    queryset = model.objects.filter(pk__in=ids)
+    updated = queryset.update(is_approved=is_approved, updated_at=Now())
+
+    sellers = queryset.order_by().values_list(
+        'product__seller_id', 'material_listing__seller_id'
+    ).distinct()
+    _refresh_sellers(
+        product_seller or listing_seller
+        for product_seller, listing_seller in sellers
+    )
+    return updated
+
+
+def set_report_status(model, ids, status, resolved_by_id=None):
+    """Move reports to a new status, stamping who closed them"""
+    fields = {'status': status, 'updated_at': Now()}
+    if resolved_by_id is not None:
+        fields.update(resolved_by_id=resolved_by_id, resolved_at=Now())
+    return model.objects.filter(pk__in=ids).update(**fields)
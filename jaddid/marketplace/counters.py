@@ -0,0 +1,124 @@
+"""
+View and favorite counters.
+
+With COUNTER_BUFFERING (Redis plus a celery broker), bump_counter only adds
+its delta to a key in the shared cache. Keys are grouped in windows of
+COUNTER_FLUSH_INTERVAL seconds, and the flush_counters task (celery beat)
+writes every closed window in one transaction, one UPDATE per counter
+however many hits it got. Without buffering each bump queues an
+increment_counter task instead.
+"""
+import time
+import uuid
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from jaddid import metrics
+from jaddid.cache import shared_cache
+from .tasks import increment_counter
+
+
+DELTA_KEY = 'counters:delta:{window}:{label}:{pk}:{field}'
+# Counters touched in a window: a slot count, then one key per slot
+SLOTS_KEY = 'counters:slots:{window}'
+SLOT_KEY = 'counters:slot:{window}:{slot}'
+FLUSHING_KEY = 'counters:flushing:{window}'
+FLUSHED_KEY = 'counters:flushed'
+
+
+def bump_counter(instance, field, delta=1):
+    """
+    Add `delta` to a counter field on `instance` once the current
+    transaction commits, so the request never waits on the row lock.
+    """
+    args = (instance._meta.label, str(instance.pk), field, delta)
+    if settings.COUNTER_BUFFERING:
+        transaction.on_commit(partial(buffer_increment, *args))
+    else:
+        transaction.on_commit(partial(
+            increment_counter.delay, *args, uuid.uuid4().hex, time.time()
+        ))
+
+
+def current_window(now=None):
+    return int((now or time.time()) // settings.COUNTER_FLUSH_INTERVAL)
+
+
+def buffer_increment(label, pk, field, delta):
+    """Add a delta to the current window; the first bump of a counter registers it"""
+    window = current_window()
+    timeout = settings.COUNTER_BUFFER_TIMEOUT
+    key = DELTA_KEY.format(window=window, label=label, pk=pk, field=field)
+    if not shared_cache.add(key, delta, timeout):
+        shared_cache.incr(key, delta)
+        return
+
+    slots = SLOTS_KEY.format(window=window)
+    shared_cache.add(slots, 0, timeout)
+    slot = shared_cache.incr(slots)
+    shared_cache.set(SLOT_KEY.format(window=window, slot=slot), (label, pk, field), timeout)
+
+
+def flush_window(window):
+    """
+    Apply the deltas of a closed window. Returns the number of counters
+    updated, or None if another flush has it.
+    """
+    timeout = settings.COUNTER_BUFFER_TIMEOUT
+    if not shared_cache.add(FLUSHING_KEY.format(window=window), 1, timeout):
+        return None
+
+    try:
+        count = shared_cache.get(SLOTS_KEY.format(window=window)) or 0
+        slot_keys = [SLOT_KEY.format(window=window, slot=slot) for slot in range(1, count + 1)]
+        counters = sorted(shared_cache.get_many(slot_keys).values())
+        delta_keys = [
+            DELTA_KEY.format(window=window, label=label, pk=pk, field=field)
+            for label, pk, field in counters
+        ]
+        deltas = shared_cache.get_many(delta_keys)
+
+        # Sorted, so concurrent flushes lock rows in the same order
+        with transaction.atomic():
+            for (label, pk, field), key in zip(counters, delta_keys):
+                delta = deltas.get(key)
+                if delta:
+                    apps.get_model(label).objects.filter(pk=pk).update(
+                        **{field: Greatest(F(field) + delta, 0)}
+                    )
+    except Exception:
+        shared_cache.delete(FLUSHING_KEY.format(window=window))
+        raise
+
+    shared_cache.delete_many([*delta_keys, *slot_keys, SLOTS_KEY.format(window=window)])
+    if counters:
+        lag = time.time() - window * settings.COUNTER_FLUSH_INTERVAL
+        metrics.observe('counter_flush_lag_seconds', lag)
+    return len(counters)
+
+
+def flush_counters(now=None):
+    """
+    Flush every closed window not flushed yet. The window before the
+    current one is left open too, for bumps that picked it just before it closed.
+    """
+    last = current_window(now) - 2
+    flushed = shared_cache.get(FLUSHED_KEY)
+    if flushed is None:
+        flushed = last - settings.COUNTER_BUFFER_TIMEOUT // settings.COUNTER_FLUSH_INTERVAL
+
+    windows = range(flushed + 1, last + 1)
+    pending = shared_cache.get_many([SLOTS_KEY.format(window=window) for window in windows])
+
+    updated = 0
+    for window in windows:
+        if SLOTS_KEY.format(window=window) in pending:
+            updated += flush_window(window) or 0
+    shared_cache.set(FLUSHED_KEY, last, None)
+    metrics.maybe_publish()
+    return updated
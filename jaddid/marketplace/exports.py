@@ -0,0 +1,80 @@
+"""
+Export definitions: the queryset and (header, lookup) columns of each
+exportable model. Used by the export API actions and the export_data command.
+"""
+from accounts.exports import USER_COLUMNS
+from accounts.models import User
+from .models import MaterialListing, Order, Product
+
+
+ORDER_COLUMNS = [
+    ('id', 'id'),
+    ('order_number', 'order_number'),
+    ('order_type', 'order_type'),
+    ('buyer_id', 'buyer_id'),
+    ('buyer_email', 'buyer__email'),
+    ('seller_id', 'seller_id'),
+    ('seller_email', 'seller__email'),
+    ('product_id', 'product_id'),
+    ('material_listing_id', 'material_listing_id'),
+    ('quantity', 'quantity'),
+    ('unit', 'unit'),
+    ('unit_price', 'unit_price'),
+    ('total_price', 'total_price'),
+    ('status', 'status'),
+    ('payment_status', 'payment_status'),
+    ('created_at', 'created_at'),
+    ('confirmed_at', 'confirmed_at'),
+    ('completed_at', 'completed_at'),
+]
+
+PRODUCT_COLUMNS = [
+    ('id', 'id'),
+    ('seller_id', 'seller_id'),
+    ('category', 'category__name'),
+    ('title', 'title'),
+    ('price', 'price'),
+    ('quantity', 'quantity'),
+    ('condition', 'condition'),
+    ('status', 'status'),
+    ('location', 'location'),
+    ('views_count', 'views_count'),
+    ('favorites_count', 'favorites_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('published_at', 'published_at'),
+]
+
+MATERIAL_LISTING_COLUMNS = [
+    ('id', 'id'),
+    ('seller_id', 'seller_id'),
+    ('material', 'material__name'),
+    ('title', 'title'),
+    ('quantity', 'quantity'),
+    ('unit', 'unit'),
+    ('price_per_unit', 'price_per_unit'),
+    ('minimum_order_quantity', 'minimum_order_quantity'),
+    ('condition', 'condition'),
+    ('status', 'status'),
+    ('location', 'location'),
+    ('available_from', 'available_from'),
+    ('available_until', 'available_until'),
+    ('views_count', 'views_count'),
+    ('favorites_count', 'favorites_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('published_at', 'published_at'),
+]
+
+EXPORTS = {
+    'orders': (Order, ORDER_COLUMNS),
+    'products': (Product, PRODUCT_COLUMNS),
+    'material-listings': (MaterialListing, MATERIAL_LISTING_COLUMNS),
+    'users': (User, USER_COLUMNS),
+}
+
+
+def export_queryset(name):
+    """Base queryset of an export, in a stable order for resumable reads"""
+    model, columns = EXPORTS[name]
+    return model.objects.order_by('created_at', 'pk'), columns
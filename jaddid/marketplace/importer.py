@@ -0,0 +1,178 @@
+"""
+Bulk create / upsert of material listings.
+
+All rows of an import are validated first. Materials are resolved by id or
+name with one query, and existing listings are matched on
+(seller, external_id) with one query. Then new rows are bulk_created and
+matched rows bulk_updated in chunks, inside a single transaction. Every
+input row gets a result entry: created, updated or error.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from jaddid.bulk import RowError
+from .models import Material, MaterialListing
+from .serializers import MaterialListingImportSerializer
+from .stats import schedule_stats_refresh
+
+
+def _clean(row):
+    # Empty cells mean "not given", so partial updates keep the stored value
+    return {key: value for key, value in row.items() if value not in ('', None)}
+
+
+def resolve_materials(rows):
+    """Map every material id and lower-cased name referenced by `rows` to a Material"""
+    ids, names = set(), set()
+    for _, row in rows:
+        if isinstance(row, RowError):
+            continue
+        value = str(row.get('material') or '').strip().lower()
+        if not value:
+            continue
+        try:
+            ids.add(uuid.UUID(value))
+        except ValueError:
+            names.add(value)
+
+    if not ids and not names:
+        return {}
+
+    materials = Material.objects.alias(name_lower=Lower('name')).filter(
+        Q(pk__in=ids) | Q(name_lower__in=names),
+        is_active=True
+    ).only('id', 'name', 'default_unit')
+
+    lookup = {}
+    for material in materials:
+        lookup[str(material.pk)] = material
+        lookup[material.name.lower()] = material
+    return lookup
+
+
+class ListingImporter:
+    """Create or update the listings of one seller from parsed rows"""
+
+    def __init__(self, seller_id):
+        self.seller_id = seller_id
+        self.results = []
+        self.to_create = []
+        self.to_update = []
+        self.update_fields = set()
+
+    def _existing(self, rows):
+        keys = {
+            str(row['external_id']) for _, row in rows
+            if not isinstance(row, RowError) and row.get('external_id') not in ('', None)
+        }
+        if not keys:
+            return {}
+        return {
+            listing.external_id: listing
+            for listing in MaterialListing.objects.filter(
+                seller_id=self.seller_id,
+                external_id__in=keys
+            )
+        }
+
+    def _error(self, line, errors, external_id=None):
+        self.results.append({
+            'line': line,
+            'status': 'error',
+            'external_id': external_id,
+            'errors': errors,
+        })
+
+    def _prepare(self, rows):
+        context = {'materials': resolve_materials(rows)}
+        existing = self._existing(rows)
+        seen = set()
+        now = timezone.now()
+
+        for line, row in rows:
+            if isinstance(row, RowError):
+                self._error(line, {'row': [str(row)]})
+                continue
+
+            row = _clean(row)
+            key = str(row['external_id']) if 'external_id' in row else None
+            if key is not None:
+                if key in seen:
+                    self._error(line, {'external_id': ['Duplicate external_id in this import']}, key)
+                    continue
+                seen.add(key)
+
+            instance = existing.get(key) if key is not None else None
+            serializer = MaterialListingImportSerializer(
+                instance,
+                data=row,
+                partial=instance is not None,
+                context=context
+            )
+            if not serializer.is_valid():
+                self._error(line, serializer.errors, key)
+                continue
+
+            data = serializer.validated_data
+            if instance is None:
+                instance = MaterialListing(seller_id=self.seller_id, **data)
+                if not instance.unit:
+                    instance.unit = instance.material.default_unit
+                self.to_create.append((line, instance))
+            else:
+                for attr, value in data.items():
+                    setattr(instance, attr, value)
+                instance.updated_at = now
+                self.update_fields.update(data)
+                self.to_update.append((line, instance))
+
+            # bulk_create/bulk_update bypass MaterialListing.save()
+            if instance.status == MaterialListing.ACTIVE and not instance.published_at:
+                instance.published_at = now
+
+    def run(self, rows):
+        self._prepare(rows)
+        batch_size = settings.LISTING_IMPORT_BATCH_SIZE
+
+        with transaction.atomic():
+            if self.to_create:
+                MaterialListing.objects.bulk_create(
+                    [listing for _, listing in self.to_create],
+                    batch_size=batch_size
+                )
+            if self.to_update:
+                fields = sorted(self.update_fields | {'updated_at', 'published_at'})
+                MaterialListing.objects.bulk_update(
+                    [listing for _, listing in self.to_update],
+                    fields,
+                    batch_size=batch_size
+                )
+            if self.to_create or self.to_update:
+                schedule_stats_refresh(self.seller_id)
+
+        for status, items in (('created', self.to_create), ('updated', self.to_update)):
+            for line, listing in items:
+                self.results.append({
+                    'line': line,
+                    'status': status,
+                    'id': str(listing.pk),
+                    'external_id': listing.external_id,
+                })
+        self.results.sort(key=lambda result: result['line'])
+
+        return {
+            'created': len(self.to_create),
+            'updated': len(self.to_update),
+            'failed': len(self.results) - len(self.to_create) - len(self.to_update),
+            'results': self.results,
+        }
+
+
+def import_listings(seller_id, rows):
+    """Create/update listings for a seller from (line, row) pairs"""
+    return ListingImporter(seller_id).run(rows)
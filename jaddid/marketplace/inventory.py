@@ -0,0 +1,139 @@
+"""
+Batch price / quantity / status updates for a seller's products or listings.
+
+Ownership and current versions are read with one SELECT ... FOR UPDATE and
+the changes are written with one bulk_update, all in one transaction.
+Each change may carry the `updated_at` the client last saw; if the row
+has been modified since, that change is rejected as a conflict.
+"""
+from datetime import timezone as dt_timezone
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import MaterialListing, Product
+from .stats import schedule_stats_refresh
+
+
+# API name -> model field
+INVENTORY_FIELDS = {
+    Product: {'price': 'price', 'quantity': 'quantity', 'status': 'status'},
+    MaterialListing: {'price': 'price_per_unit', 'quantity': 'quantity', 'status': 'status'},
+}
+
+
+def _aware(value):
+    # Clients may send updated_at without an offset; treat it as UTC
+    if timezone.is_naive(value):
+        return timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def _clean(field, value):
+    if field.name != 'quantity':
+        return field.clean(value, None)
+    # Sold out is a valid stock level, below the minimum a listing is created with
+    value = field.to_python(value)
+    field.validate(value, None)
+    MinValueValidator(0)(value)
+    return value
+
+
+def _parse_change(model, change):
+    """Return (pk, expected updated_at, {field: value}) or raise ValidationError"""
+    if not isinstance(change, dict):
+        raise ValidationError({'change': ['Each change must be an object']})
+
+    errors = {}
+    try:
+        pk = model._meta.pk.to_python(change.get('id'))
+    except ValidationError:
+        pk = None
+    if pk is None:
+        errors['id'] = ['A valid id is required']
+
+    expected = change.get('updated_at')
+    if expected is not None:
+        expected = parse_datetime(str(expected))
+        if expected is None:
+            errors['updated_at'] = ['Invalid datetime']
+        else:
+            expected = _aware(expected)
+
+    values = {}
+    for name, field_name in INVENTORY_FIELDS[model].items():
+        if name not in change:
+            continue
+        try:
+            values[field_name] = _clean(model._meta.get_field(field_name), change[name])
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    if not values and 'id' not in errors:
+        errors['change'] = [f"Provide at least one of: {', '.join(INVENTORY_FIELDS[model])}"]
+    if errors:
+        raise ValidationError(errors)
+    return pk, expected, values
+
+
+def apply_inventory_changes(model, seller_id, changes):
+    """Apply a list of changes to the seller's rows; returns per-change results"""
+    results = [None] * len(changes)
+    parsed = {}
+    for index, change in enumerate(changes):
+        try:
+            pk, expected, values = _parse_change(model, change)
+        except ValidationError as e:
+            results[index] = {'index': index, 'status': 'error', 'errors': e.message_dict}
+            continue
+        if pk in parsed:
+            results[index] = {'index': index, 'id': str(pk), 'status': 'error',
+                              'errors': {'id': ['Duplicate id in this request']}}
+            continue
+        parsed[pk] = (index, expected, values)
+
+    now = timezone.now()
+    changed, fields, status_changed = [], {'updated_at'}, False
+
+    with transaction.atomic():
+        rows = model.objects.select_for_update().filter(
+            pk__in=list(parsed),
+            seller_id=seller_id
+        ).only('id', 'seller', 'updated_at', 'published_at', *{
+            field_name for _, _, values in parsed.values() for field_name in values
+        }).order_by('pk')
+        rows = {row.pk: row for row in rows}
+
+        for pk, (index, expected, values) in parsed.items():
+            row = rows.get(pk)
+            if row is None:
+                results[index] = {'index': index, 'id': str(pk), 'status': 'not_found'}
+                continue
+            if expected is not None and _aware(row.updated_at) != expected:
+                results[index] = {'index': index, 'id': str(pk), 'status': 'conflict',
+                                  'updated_at': row.updated_at}
+                continue
+
+            for field_name, value in values.items():
+                setattr(row, field_name, value)
+            if values.get('status') == model.ACTIVE and not row.published_at:
+                row.published_at = now
+                fields.add('published_at')
+            status_changed = status_changed or 'status' in values
+            row.updated_at = now
+            fields.update(values)
+            changed.append(row)
+            results[index] = {'index': index, 'id': str(pk), 'status': 'updated', 'updated_at': now}
+
+        if changed:
+            model.objects.bulk_update(changed, sorted(fields))
+        if status_changed:
+            schedule_stats_refresh(seller_id)
+
+    return {
+        'updated': len(changed),
+        'results': results,
+    }
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jaddid.exports import CONTENT_TYPES, write_export
+from marketplace.exports import EXPORTS, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, products, material listings or users to CSV / JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', '-o', default='-', help='Output file, - for stdout')
+
+    def handle(self, *args, **options):
+        queryset, columns = export_queryset(options['name'])
+        output = options['output']
+
+        if output == '-':
+            count = write_export(queryset, columns, options['format'], sys.stdout)
+        else:
+            try:
+                stream = open(output, 'w', encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError(str(e))
+            with stream:
+                count = write_export(queryset, columns, options['format'], stream)
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} {options["name"]}'))
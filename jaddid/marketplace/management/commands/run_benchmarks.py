@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace.benchmarks import (
+    SCENARIOS, BenchmarkError, compare, connection_overhead, login_throughput,
+    offload_latency, run_benchmarks
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main API endpoints in-process and print p50/p95/p99 and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Default: all of {', '.join(SCENARIOS)}")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', '-o', help='Also write the report to this file')
+        parser.add_argument('--compare', help='Baseline report to compare against')
+        parser.add_argument(
+            '--connections', action='store_true',
+            help='Also measure the cost of opening a connection per request'
+        )
+        parser.add_argument(
+            '--offload', action='store_true',
+            help='Also time the scenarios (default: the detail pages that bump counters) '
+                 'with their celery tasks inline, queued, and with counters buffered'
+        )
+        parser.add_argument(
+            '--login', type=int, metavar='ATTEMPTS',
+            help='Also measure login throughput for normal traffic and a guessing flood'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read baseline: {e}')
+
+        try:
+            report = run_benchmarks(
+                options['scenarios'] or None,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+            )
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+
+        if options['connections']:
+            report['connections'] = connection_overhead()
+        if options['offload']:
+            report['offload'] = offload_latency(
+                options['scenarios'] or None, options['iterations'], options['warmup']
+            )
+        if options['login']:
+            try:
+                report['login'] = login_throughput(options['login'])
+            except BenchmarkError as e:
+                raise CommandError(str(e))
+
+        if baseline is not None:
+            report['compared_to'] = baseline.get('revision')
+            report['changes'] = compare(baseline, report)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace.seeding import KINDS, SEED_PASSWORD, MarketplaceSeeder, default_counts
+
+
+class Command(BaseCommand):
+    help = 'Bulk insert a synthetic marketplace (users, listings, orders, ...) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10000,
+            help='Number of users; the other counts scale from it unless given'
+        )
+        for kind in KINDS[1:]:
+            parser.add_argument(f'--{kind}', type=int, default=None)
+        parser.add_argument(
+            '--only', nargs='+', choices=KINDS, metavar='KIND',
+            help='Seed only these kinds; rows they reference must exist from a run with the same seed'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, same data')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+
+        counts = default_counts(options['users'])
+        for kind in KINDS[1:]:
+            if options[kind] is not None:
+                counts[kind] = options[kind]
+
+        kinds = [kind for kind in KINDS if kind in (options['only'] or KINDS)]
+        if not options['only']:
+            for kind in ('categories', 'materials', 'listings', 'products'):
+                if counts[kind] < 1:
+                    raise CommandError(f'--{kind} must be at least 1')
+
+        seeder = MarketplaceSeeder(
+            counts,
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=lambda message: self.stderr.write(message),
+        )
+        seeder.run(kinds)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {', '.join(f'{counts[kind]} {kind}' for kind in kinds)}. "
+            f"Every seeded user's password is '{SEED_PASSWORD}'."
+        ))
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from jaddid.storage import ContentAddressedMixin, sweep_unreferenced
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media files that no image row references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=24,
+            help='Keep files younger than this many hours (uploads in flight)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted')
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        if not isinstance(storage, ContentAddressedMixin):
+            raise CommandError('The default storage is not content addressed')
+
+        removed = sweep_unreferenced(
+            storage,
+            min_age=timedelta(hours=options['min_age']),
+            dry_run=options['dry_run'],
+        )
+        for name in removed:
+            self.stdout.write(name)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stderr.write(self.style.SUCCESS(f'{verb} {len(removed)} unreferenced files'))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_cart_cartitem_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='icon_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Icon Variants'),
+        ),
+        migrations.AddField(
+            model_name='material',
+            name='icon_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Icon Variants'),
+        ),
+        migrations.AddField(
+            model_name='materialimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variants'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variants'),
+        ),
+    ]
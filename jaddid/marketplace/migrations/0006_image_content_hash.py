@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materialimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Content Hash'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Content Hash'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('marketplace', '0006_image_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerStats',
+            fields=[
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seller_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Seller')),
+                ('active_products', models.PositiveIntegerField(default=0, verbose_name='Active Products')),
+                ('active_listings', models.PositiveIntegerField(default=0, verbose_name='Active Material Listings')),
+                ('completed_orders', models.PositiveIntegerField(default=0, verbose_name='Completed Orders')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Review Count')),
+                ('average_rating', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True, verbose_name='Average Rating')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Seller Stats',
+                'verbose_name_plural': 'Seller Stats',
+            },
+        ),
+    ]
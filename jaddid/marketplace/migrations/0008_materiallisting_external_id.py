@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0007_sellerstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materiallisting',
+            name='external_id',
+            field=models.CharField(blank=True, help_text="Seller's own reference (SKU / lot number), used to re-sync bulk imports", max_length=100, null=True, verbose_name='External ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='materiallisting',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id__isnull', False)), fields=('seller', 'external_id'), name='listing_unique_seller_external_id'),
+        ),
+    ]
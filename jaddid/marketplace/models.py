@@ -19,6 +19,12 @@ class Category(models.Model):
         null=True, 
         blank=True
     )
+    icon_variants = models.JSONField(
+        _("Icon Variants"),
+        default=dict,
+        blank=True,
+        editable=False
+    )
     parent = models.ForeignKey(
         'self',
         on_delete=models.CASCADE,
@@ -74,6 +80,12 @@ class Material(models.Model):
         null=True, 
         blank=True
     )
+    icon_variants = models.JSONField(
+        _("Icon Variants"),
+        default=dict,
+        blank=True,
+        editable=False
+    )
     is_active = models.BooleanField(_("Active"), default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -204,6 +216,13 @@ class MaterialListing(models.Model):
     available_from = models.DateField(_("Available From"), null=True, blank=True)
     available_until = models.DateField(_("Available Until"), null=True, blank=True)
     notes = models.TextField(_("Additional Notes"), blank=True)
+    external_id = models.CharField(
+        _("External ID"),
+        max_length=100,
+        null=True,
+        blank=True,
+        help_text=_("Seller's own reference (SKU / lot number), used to re-sync bulk imports")
+    )
     
     # Engagement Metrics
     views_count = models.PositiveIntegerField(_("Views Count"), default=0)
@@ -224,6 +243,13 @@ class MaterialListing(models.Model):
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['-published_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['seller', 'external_id'],
+                condition=models.Q(external_id__isnull=False),
+                name='listing_unique_seller_external_id'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.material.name} - {self.seller.email}"
@@ -255,6 +281,19 @@ class MaterialImage(models.Model):
         _("Image"),
         upload_to="material_listings/%Y/%m/"
     )
+    variants = models.JSONField(
+        _("Variants"),
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    content_hash = models.CharField(
+        _("Content Hash"),
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
     is_primary = models.BooleanField(_("Primary Image"), default=False)
     order = models.PositiveIntegerField(_("Order"), default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -410,6 +449,19 @@ class ProductImage(models.Model):
         _("Image"),
         upload_to="products/%Y/%m/"
     )
+    variants = models.JSONField(
+        _("Variants"),
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    content_hash = models.CharField(
+        _("Content Hash"),
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
     is_primary = models.BooleanField(_("Primary Image"), default=False)
     order = models.PositiveIntegerField(_("Order"), default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -1083,3 +1135,34 @@ class Report(models.Model):
             raise ValidationError(_("Either product or material_listing must be reported"))
         if self.product and self.material_listing:
             raise ValidationError(_("Cannot report both product and material_listing"))
+
+
+class SellerStats(models.Model):
+    """Denormalized per-seller counters shown on the public seller profile"""
+
+    seller = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='seller_stats',
+        verbose_name=_("Seller")
+    )
+    active_products = models.PositiveIntegerField(_("Active Products"), default=0)
+    active_listings = models.PositiveIntegerField(_("Active Material Listings"), default=0)
+    completed_orders = models.PositiveIntegerField(_("Completed Orders"), default=0)
+    review_count = models.PositiveIntegerField(_("Review Count"), default=0)
+    average_rating = models.DecimalField(
+        _("Average Rating"),
+        max_digits=3,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Seller Stats")
+        verbose_name_plural = _("Seller Stats")
+
+    def __str__(self):
+        return f"Stats for {self.seller_id}"
@@ -0,0 +1,190 @@
+"""
+Per-user change tracking for unread messages and orders.
+
+Message and order writes bump a version counter kept in the shared cache,
+so every worker sees it. Polling clients compare versions, so an idle
+client never reaches the database.
+The a-prefixed functions are the async versions used by the ASGI views:
+they wait with asyncio.sleep instead of holding a worker thread.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from jaddid import metrics
+from jaddid.cache import shared_cache
+
+
+VERSION_KEY = 'notifications:version:{user_id}'
+SNAPSHOT_KEY = 'notifications:snapshot:{user_id}:{version}'
+SNAPSHOT_TIMEOUT = 60 * 60
+
+ACTIVE_ORDER_STATUSES = ['pending', 'confirmed', 'in_progress']
+
+
+def _seed():
+    # Seed from the clock so a counter lost to eviction never reuses an old value
+    return int(time.time() * 1000)
+
+
+def get_version(user_id):
+    """Return the current change version for a user"""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = shared_cache.get(key)
+    if version is None:
+        shared_cache.add(key, _seed(), timeout=None)
+        version = shared_cache.get(key)
+    return version
+
+
+async def aget_version(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    version = await shared_cache.aget(key)
+    if version is None:
+        await shared_cache.aadd(key, _seed(), timeout=None)
+        version = await shared_cache.aget(key)
+    return version
+
+
+def bump_version(*user_ids):
+    """Mark the notification state of the given users as changed"""
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        key = VERSION_KEY.format(user_id=user_id)
+        try:
+            shared_cache.incr(key)
+        except ValueError:
+            shared_cache.add(key, _seed(), timeout=None)
+
+
+def get_snapshot(user):
+    """
+    Return unread/order counts for a user.
+    Counts are cached per version, so they are only recomputed after a write.
+    """
+    from .models import Message, Order
+
+    version = get_version(user.pk)
+    key = SNAPSHOT_KEY.format(user_id=user.pk, version=version)
+    snapshot = cache.get(key)
+    metrics.record_cache('notifications', snapshot is not None)
+    if snapshot is None:
+        snapshot = {
+            'version': version,
+            'unread_count': Message.objects.filter(
+                recipient_id=user.pk,
+                is_read=False
+            ).count(),
+            'active_orders': Order.objects.filter(
+                Q(buyer_id=user.pk) | Q(seller_id=user.pk),
+                status__in=ACTIVE_ORDER_STATUSES
+            ).count(),
+        }
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+async def aget_snapshot(user_id):
+    from .models import Message, Order
+
+    version = await aget_version(user_id)
+    key = SNAPSHOT_KEY.format(user_id=user_id, version=version)
+    snapshot = await cache.aget(key)
+    metrics.record_cache('notifications', snapshot is not None)
+    if snapshot is None:
+        snapshot = {
+            'version': version,
+            'unread_count': await Message.objects.filter(
+                recipient_id=user_id,
+                is_read=False
+            ).acount(),
+            'active_orders': await Order.objects.filter(
+                Q(buyer_id=user_id) | Q(seller_id=user_id),
+                status__in=ACTIVE_ORDER_STATUSES
+            ).acount(),
+        }
+        await cache.aset(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def parse_version(value):
+    """Parse a client supplied version, returning None when missing or invalid"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def wait_for_change(user_id, since, timeout):
+    """Block until the user's version differs from `since` or the timeout expires"""
+    interval = settings.NOTIFICATIONS_POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    version = get_version(user_id)
+    while version == since and time.monotonic() < deadline:
+        time.sleep(interval)
+        version = get_version(user_id)
+    return version
+
+
+async def await_change(user_id, since, timeout):
+    interval = settings.NOTIFICATIONS_POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    version = await aget_version(user_id)
+    while version == since and time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        version = await aget_version(user_id)
+    return version
+
+
+def format_event(data, event='notifications'):
+    """Encode a payload as a Server-Sent Events frame"""
+    lines = []
+    if isinstance(data, dict) and 'version' in data:
+        lines.append(f"id: {data['version']}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def event_stream(user, since=None):
+    """
+    Yield an SSE frame every time the user's notification state changes.
+    Ends after NOTIFICATIONS_SYNC_STREAM_DURATION, as it holds a worker thread.
+    """
+    timeout = settings.NOTIFICATIONS_LONGPOLL_TIMEOUT
+    deadline = time.monotonic() + settings.NOTIFICATIONS_SYNC_STREAM_DURATION
+
+    while time.monotonic() < deadline:
+        version = get_version(user.pk)
+        if version != since:
+            snapshot = get_snapshot(user)
+            since = snapshot['version']
+            yield format_event(snapshot)
+            continue
+
+        remaining = min(timeout, deadline - time.monotonic())
+        if wait_for_change(user.pk, since, remaining) == since:
+            # Keep proxies from closing an idle connection
+            yield b': keep-alive\n\n'
+
+
+async def aevent_stream(user_id, since=None):
+    timeout = settings.NOTIFICATIONS_LONGPOLL_TIMEOUT
+    deadline = time.monotonic() + settings.NOTIFICATIONS_STREAM_DURATION
+
+    while time.monotonic() < deadline:
+        version = await aget_version(user_id)
+        if version != since:
+            snapshot = await aget_snapshot(user_id)
+            since = snapshot['version']
+            yield format_event(snapshot)
+            continue
+
+        remaining = min(timeout, deadline - time.monotonic())
+        if await await_change(user_id, since, remaining) == since:
+            yield b': keep-alive\n\n'
@@ -12,7 +12,7 @@ class IsSellerOrReadOnly(permissions.BasePermission):
             return True
         
         # Write permissions are only allowed to the seller of the product
-        return obj.seller == request.user
+        return obj.seller_id == request.user.pk
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -26,7 +26,7 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
         
         # Write permissions are only allowed to the owner
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -0,0 +1,87 @@
+"""
+Querysets for the read endpoints.
+
+Each builder adds the joins, prefetches and annotations its serializer
+reads (see the fallbacks in marketplace.serializers), so a page of rows
+costs a fixed number of queries however long it is.
+"""
+from django.db.models import Avg, Count, Exists, OuterRef, Prefetch, Q
+
+from .models import CartItem, Category, Favorite, MaterialListing, Product
+
+
+# Relations read by the list serializers of each item model
+LIST_RELATED = {
+    Product: ('seller', 'category'),
+    MaterialListing: ('seller', 'material'),
+}
+
+FAVORITE_FIELD = {
+    Product: 'product',
+    MaterialListing: 'material_listing',
+}
+
+
+def with_favorites(queryset, user):
+    """Annotate `user_favorited`: whether `user` favorited the row"""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(user_favorited=Exists(Favorite.objects.filter(
+        user_id=user.pk, **{FAVORITE_FIELD[queryset.model]: OuterRef('pk')}
+    )))
+
+
+def with_ratings(queryset):
+    """Annotate the count and average rating of approved reviews"""
+    approved = Q(reviews__is_approved=True)
+    return queryset.annotate(
+        approved_review_count=Count('reviews', filter=approved),
+        approved_average_rating=Avg('reviews__rating', filter=approved),
+    )
+
+
+def for_list(queryset, user):
+    """Products or listings for the List serializers"""
+    queryset = queryset.select_related(*LIST_RELATED[queryset.model]).prefetch_related('images')
+    return with_favorites(queryset, user)
+
+
+def for_detail(queryset, user):
+    """Products or listings for the Detail serializers"""
+    return with_ratings(with_favorites(queryset.prefetch_related('images'), user))
+
+
+def with_product_counts(queryset):
+    return queryset.annotate(
+        active_product_count=Count('products', filter=Q(products__status=Product.ACTIVE))
+    )
+
+
+def with_listing_counts(queryset):
+    return queryset.annotate(
+        active_listing_count=Count('listings', filter=Q(listings__status=MaterialListing.ACTIVE))
+    )
+
+
+def category_children():
+    """Active categories with their product counts, grouped by parent id"""
+    children = {}
+    for category in with_product_counts(Category.objects.filter(is_active=True)):
+        children.setdefault(category.parent_id, []).append(category)
+    return children
+
+
+def item_prefetches(user, prefix=''):
+    """Prefetch the product / listing of favorites or cart items, ready for the List serializers"""
+    return [
+        Prefetch(f'{prefix}product', queryset=for_list(Product.objects.all(), user)),
+        Prefetch(f'{prefix}material_listing', queryset=for_list(MaterialListing.objects.all(), user)),
+    ]
+
+
+def cart_items(user):
+    """Prefetch of a cart's items for CartSerializer"""
+    return Prefetch(
+        'items',
+        queryset=CartItem.objects.prefetch_related(*item_prefetches(user))
+    )
@@ -0,0 +1,18 @@
+from rest_framework import renderers
+
+from .notifications import format_event
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """
+    Renderer for Server-Sent Events endpoints.
+    Streaming responses bypass it; it only encodes error payloads as an SSE frame.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_event(data, event='error')
@@ -0,0 +1,351 @@
+"""
+Synthetic marketplace data for benchmarks and load tests.
+
+Rows are generated batch by batch and written with bulk_create, so memory
+stays flat from 10k to 10M rows. Primary keys are derived from the seed
+and the row index (uuid5), which lets any row reference another without
+keeping ids in memory and makes a run reproducible: the same seed and
+counts always produce the same data, and re-running skips existing rows.
+"""
+import hashlib
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import Profile, User
+from .models import (
+    Category, Favorite, Material, MaterialImage, MaterialListing,
+    Message, Order, Product, ProductImage, Review
+)
+
+
+SEED_PASSWORD = 'seed-password'
+SEED_EMAIL_DOMAIN = 'seed.jaddid.test'
+SEED_NAMESPACE = uuid.UUID('5b0d3c9e-6a43-4c1f-9f57-2f1f7c1d8a10')
+
+# Insert order; later kinds reference earlier ones
+KINDS = [
+    'users', 'categories', 'materials', 'listings', 'products',
+    'images', 'favorites', 'reviews', 'orders', 'messages',
+]
+
+FIRST_NAMES = ['Ahmed', 'Sara', 'Omar', 'Mona', 'Youssef', 'Nour', 'Karim', 'Laila', 'Hassan', 'Dina']
+LAST_NAMES = ['Hassan', 'Ali', 'Ibrahim', 'Mahmoud', 'Saleh', 'Fathy', 'Kamel', 'Nabil']
+CITIES = ['Cairo', 'Giza', 'Alexandria', 'Mansoura', 'Tanta', 'Aswan', 'Suez', 'Luxor']
+UNITS = ['kg', 'ton', 'bag', 'item']
+
+
+def default_counts(users):
+    """Row counts for a marketplace with `users` users"""
+    return {
+        'users': users,
+        'categories': min(max(users // 1000, 10), 200),
+        'materials': min(max(users // 200, 20), 2000),
+        'listings': users * 2,
+        'products': users * 2,
+        'images': 1,  # per listing and per product
+        'favorites': users * 3,
+        'reviews': users,
+        'orders': users * 2,
+        'messages': users * 5,
+    }
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values we generate"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class MarketplaceSeeder:
+    """Insert a synthetic marketplace; see default_counts() for the shape"""
+
+    def __init__(self, counts, seed=0, batch_size=5000, log=None):
+        self.counts = counts
+        self.seed = seed
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def id(self, kind, index):
+        return uuid.uuid5(SEED_NAMESPACE, f'{self.seed}:{kind}:{index}')
+
+    def user_id(self, index):
+        return self.id('users', index % self.counts['users'])
+
+    def seller_index(self, kind, index):
+        # Spread items over sellers without storing the mapping
+        return (index * 7919 + (kind == 'listings')) % self.counts['users']
+
+    def timestamp(self, rng):
+        return self.now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+    def price(self, index):
+        return Decimal(10 + (index * 37) % 990)
+
+    def run(self, kinds=KINDS):
+        self.password = make_password(SEED_PASSWORD)
+        models = [
+            User, Profile, Category, Material, MaterialListing, Product,
+            MaterialImage, ProductImage, Favorite, Review, Order, Message,
+        ]
+        with manual_timestamps(*models):
+            for kind in kinds:
+                getattr(self, f'seed_{kind}')()
+
+    def insert(self, kind, total, build):
+        """Build rows index by index and bulk insert them batch by batch"""
+        rng = random.Random(f'{self.seed}:{kind}')
+        for start in range(0, total, self.batch_size):
+            rows = {}
+            for index in range(start, min(start + self.batch_size, total)):
+                for row in build(index, rng):
+                    rows.setdefault(type(row), []).append(row)
+            for model, objects in rows.items():
+                model.objects.bulk_create(objects, ignore_conflicts=True)
+            self.log(f'{kind}: {min(start + self.batch_size, total)}/{total}')
+
+    def seed_users(self):
+        def build(index, rng):
+            created = self.timestamp(rng)
+            user_id = self.id('users', index)
+            yield User(
+                id=user_id,
+                email=f'user{index}.{self.seed}@{SEED_EMAIL_DOMAIN}',
+                password=self.password,
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                role=rng.choice([User.Individual, User.Individual, User.Factory, User.Company]),
+                is_verified=rng.random() < 0.6,
+                date_joined=created,
+                created_at=created,
+                updated_at=created,
+            )
+            yield Profile(
+                id=self.id('profiles', index),
+                user_id=user_id,
+                address=rng.choice(CITIES),
+                created_at=created,
+                updated_at=created,
+            )
+        self.insert('users', self.counts['users'], build)
+
+    def seed_categories(self):
+        def build(index, rng):
+            created = self.timestamp(rng)
+            # The first tenth are roots, the rest hang under them
+            roots = max(self.counts['categories'] // 10, 1)
+            yield Category(
+                id=self.id('categories', index),
+                name=f'Category {self.seed}-{index}',
+                parent_id=self.id('categories', index % roots) if index >= roots else None,
+                created_at=created,
+                updated_at=created,
+            )
+        self.insert('categories', self.counts['categories'], build)
+
+    def seed_materials(self):
+        def build(index, rng):
+            created = self.timestamp(rng)
+            yield Material(
+                id=self.id('materials', index),
+                name=f'Material {self.seed}-{index}',
+                category_id=self.id('categories', index % self.counts['categories']),
+                default_unit=rng.choice(UNITS),
+                created_at=created,
+                updated_at=created,
+            )
+        self.insert('materials', self.counts['materials'], build)
+
+    def _status(self, rng, model):
+        roll = rng.random()
+        if roll < 0.8:
+            return model.ACTIVE
+        if roll < 0.9:
+            return model.DRAFT
+        return model.SOLD
+
+    def seed_listings(self):
+        def build(index, rng):
+            created = self.timestamp(rng)
+            status = self._status(rng, MaterialListing)
+            yield MaterialListing(
+                id=self.id('listings', index),
+                seller_id=self.user_id(self.seller_index('listings', index)),
+                material_id=self.id('materials', index % self.counts['materials']),
+                title=f'Listing {index}',
+                description='Synthetic listing',
+                quantity=Decimal(rng.randint(1, 5000)),
+                unit=rng.choice(UNITS),
+                price_per_unit=self.price(index),
+                condition=rng.choice(MaterialListing.CONDITION_CHOICES)[0],
+                status=status,
+                location=rng.choice(CITIES),
+                views_count=rng.randrange(1000),
+                created_at=created,
+                updated_at=created,
+                published_at=created if status != MaterialListing.DRAFT else None,
+            )
+        self.insert('listings', self.counts['listings'], build)
+
+    def seed_products(self):
+        def build(index, rng):
+            created = self.timestamp(rng)
+            status = self._status(rng, Product)
+            yield Product(
+                id=self.id('products', index),
+                seller_id=self.user_id(self.seller_index('products', index)),
+                category_id=self.id('categories', index % self.counts['categories']),
+                title=f'Product {index}',
+                description='Synthetic product',
+                price=self.price(index),
+                quantity=rng.randint(1, 50),
+                condition=rng.choice(Product.CONDITION_CHOICES)[0],
+                status=status,
+                location=rng.choice(CITIES),
+                views_count=rng.randrange(1000),
+                created_at=created,
+                updated_at=created,
+                published_at=created if status != Product.DRAFT else None,
+            )
+        self.insert('products', self.counts['products'], build)
+
+    def placeholder_image(self, model):
+        """Store one small JPEG that every seeded image row points to"""
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), (46, 125, 50)).save(buffer, 'JPEG')
+        content = buffer.getvalue()
+        field = model._meta.get_field('image')
+        name = field.storage.save(field.generate_filename(None, 'seed.jpg'), ContentFile(content))
+        return name, hashlib.sha256(content).hexdigest()
+
+    def seed_images(self):
+        per_item = self.counts['images']
+        if not per_item:
+            return
+        name, digest = self.placeholder_image(ProductImage)
+        listings = self.counts['listings']
+
+        def build(index, rng):
+            item, order = divmod(index, per_item)
+            created = self.timestamp(rng)
+            common = dict(
+                image=name, content_hash=digest, is_primary=(order == 0),
+                order=order, created_at=created,
+            )
+            if item < listings:
+                yield MaterialImage(
+                    id=self.id('listing-images', index),
+                    material_listing_id=self.id('listings', item),
+                    **common
+                )
+            else:
+                yield ProductImage(
+                    id=self.id('product-images', index),
+                    product_id=self.id('products', item - listings),
+                    **common
+                )
+        self.insert('images', (listings + self.counts['products']) * per_item, build)
+
+    def _item(self, rng):
+        """A random product or listing as (product_id, listing_id, kind, index)"""
+        if rng.random() < 0.5:
+            index = rng.randrange(self.counts['products'])
+            return self.id('products', index), None, 'products', index
+        index = rng.randrange(self.counts['listings'])
+        return None, self.id('listings', index), 'listings', index
+
+    def seed_favorites(self):
+        def build(index, rng):
+            product_id, listing_id, _, _ = self._item(rng)
+            yield Favorite(
+                id=self.id('favorites', index),
+                user_id=self.user_id(rng.randrange(self.counts['users'])),
+                product_id=product_id,
+                material_listing_id=listing_id,
+                created_at=self.timestamp(rng),
+            )
+        self.insert('favorites', self.counts['favorites'], build)
+
+    def seed_reviews(self):
+        def build(index, rng):
+            product_id, listing_id, _, _ = self._item(rng)
+            created = self.timestamp(rng)
+            yield Review(
+                id=self.id('reviews', index),
+                product_id=product_id,
+                material_listing_id=listing_id,
+                reviewer_id=self.user_id(rng.randrange(self.counts['users'])),
+                rating=rng.randint(1, 5),
+                comment='Synthetic review',
+                created_at=created,
+                updated_at=created,
+            )
+        self.insert('reviews', self.counts['reviews'], build)
+
+    def seed_orders(self):
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+
+        def build(index, rng):
+            product_id, listing_id, kind, item = self._item(rng)
+            quantity = Decimal(rng.randint(1, 20))
+            unit_price = self.price(item)
+            created = self.timestamp(rng)
+            yield Order(
+                id=self.id('orders', index),
+                order_number=f'SEED-{self.seed}-{index:010d}',
+                order_type=Order.PRODUCT if product_id else Order.MATERIAL,
+                buyer_id=self.user_id(rng.randrange(self.counts['users'])),
+                seller_id=self.user_id(self.seller_index(kind, item)),
+                product_id=product_id,
+                material_listing_id=listing_id,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_price=quantity * unit_price,
+                status=rng.choice(statuses),
+                created_at=created,
+                updated_at=created,
+            )
+        self.insert('orders', self.counts['orders'], build)
+
+    def seed_messages(self):
+        users = self.counts['users']
+
+        def build(index, rng):
+            sender = rng.randrange(users)
+            product_id, listing_id = None, None
+            if rng.random() < 0.5:
+                product_id, listing_id, _, _ = self._item(rng)
+            created = self.timestamp(rng)
+            is_read = rng.random() < 0.7
+            yield Message(
+                id=self.id('messages', index),
+                sender_id=self.user_id(sender),
+                recipient_id=self.user_id((sender + 1 + rng.randrange(max(users - 1, 1))) % users),
+                product_id=product_id,
+                material_listing_id=listing_id,
+                message='Synthetic message',
+                is_read=is_read,
+                read_at=created if is_read else None,
+                created_at=created,
+            )
+        self.insert('messages', self.counts['messages'], build)
@@ -1,11 +1,38 @@
 from rest_framework import serializers
 from django.db import transaction
+from django.db.models import Avg, Count
 from .models import (
     Category, Material, MaterialListing, MaterialImage,
     Product, ProductImage, Cart, CartItem, Favorite,
-    Order, Review, Message, Report
+    Order, Review, Message, Report, SellerStats
 )
 from accounts.models import User
+from django.conf import settings
+from jaddid.images import variant_url, variant_urls
+from jaddid.uploads import BoundedImageField, save_images
+
+
+# The views annotate their querysets (see marketplace.queries) so that these
+# fields cost no query per row; the fallbacks serve unannotated instances.
+
+def is_favorited(obj, request):
+    favorited = getattr(obj, 'user_favorited', None)
+    if favorited is not None:
+        return favorited
+    if request and request.user.is_authenticated:
+        return obj.favorited_by.filter(user_id=request.user.pk).exists()
+    return False
+
+
+def approved_reviews(obj):
+    """(count, average rating) of the approved reviews of a product or listing"""
+    if not hasattr(obj, 'approved_review_count'):
+        stats = obj.reviews.filter(is_approved=True).aggregate(
+            approved_review_count=Count('pk'), approved_average_rating=Avg('rating')
+        )
+        obj.approved_review_count = stats['approved_review_count']
+        obj.approved_average_rating = stats['approved_average_rating']
+    return obj.approved_review_count, obj.approved_average_rating
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -13,17 +40,22 @@ class CategorySerializer(serializers.ModelSerializer):
     
     subcategories = serializers.SerializerMethodField()
     product_count = serializers.SerializerMethodField()
+    icon_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
         fields = [
-            'id', 'name', 'name_ar', 'description', 'icon',
+            'id', 'name', 'name_ar', 'description', 'icon', 'icon_variants',
             'parent', 'subcategories', 'is_active', 
             'product_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_subcategories(self, obj):
+        # Active categories grouped by parent id, loaded once per request
+        children = self.context.get('category_children')
+        if children is not None:
+            return CategorySerializer(children.get(obj.pk, []), many=True, context=self.context).data
         if obj.subcategories.exists():
             return CategorySerializer(
                 obj.subcategories.filter(is_active=True), 
@@ -33,7 +65,13 @@ class CategorySerializer(serializers.ModelSerializer):
         return []
     
     def get_product_count(self, obj):
+        count = getattr(obj, 'active_product_count', None)
+        if count is not None:
+            return count
         return obj.products.filter(status='active').count()
+    
+    def get_icon_variants(self, obj):
+        return variant_urls(obj.icon, obj.icon_variants, self.context.get('request'))
 
 
 class MaterialSerializer(serializers.ModelSerializer):
@@ -41,27 +79,39 @@ class MaterialSerializer(serializers.ModelSerializer):
     
     category_name = serializers.CharField(source='category.name', read_only=True)
     listing_count = serializers.SerializerMethodField()
+    icon_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Material
         fields = [
             'id', 'name', 'name_ar', 'description', 'description_ar',
-            'category', 'category_name', 'default_unit', 'icon',
+            'category', 'category_name', 'default_unit', 'icon', 'icon_variants',
             'is_active', 'listing_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_listing_count(self, obj):
+        count = getattr(obj, 'active_listing_count', None)
+        if count is not None:
+            return count
         return obj.listings.filter(status='active').count()
+    
+    def get_icon_variants(self, obj):
+        return variant_urls(obj.icon, obj.icon_variants, self.context.get('request'))
 
 
 class MaterialImageSerializer(serializers.ModelSerializer):
     """Material Listing Image Serializer"""
     
+    variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = MaterialImage
-        fields = ['id', 'image', 'is_primary', 'order', 'created_at']
+        fields = ['id', 'image', 'variants', 'is_primary', 'order', 'created_at']
         read_only_fields = ['id', 'created_at']
+    
+    def get_variants(self, obj):
+        return variant_urls(obj.image, obj.variants, self.context.get('request'))
 
 
 class MaterialListingListSerializer(serializers.ModelSerializer):
@@ -72,6 +122,7 @@ class MaterialListingListSerializer(serializers.ModelSerializer):
     material_name = serializers.CharField(source='material.name', read_only=True)
     material_name_ar = serializers.CharField(source='material.name_ar', read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_webp = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     
@@ -81,25 +132,35 @@ class MaterialListingListSerializer(serializers.ModelSerializer):
             'id', 'material', 'material_name', 'material_name_ar',
             'title', 'title_ar', 'quantity', 'unit', 'price_per_unit',
             'total_price', 'minimum_order_quantity', 'condition', 'status',
-            'location', 'seller_name', 'seller_email', 'primary_image',
+            'location', 'seller_name', 'seller_email',
+            'primary_image', 'primary_image_webp',
             'views_count', 'favorites_count', 'is_favorited',
             'available_from', 'available_until', 'created_at', 'published_at'
         ]
         read_only_fields = ['id', 'views_count', 'favorites_count', 'created_at', 'published_at']
     
+    def _primary(self, obj):
+        # Use the prefetched images instead of a query per row
+        return next((image for image in obj.images.all() if image.is_primary), None)
+    
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
-        if primary:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary.image.url)
+        """Thumbnail-sized JPEG of the primary image"""
+        primary = self._primary(obj)
+        request = self.context.get('request')
+        if primary and request:
+            return variant_url(primary.image, primary.variants, 'thumbnail', 'jpeg', request)
         return None
     
-    def get_is_favorited(self, obj):
+    def get_primary_image_webp(self, obj):
+        """Thumbnail-sized WebP of the primary image"""
+        primary = self._primary(obj)
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
+        if primary and request:
+            return variant_url(primary.image, primary.variants, 'thumbnail', 'webp', request)
+        return None
+    
+    def get_is_favorited(self, obj):
+        return is_favorited(obj, self.context.get('request'))
 
 
 class MaterialListingDetailSerializer(serializers.ModelSerializer):
@@ -139,19 +200,15 @@ class MaterialListingDetailSerializer(serializers.ModelSerializer):
         }
     
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
+        return is_favorited(obj, self.context.get('request'))
     
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return 0.0
+        _, average = approved_reviews(obj)
+        return round(average, 1) if average is not None else 0.0
     
     def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        count, _ = approved_reviews(obj)
+        return count
 
 
 class MaterialListingCreateUpdateSerializer(serializers.ModelSerializer):
@@ -159,7 +216,8 @@ class MaterialListingCreateUpdateSerializer(serializers.ModelSerializer):
     
     images = MaterialImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(),
+        child=BoundedImageField(),
+        max_length=settings.MAX_UPLOAD_IMAGES,
         write_only=True,
         required=False
     )
@@ -171,10 +229,23 @@ class MaterialListingCreateUpdateSerializer(serializers.ModelSerializer):
             'description_ar', 'quantity', 'unit', 'price_per_unit',
             'minimum_order_quantity', 'condition', 'status', 'location',
             'latitude', 'longitude', 'available_from', 'available_until',
-            'notes', 'images', 'uploaded_images'
+            'notes', 'external_id', 'images', 'uploaded_images'
         ]
         read_only_fields = ['id']
     
+    def validate_external_id(self, value):
+        if not value:
+            return None
+        listings = MaterialListing.objects.filter(
+            seller_id=self.context['request'].user.pk,
+            external_id=value
+        )
+        if self.instance is not None:
+            listings = listings.exclude(pk=self.instance.pk)
+        if listings.exists():
+            raise serializers.ValidationError("You already have a listing with this external ID.")
+        return value
+    
     @transaction.atomic
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
@@ -189,13 +260,7 @@ class MaterialListingCreateUpdateSerializer(serializers.ModelSerializer):
         material_listing = MaterialListing.objects.create(**validated_data)
         
         # Create material listing images
-        for idx, image in enumerate(uploaded_images):
-            MaterialImage.objects.create(
-                material_listing=material_listing,
-                image=image,
-                is_primary=(idx == 0),
-                order=idx
-            )
+        save_images(MaterialImage, 'material_listing', material_listing, uploaded_images)
         
         return material_listing
     
@@ -210,25 +275,55 @@ class MaterialListingCreateUpdateSerializer(serializers.ModelSerializer):
         
         # Add new images if provided
         if uploaded_images:
-            current_count = instance.images.count()
-            for idx, image in enumerate(uploaded_images):
-                MaterialImage.objects.create(
-                    material_listing=instance,
-                    image=image,
-                    is_primary=(current_count == 0 and idx == 0),
-                    order=current_count + idx
-                )
+            save_images(
+                MaterialImage, 'material_listing', instance, uploaded_images,
+                start=instance.images.count()
+            )
         
         return instance
 
 
+class MaterialListingImportSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of a bulk listing import.
+    `material` is a material id or name, resolved from the importer's lookup table.
+    """
+    
+    material = serializers.CharField()
+    
+    class Meta:
+        model = MaterialListing
+        fields = [
+            'material', 'external_id', 'title', 'title_ar', 'description',
+            'description_ar', 'quantity', 'unit', 'price_per_unit',
+            'minimum_order_quantity', 'condition', 'status', 'location',
+            'latitude', 'longitude', 'available_from', 'available_until',
+            'notes'
+        ]
+        # Defaults to the material's unit (see ListingImporter)
+        extra_kwargs = {'unit': {'required': False}}
+        # Rows are matched on (seller, external_id) by the importer
+        validators = []
+    
+    def validate_material(self, value):
+        material = self.context['materials'].get(value.strip().lower())
+        if material is None:
+            raise serializers.ValidationError("Unknown or inactive material.")
+        return material
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
     """Product Image Serializer"""
     
+    variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'is_primary', 'order', 'created_at']
+        fields = ['id', 'image', 'variants', 'is_primary', 'order', 'created_at']
         read_only_fields = ['id', 'created_at']
+    
+    def get_variants(self, obj):
+        return variant_urls(obj.image, obj.variants, self.context.get('request'))
 
 
 class ProductListSerializer(serializers.ModelSerializer):
@@ -238,6 +333,7 @@ class ProductListSerializer(serializers.ModelSerializer):
     seller_email = serializers.EmailField(source='seller.email', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_webp = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     
     class Meta:
@@ -245,25 +341,35 @@ class ProductListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'title_ar', 'price', 'quantity',
             'condition', 'status', 'location', 'seller_name', 
-            'seller_email', 'category_name', 'primary_image',
+            'seller_email', 'category_name',
+            'primary_image', 'primary_image_webp',
             'views_count', 'favorites_count', 'is_favorited',
             'created_at', 'published_at'
         ]
         read_only_fields = ['id', 'views_count', 'favorites_count', 'created_at', 'published_at']
     
+    def _primary(self, obj):
+        # Use the prefetched images instead of a query per row
+        return next((image for image in obj.images.all() if image.is_primary), None)
+    
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
-        if primary:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary.image.url)
+        """Thumbnail-sized JPEG of the primary image"""
+        primary = self._primary(obj)
+        request = self.context.get('request')
+        if primary and request:
+            return variant_url(primary.image, primary.variants, 'thumbnail', 'jpeg', request)
         return None
     
-    def get_is_favorited(self, obj):
+    def get_primary_image_webp(self, obj):
+        """Thumbnail-sized WebP of the primary image"""
+        primary = self._primary(obj)
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
+        if primary and request:
+            return variant_url(primary.image, primary.variants, 'thumbnail', 'webp', request)
+        return None
+    
+    def get_is_favorited(self, obj):
+        return is_favorited(obj, self.context.get('request'))
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -300,19 +406,15 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         }
     
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
+        return is_favorited(obj, self.context.get('request'))
     
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return 0.0
+        _, average = approved_reviews(obj)
+        return round(average, 1) if average is not None else 0.0
     
     def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        count, _ = approved_reviews(obj)
+        return count
 
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
@@ -320,7 +422,8 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     
     images = ProductImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(),
+        child=BoundedImageField(),
+        max_length=settings.MAX_UPLOAD_IMAGES,
         write_only=True,
         required=False
     )
@@ -342,13 +445,7 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         product = Product.objects.create(**validated_data)
         
         # Create product images
-        for idx, image in enumerate(uploaded_images):
-            ProductImage.objects.create(
-                product=product,
-                image=image,
-                is_primary=(idx == 0),
-                order=idx
-            )
+        save_images(ProductImage, 'product', product, uploaded_images)
         
         return product
     
@@ -363,14 +460,10 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         
         # Add new images if provided
         if uploaded_images:
-            current_count = instance.images.count()
-            for idx, image in enumerate(uploaded_images):
-                ProductImage.objects.create(
-                    product=instance,
-                    image=image,
-                    is_primary=(current_count == 0 and idx == 0),
-                    order=current_count + idx
-                )
+            save_images(
+                ProductImage, 'product', instance, uploaded_images,
+                start=instance.images.count()
+            )
         
         return instance
 
@@ -820,3 +913,38 @@ class ReportSerializer(serializers.ModelSerializer):
         validated_data['reporter'] = request.user
         
         return super().create(validated_data)
+
+
+class SellerStatsSerializer(serializers.ModelSerializer):
+    """Seller Stats Serializer"""
+
+    class Meta:
+        model = SellerStats
+        fields = [
+            'active_products', 'active_listings', 'completed_orders',
+            'review_count', 'average_rating', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class SellerProfileSerializer(serializers.ModelSerializer):
+    """Public seller profile: name, avatar, join date and seller stats only"""
+
+    full_name = serializers.CharField(source='get_full_name', read_only=True)
+    avatar = serializers.SerializerMethodField()
+    seller_stats = SellerStatsSerializer(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'full_name', 'avatar', 'date_joined', 'seller_stats']
+        read_only_fields = fields
+
+    def get_avatar(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile is None:
+            return None
+        return variant_urls(
+            profile.profile_image,
+            profile.profile_image_variants,
+            self.context.get('request')
+        )
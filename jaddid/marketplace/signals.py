@@ -0,0 +1,76 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import User, Profile
+from jaddid.images import schedule_variants
+from .models import (
+    Category, Material, MaterialImage, MaterialListing, ProductImage,
+    Product, Message, Order, Review
+)
+from .notifications import bump_version
+from .stats import invalidate_seller_profile, schedule_stats_refresh
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def message_changed(sender, instance, **kwargs):
+    """Wake up pollers of both sides of the conversation"""
+    transaction.on_commit(
+        partial(bump_version, instance.sender_id, instance.recipient_id)
+    )
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    """Wake up pollers of the buyer and the seller"""
+    transaction.on_commit(
+        partial(bump_version, instance.buyer_id, instance.seller_id)
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=MaterialImage)
+def listing_image_saved(sender, instance, **kwargs):
+    """Generate responsive sizes for new listing/product images"""
+    schedule_variants(instance, 'image', 'variants')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Material)
+def icon_saved(sender, instance, **kwargs):
+    """Generate responsive sizes for category/material icons"""
+    schedule_variants(instance, 'icon', 'icon_variants')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=MaterialListing)
+@receiver(post_delete, sender=MaterialListing)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def seller_item_changed(sender, instance, **kwargs):
+    """Recount the seller's stats"""
+    schedule_stats_refresh(instance.seller_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    """Recount the reviewed seller's rating"""
+    item = instance.product or instance.material_listing
+    if item is not None:
+        schedule_stats_refresh(item.seller_id)
+
+
+@receiver(post_save, sender=User)
+def seller_user_saved(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_seller_profile, instance.pk))
+
+
+@receiver(post_save, sender=Profile)
+def seller_profile_saved(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_seller_profile, instance.user_id))
@@ -0,0 +1,120 @@
+"""
+Denormalized seller statistics.
+
+Writes to products, listings, orders and reviews schedule a recount of the
+seller's SellerStats row after commit. The public seller profile reads that
+row together with the user and profile in one query, and caches the result
+with relative URLs; absolute ones are built for each request.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+
+from jaddid import metrics
+
+
+PROFILE_KEY = 'sellers:profile:{seller_id}'
+PENDING_KEY = 'sellers:stats_pending:{seller_id}'
+PENDING_TIMEOUT = 60
+
+
+def compute_seller_stats(seller_id):
+    """Count a seller's active items, completed sales and approved reviews"""
+    from .models import MaterialListing, Order, Product, Review
+
+    reviews = Review.objects.filter(
+        Q(product__seller_id=seller_id) | Q(material_listing__seller_id=seller_id),
+        is_approved=True
+    ).aggregate(review_count=Count('id'), average_rating=Avg('rating'))
+
+    average = reviews['average_rating']
+    return {
+        'active_products': Product.objects.filter(
+            seller_id=seller_id, status=Product.ACTIVE
+        ).count(),
+        'active_listings': MaterialListing.objects.filter(
+            seller_id=seller_id, status=MaterialListing.ACTIVE
+        ).count(),
+        'completed_orders': Order.objects.filter(
+            seller_id=seller_id, status=Order.COMPLETED
+        ).count(),
+        'review_count': reviews['review_count'],
+        'average_rating': round(average, 2) if average is not None else None,
+    }
+
+
+def refresh_seller_stats(seller_id):
+    """Recount and store a seller's stats, then drop the cached profile"""
+    from .models import SellerStats
+
+    stats, _ = SellerStats.objects.update_or_create(
+        seller_id=seller_id,
+        defaults=compute_seller_stats(seller_id)
+    )
+    invalidate_seller_profile(seller_id)
+    return stats
+
+
+def schedule_stats_refresh(seller_id):
+    """Queue a recount once the current transaction commits; repeated calls collapse"""
+    from .tasks import refresh_seller_stats_task
+
+    if seller_id is None:
+        return
+
+    def send():
+        if cache.add(PENDING_KEY.format(seller_id=seller_id), 1, PENDING_TIMEOUT):
+            refresh_seller_stats_task.delay(str(seller_id))
+
+    transaction.on_commit(send)
+
+
+def invalidate_seller_profile(seller_id):
+    cache.delete(PROFILE_KEY.format(seller_id=seller_id))
+
+
+def absolute_avatar(data, request):
+    """Copy of a cached profile with the avatar URLs made absolute for `request`"""
+    if request is None or not data.get('avatar'):
+        return data
+    return {**data, 'avatar': {
+        size_name: {fmt: request.build_absolute_uri(url) for fmt, url in urls.items()}
+        for size_name, urls in data['avatar'].items()
+    }}
+
+
+def get_seller_profile(seller_id, request=None):
+    """
+    Return the serialized public profile of an active seller, or None for
+    users who are inactive or have never listed a product or material.
+    Served from the cache; a miss costs one select_related query.
+    """
+    from accounts.models import User
+    from .models import MaterialListing, Product, SellerStats
+    from .serializers import SellerProfileSerializer
+
+    key = PROFILE_KEY.format(seller_id=seller_id)
+    data = cache.get(key)
+    metrics.record_cache('seller_profile', data is not None)
+    if data is not None:
+        return absolute_avatar(data, request)
+
+    seller = User.objects.select_related('profile', 'seller_stats').filter(
+        Exists(Product.objects.filter(seller_id=OuterRef('pk')))
+        | Exists(MaterialListing.objects.filter(seller_id=OuterRef('pk'))),
+        pk=seller_id,
+        is_active=True
+    ).first()
+    if seller is None:
+        return None
+
+    try:
+        seller.seller_stats
+    except SellerStats.DoesNotExist:
+        seller.seller_stats = refresh_seller_stats(seller.pk)
+
+    # Cached for every host, so serialized without the request
+    data = SellerProfileSerializer(seller).data
+    cache.set(key, data, settings.SELLER_PROFILE_CACHE_TIMEOUT)
+    return absolute_avatar(data, request)
@@ -0,0 +1,72 @@
+"""
+Background tasks for the marketplace app.
+
+Every task is safe to retry: writes are either idempotent or guarded by a
+one-shot token stored in the cache.
+"""
+import time
+
+from celery import shared_task
+from django.apps import apps
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from jaddid import metrics
+
+
+TOKEN_KEY = 'tasks:token:{token}'
+TOKEN_TIMEOUT = 60 * 60 * 24
+
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def increment_counter(model_label, pk, field, delta, token, queued_at=None):
+    """Apply a counter delta (views_count, favorites_count) exactly once"""
+    key = TOKEN_KEY.format(token=token)
+    if not cache.add(key, 1, timeout=TOKEN_TIMEOUT):
+        # Already applied by an earlier delivery of this task
+        return
+
+    try:
+        model = apps.get_model(model_label)
+        model.objects.filter(pk=pk).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+    except Exception:
+        cache.delete(key)
+        raise
+
+    if queued_at is not None:
+        metrics.observe('counter_flush_lag_seconds', max(time.time() - queued_at, 0))
+        metrics.maybe_publish()
+
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3,
+)
+def flush_counters_task():
+    """Write the buffered counter deltas (see marketplace.counters); run by celery beat"""
+    from .counters import flush_counters
+
+    return flush_counters()
+
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3,
+)
+def refresh_seller_stats_task(seller_id):
+    """Recount a seller's denormalized stats"""
+    from .stats import PENDING_KEY, refresh_seller_stats
+
+    # Clear first so writes committed while we count schedule another run
+    cache.delete(PENDING_KEY.format(seller_id=seller_id))
+    refresh_seller_stats(seller_id)
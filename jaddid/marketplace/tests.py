@@ -1,3 +1,1238 @@
-from django.test import TestCase
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextvars import copy_context
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import EmptyPage
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.functions import Lower
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import path, reverse
+from PIL import Image, PngImagePlugin
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from accounts.tokens import RefreshToken
+from jaddid import metrics
+from jaddid.admin import EstimatedCountPaginator
+from jaddid.cache import shared_cache
+from jaddid.exports import iter_csv, iter_keyset, iter_values
+from jaddid.images import variant_url, variant_urls
+from jaddid.instrumentation import QueryInstrumentationMiddleware
+from jaddid.routing import PIN_KEY, ReplicaRouter, use_replica
+from jaddid.storage import hashed_digest, sweep_unreferenced
+from jaddid.uploads import BoundedImageField, save_images
+from . import async_views
+from .models import (
+    Cart, CartItem, Category, Favorite, Material, MaterialListing, Message,
+    Order, Product, ProductImage, Report, Review
+)
+from .bulk_actions import set_listing_status
+from .counters import bump_counter, flush_counters
+from .notifications import VERSION_KEY
+from .seeding import KINDS, MarketplaceSeeder
+from .stats import refresh_seller_stats
+from .tasks import TOKEN_KEY, increment_counter
+
+
+def image_upload(name='photo.png', size=(1000, 600), image_format='PNG', **options):
+    """An uploaded image with solid content"""
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+def use_temporary_media_root(test):
+    """Point MEDIA_ROOT at an empty directory for the duration of `test`"""
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    override = override_settings(MEDIA_ROOT=media_root)
+    override.enable()
+    test.addCleanup(override.disable)
+    return media_root
+
+
+def mirror_replicas(test, *aliases):
+    """
+    Serve `aliases` as read replicas for the duration of `test`.
+
+    Like a replica with TEST = {'MIRROR': 'default'}, each alias uses the
+    default connection, so replica reads see the test's rows.
+    """
+    override = override_settings(REPLICA_DATABASES=list(aliases))
+    override.enable()
+    test.addCleanup(override.disable)
+    for alias in aliases:
+        connections[alias] = connections[DEFAULT_DB_ALIAS]
+        test.addCleanup(connections.__delitem__, alias)
+
+
+def record_read_aliases(test):
+    """Return the list the database alias of every routed read is appended to"""
+    aliases = []
+    db_for_read = ReplicaRouter.db_for_read
+
+    def recording(router, model, **hints):
+        alias = db_for_read(router, model, **hints)
+        aliases.append(alias or DEFAULT_DB_ALIAS)
+        return alias
+
+    patcher = mock.patch.object(ReplicaRouter, 'db_for_read', recording)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return aliases
+
+
+def fail_on_broken(model, ids, status):
+    """Bulk action that fails for any chunk holding a product titled 'Broken'"""
+    if model.objects.filter(pk__in=ids, title='Broken').exists():
+        raise ValueError('Broken product')
+    set_listing_status(model, ids, status)
+
+
+# The async views are only mounted when ASYNC_VIEWS is on as the urlconf is
+# imported; AsyncViewTests use this urlconf instead
+urlpatterns = [
+    path('messages/poll/', async_views.poll, name='message-poll-async'),
+    path('messages/unread_count/', async_views.unread_count, name='message-unread-count-async'),
+    path('messages/inbox/', async_views.inbox, name='message-inbox-async'),
+]
+
+
+class SellerProfileTests(TestCase):
+    """The public seller profile is anonymous, so it must not leak contact details"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(
+            email='seller@example.com', password='Str0ng-pass!', first_name='Sara', last_name='Ali'
+        )
+        self.seller.profile.phone = '01000000000'
+        self.seller.profile.address = 'Cairo'
+        self.seller.profile.save()
+
+        category = Category.objects.create(name='Metals')
+        Product.objects.create(
+            seller=self.seller, category=category, title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo',
+            status=Product.ACTIVE
+        )
+
+    def get(self, user):
+        return self.client.get(reverse('marketplace:seller-detail', kwargs={'pk': user.pk}))
+
+    def test_profile_exposes_only_public_fields(self):
+        response = self.get(self.seller)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data),
+            {'id', 'full_name', 'avatar', 'date_joined', 'seller_stats'}
+        )
+        self.assertEqual(response.data['full_name'], 'Sara Ali')
+        self.assertEqual(response.data['seller_stats']['active_products'], 1)
+        self.assertNotIn('seller@example.com', response.content.decode())
+        self.assertNotIn('01000000000', response.content.decode())
+
+    @override_settings(ALLOWED_HOSTS=['a.example.com', 'b.example.com'])
+    def test_cached_avatar_urls_use_each_requests_host(self):
+        self.seller.profile.profile_image = 'profiles/sara.png'
+        self.seller.profile.save()
+        url = reverse('marketplace:seller-detail', kwargs={'pk': self.seller.pk})
+
+        first = self.client.get(url, HTTP_HOST='a.example.com').data['avatar']
+        second = self.client.get(url, HTTP_HOST='b.example.com').data['avatar']
+
+        self.assertEqual(first['thumbnail']['jpeg'], 'http://a.example.com/media/profiles/sara.png')
+        self.assertEqual(second['thumbnail']['jpeg'], 'http://b.example.com/media/profiles/sara.png')
+
+    def test_users_without_items_are_not_found(self):
+        buyer = User.objects.create_user(email='buyer@example.com', password='Str0ng-pass!')
+
+        self.assertEqual(self.get(buyer).status_code, 404)
+
+    def test_inactive_sellers_are_not_found(self):
+        self.seller.is_active = False
+        self.seller.save()
+
+        self.assertEqual(self.get(self.seller).status_code, 404)
+
+
+class InventoryUpdateTests(TestCase):
+    """Batch stock updates accept sold-out stock and naive timestamps"""
+
+    def setUp(self):
+        self.seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        category = Category.objects.create(name='Metals')
+        self.product = Product.objects.create(
+            seller=self.seller, category=category, title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def update(self, **change):
+        response = self.client.patch(
+            reverse('marketplace:product-inventory'),
+            {'changes': [{'id': str(self.product.pk), **change}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0]
+
+    def test_stock_can_be_set_to_zero(self):
+        self.assertEqual(self.update(quantity=0)['status'], 'updated')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+
+    def test_negative_stock_is_rejected(self):
+        self.assertEqual(self.update(quantity=-1)['status'], 'error')
+
+    def test_naive_updated_at_is_read_as_utc(self):
+        seen = self.product.updated_at.replace(tzinfo=None).isoformat()
+        self.assertEqual(self.update(quantity=5, updated_at=seen)['status'], 'updated')
+        self.assertEqual(self.update(quantity=6, updated_at=seen)['status'], 'conflict')
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Every changelist renders a full page from 100 rows in a fixed number of queries"""
+
+    ROWS = 100
+    # Session, user, row estimate (reltuples, EXPLAIN), exact count and the
+    # page; a seventh query loads relation or distinct-value filter choices
+    QUERIES = {
+        'category': 7,
+        'material': 7,
+        'materiallisting': 7,
+        'product': 7,
+        'productimage': 6,
+        'cart': 6,
+        'cartitem': 6,
+        'favorite': 6,
+        'order': 6,
+        'review': 7,
+        'message': 6,
+        'report': 6,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        counts = {kind: cls.ROWS for kind in KINDS}
+        counts['images'] = 1
+        MarketplaceSeeder(counts).run()
+
+        users = list(User.objects.order_by('pk')[:cls.ROWS])
+        products = list(Product.objects.order_by('pk')[:cls.ROWS])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product) for cart, product in zip(carts, products)
+        ])
+        Report.objects.bulk_create([
+            Report(reporter=user, product=product, reason=Report.SPAM, description='Spam')
+            for user, product in zip(users, products)
+        ])
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='Str0ng-pass!')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelists(self):
+        for model_name, queries in self.QUERIES.items():
+            with self.subTest(model_name):
+                url = reverse(f'admin:marketplace_{model_name}_changelist')
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                changelist = response.context['cl']
+                self.assertEqual(
+                    len(changelist.result_list), min(changelist.list_per_page, changelist.result_count)
+                )
+
+
+@override_settings(ADMIN_EXACT_COUNT_THRESHOLD=1)
+class EstimatedCountPaginatorTests(TestCase):
+    """A wrong row estimate never hides or empties the last pages"""
+
+    def setUp(self):
+        seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        category = Category.objects.create(name='Metals')
+        for i in range(5):
+            Product.objects.create(
+                seller=seller, category=category, title=f'Item {i}',
+                description='Scrap', price=Decimal('10.00'), quantity=1, location='Cairo'
+            )
+
+    def paginator(self, estimate):
+        paginator = EstimatedCountPaginator(Product.objects.order_by('pk'), 2)
+        paginator._estimate = lambda: estimate
+        return paginator
+
+    def test_low_estimate_only_sets_the_displayed_total(self):
+        paginator = self.paginator(2)
+        self.assertEqual(paginator.count, 2)
+
+        page = paginator.page(3)
+        self.assertEqual(len(page.object_list), 1)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_high_estimate_is_corrected_on_the_last_page(self):
+        paginator = self.paginator(40)
+        self.assertEqual(len(paginator.page(1).object_list), 2)
+        self.assertEqual(paginator.num_pages, 20)
+
+        with self.assertRaises(EmptyPage):
+            paginator.page(19)
+        self.assertEqual(paginator.num_pages, 3)
+
+
+@override_settings(ADMIN_BULK_ACTION_CHUNK_SIZE=2)
+class BulkActionJobTests(TestCase):
+    """Background admin actions always finish and never lose track of a job"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(email='admin@example.com', password='Str0ng-pass!')
+        category = Category.objects.create(name='Metals')
+        # Chunks of 2 in pk (random) order: 'Broken' always fails a whole chunk
+        for title in ['A', 'B', 'Broken', 'D']:
+            Product.objects.create(
+                seller=self.user, category=category, title=title,
+                description='Scrap', price=Decimal('10.00'), quantity=1, location='Cairo'
+            )
+        self.admin = admin.site._registry[Product]
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request._messages = CookieStorage(request)
+        return request
+
+    def start(self, func, execute=False):
+        with self.captureOnCommitCallbacks(execute=execute) as callbacks:
+            self.admin.run_bulk_action(
+                self.request(), Product.objects.all(), func, 'products marked as sold', status='sold'
+            )
+        return callbacks
+
+    def report(self):
+        request = self.request()
+        self.admin.report_bulk_jobs(request)
+        return [(message.level, message.message) for message in request._messages]
+
+    def test_failed_chunks_finish_the_job(self):
+        # Eager tasks propagate errors, so a raising chunk would stop the rest
+        with self.assertLogs('jaddid.admin', 'ERROR'):
+            self.start(fail_on_broken, execute=True)
+
+        self.assertEqual(self.report(), [(messages.ERROR, '2 of 4 products marked as sold; 2 failed.')])
+        self.assertEqual(Product.objects.filter(status='sold').count(), 2)
+        self.assertEqual(self.report(), [])
+
+    def test_single_chunk_runs_inline(self):
+        request = self.request()
+        self.admin.run_bulk_action(
+            request, Product.objects.filter(title__in=['A', 'B']), set_listing_status,
+            'products marked as sold', status='sold'
+        )
+
+        self.assertEqual([message.message for message in request._messages], ['2 products marked as sold.'])
+        self.assertEqual(Product.objects.filter(status='sold').count(), 2)
+        self.assertEqual(self.report(), [])
+
+    def test_every_started_job_is_reported(self):
+        first = self.start(set_listing_status)
+        self.start(set_listing_status)
+        first[0]()
+
+        self.assertEqual(self.report(), [
+            (messages.INFO, 'In progress: 2 of 4 products marked as sold.'),
+            (messages.INFO, 'In progress: 0 of 4 products marked as sold.'),
+        ])
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_BUDGET_STRICT=True, TOKEN_VERSION_CACHE_TTL=0)
+class QueryBudgetTests(TestCase):
+    """Every budgeted GET endpoint stays within its query_budget with full pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        MarketplaceSeeder({
+            'users': 3, 'categories': 20, 'materials': 10, 'listings': 60, 'products': 60,
+            'images': 1, 'favorites': 60, 'reviews': 60, 'orders': 60, 'messages': 60,
+        }).run()
+        cls.user = User.objects.order_by('email').first()
+        # The seeder bulk-creates rows, so the signals that keep these up to date never ran
+        for seller in User.objects.all():
+            refresh_seller_stats(seller.pk)
+
+        cart = Cart.objects.create(user=cls.user)
+        products = Product.objects.filter(status=Product.ACTIVE)[:10]
+        listings = MaterialListing.objects.filter(status=MaterialListing.ACTIVE)[:10]
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product=product) for product in products]
+            + [CartItem(cart=cart, material_listing=listing) for listing in listings]
+        )
+        Report.objects.bulk_create(
+            [Report(reporter=cls.user, product=product, reason=Report.SPAM, description='Spam')
+             for product in products]
+            + [Report(reporter=cls.user, material_listing=listing, reason=Report.FRAUD, description='Fraud')
+               for listing in listings]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def endpoints(self):
+        user = self.user
+        category = Category.objects.filter(parent__isnull=True).first()
+        material = Material.objects.first()
+        listing = MaterialListing.objects.filter(reviews__isnull=False).first()
+        product = Product.objects.filter(reviews__isnull=False).first()
+        return [
+            ('marketplace:category-list', {}),
+            ('marketplace:category-detail', {'pk': category.pk}),
+            ('marketplace:category-tree', {}),
+            ('marketplace:category-products', {'pk': Product.objects.first().category_id}),
+            ('marketplace:material-list', {}),
+            ('marketplace:material-detail', {'pk': material.pk}),
+            ('marketplace:material-listings', {'pk': material.pk}),
+            ('marketplace:material-listing-list', {}),
+            ('marketplace:material-listing-detail', {'pk': listing.pk}),
+            ('marketplace:material-listing-my-listings', {}),
+            ('marketplace:material-listing-reviews', {'pk': listing.pk}),
+            ('marketplace:product-list', {}),
+            ('marketplace:product-detail', {'pk': product.pk}),
+            ('marketplace:product-my-products', {}),
+            ('marketplace:product-reviews', {'pk': product.pk}),
+            ('marketplace:cart-list', {}),
+            ('marketplace:favorite-list', {}),
+            ('marketplace:favorite-detail', {'pk': Favorite.objects.filter(user=user).first().pk}),
+            ('marketplace:order-list', {}),
+            ('marketplace:order-detail', {'pk': Order.objects.filter(buyer=user).first().pk}),
+            ('marketplace:order-purchases', {}),
+            ('marketplace:order-sales', {}),
+            ('marketplace:review-list', {}),
+            ('marketplace:review-detail', {'pk': Review.objects.first().pk}),
+            ('marketplace:review-my-reviews', {}),
+            ('marketplace:message-list', {}),
+            ('marketplace:message-detail', {'pk': Message.objects.filter(sender=user).first().pk}),
+            ('marketplace:message-inbox', {}),
+            ('marketplace:message-sent', {}),
+            ('marketplace:message-unread-count', {}),
+            ('marketplace:message-poll', {}),
+            ('marketplace:report-list', {}),
+            ('marketplace:report-detail', {'pk': Report.objects.first().pk}),
+            ('marketplace:report-my-reports', {}),
+            ('marketplace:seller-detail', {'pk': Product.objects.first().seller_id}),
+            ('user-detail', {}),
+            ('user-list', {}),
+            ('user-by-id', {'user_id': user.pk}),
+            ('profile-detail', {}),
+        ]
+
+    def test_budgeted_endpoints(self):
+        # QueryBudgetExceeded is raised by the middleware in strict mode
+        with self.assertLogs('jaddid.queries', 'INFO'):
+            for name, kwargs in self.endpoints():
+                with self.subTest(name):
+                    response = self.client.get(reverse(name, kwargs=kwargs))
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIn('queries', response['Server-Timing'])
+
+
+class MetricsRegistryTests(TestCase):
+    """Each process registers in its own slot, so none can overwrite another"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(setattr, metrics, '_slot', metrics._slot)
+
+    def register_as(self, process):
+        metrics._slot = None
+        metrics.register(process, 60)
+
+    def test_processes_claim_separate_slots(self):
+        for process in ('web-1:10', 'web-1:11', 'worker-1:12'):
+            self.register_as(process)
+        metrics.register('worker-1:12', 60)
+
+        self.assertEqual(sorted(metrics.live_processes()), ['web-1:10', 'web-1:11', 'worker-1:12'])
+
+    def test_expired_slot_is_claimed_again(self):
+        self.register_as('web-1:10')
+        cache.delete(metrics.PROCESS_SLOT_KEY.format(slot=metrics._slot))
+        metrics.register('web-1:10', 60)
+
+        self.assertEqual(metrics.live_processes(), ['web-1:10'])
+
+
+class KeysetExportTests(TestCase):
+    """Keyset batches page by a unique ordering and refuse ones they can't page by"""
+
+    @classmethod
+    def setUpTestData(cls):
+        MarketplaceSeeder({'users': 2, 'categories': 3, 'products': 25}).run(['users', 'categories', 'products'])
+        # Ties on the ordering field must not drop or repeat rows between batches
+        Product.objects.update(price=Decimal('10.00'))
+
+    def test_ties_are_broken_by_pk(self):
+        queryset = Product.objects.order_by('-price')
+        rows = list(iter_keyset(queryset, ['id'], chunk_size=4))
+
+        self.assertEqual(len(rows), 25)
+        self.assertEqual({row[0] for row in rows}, set(Product.objects.values_list('id', flat=True)))
+
+    def test_non_field_orderings_are_rejected(self):
+        for queryset in (Product.objects.order_by('?'), Product.objects.order_by(Lower('title'))):
+            with self.assertRaises(ValueError):
+                iter_keyset(queryset, ['id'], chunk_size=4)
+
+
+class ExportTests(TestCase):
+    """Exports stream the caller's rows and never emit spreadsheet formulas"""
+
+    def setUp(self):
+        self.seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        other = User.objects.create_user(email='other@example.com', password='Str0ng-pass!')
+        category = Category.objects.create(name='Metals')
+        for seller, title in ((self.seller, '=HYPERLINK("http://evil.example")'), (self.seller, 'Copper'), (other, 'Tin')):
+            Product.objects.create(
+                seller=seller, category=category, title=title, description='Scrap',
+                price=Decimal('10.00'), quantity=3, location='@Cairo'
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def export(self, fmt):
+        response = self.client.get(reverse('marketplace:product-export'), {'format': fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'.{fmt}"', response['Content-Disposition'])
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_escapes_formulas(self):
+        rows = list(csv.DictReader(self.export('csv').splitlines()))
+
+        self.assertEqual(
+            sorted(row['title'] for row in rows),
+            ["'=HYPERLINK(\"http://evil.example\")", 'Copper']
+        )
+        self.assertEqual({row['location'] for row in rows}, {"'@Cairo"})
+
+    def test_jsonl_export_keeps_values_as_is(self):
+        rows = [json.loads(line) for line in self.export('jsonl').splitlines()]
+
+        self.assertEqual(sorted(row['title'] for row in rows), ['=HYPERLINK("http://evil.example")', 'Copper'])
+
+    def test_only_text_cells_are_escaped(self):
+        lines = list(iter_csv([('a', 'a'), ('b', 'b'), ('c', 'c')], [(Decimal('-5'), '-5', '+20 1000')]))
+
+        self.assertEqual(lines[1], "-5,'-5,'+20 1000\r\n")
+
+    def test_keyset_fallback_reads_the_same_rows(self):
+        columns = [('id', 'id'), ('title', 'title')]
+        queryset = Product.objects.order_by('title')
+        with mock.patch('jaddid.exports.server_side_cursors', return_value=False):
+            batched_rows = list(iter_values(queryset, columns, chunk_size=2))
+
+        self.assertEqual(batched_rows, list(iter_values(queryset, columns)))
+
+    def test_export_command_writes_every_row(self):
+        output = os.path.join(tempfile.mkdtemp(), 'products.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        stderr = StringIO()
+        call_command('export_data', 'products', format='jsonl', output=output, stderr=stderr)
+
+        self.assertIn('Exported 3 products', stderr.getvalue())
+        with open(output, encoding='utf-8') as exported:
+            self.assertEqual(len(exported.readlines()), 3)
+
+
+@override_settings(NOTIFICATIONS_POLL_INTERVAL=0.01)
+class NotificationTests(TestCase):
+    """Message writes bump a shared version that long-polls and streams wait on"""
+
+    def setUp(self):
+        cache.clear()
+        shared_cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='Str0ng-pass!')
+        self.seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def poll(self, **query):
+        return self.client.get(reverse('marketplace:message-poll'), query)
+
+    def send_message(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.seller, recipient=self.user, message='Still available?')
+
+    def test_message_bumps_the_shared_version(self):
+        version = self.poll().data['version']
+        self.send_message()
+
+        self.assertEqual(shared_cache.get(VERSION_KEY.format(user_id=self.user.pk)), version + 1)
+        response = self.poll(since=version, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], version + 1)
+        self.assertEqual(response.data['unread_count'], 1)
+
+    def test_poll_without_changes_times_out_with_304(self):
+        version = self.poll().data['version']
+
+        response = self.poll(since=version, timeout=0)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(NOTIFICATIONS_SYNC_STREAM_DURATION=0.2, NOTIFICATIONS_LONGPOLL_TIMEOUT=0.1)
+    def test_sync_stream_sends_changes_then_closes(self):
+        version = self.poll().data['version']
+        self.send_message()
+
+        response = self.client.get(reverse('marketplace:message-stream'), HTTP_LAST_EVENT_ID=str(version))
+        frames = list(response.streaming_content)
+
+        self.assertTrue(frames[0].startswith(f'id: {version + 1}\nevent: notifications\n'.encode()))
+        self.assertEqual(frames[-1], b': keep-alive\n\n')
+
+
+class AsyncViewTests(TestCase):
+    """The native async messaging views answer like the DRF actions they shadow"""
+
+    def setUp(self):
+        cache.clear()
+        shared_cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='Str0ng-pass!')
+        self.seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.seller, recipient=self.user, message='Still available?')
+
+    async def get(self, name, authenticated=True, **query):
+        headers = {'Authorization': f'Bearer {self.token}'} if authenticated else {}
+        with override_settings(ROOT_URLCONF=__name__):
+            return await AsyncClient().get(reverse(name), query, headers=headers)
+
+    async def test_inbox_matches_the_drf_action(self):
+        response = await self.get('message-inbox-async')
+        self.assertEqual(response.status_code, 200)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = await sync_to_async(client.get)(reverse('marketplace:message-inbox'))
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()['count'], 1)
+
+    async def test_unread_count(self):
+        response = await self.get('message-unread-count-async')
+        self.assertEqual(response.json(), {'unread_count': 1})
+
+    async def test_poll_without_changes_times_out_with_304(self):
+        version = (await self.get('message-poll-async')).json()['version']
+
+        response = await self.get('message-poll-async', since=version, timeout=0)
+        self.assertEqual(response.status_code, 304)
+
+    async def test_anonymous_requests_are_rejected(self):
+        response = await self.get('message-inbox-async', authenticated=False)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    async def test_query_instrumentation_stays_async_and_counts_queries(self):
+        async def view(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(QueryInstrumentationMiddleware(view)))
+
+        response = await self.get('message-inbox-async')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[0-9.]+;desc="[1-9][0-9]* queries"')
+
+
+class CounterTests(TestCase):
+    """Counter deltas apply once, whether queued one by one or buffered and flushed"""
+
+    def setUp(self):
+        cache.clear()
+        shared_cache.clear()
+        seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.product = Product.objects.create(
+            seller=seller, category=Category.objects.create(name='Metals'), title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo',
+            status=Product.ACTIVE, views_count=1
+        )
+
+    def views_count(self):
+        self.product.refresh_from_db(fields=['views_count'])
+        return self.product.views_count
+
+    def bump(self, delta=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_counter(self.product, 'views_count', delta)
+
+    def flush(self):
+        return flush_counters(now=time.time() + 3 * settings.COUNTER_FLUSH_INTERVAL)
+
+    def test_redelivered_increment_applies_once(self):
+        token = uuid.uuid4().hex
+        for _ in range(2):
+            increment_counter('marketplace.Product', str(self.product.pk), 'views_count', 1, token)
+
+        self.assertEqual(self.views_count(), 2)
+
+    def test_failed_increment_releases_its_token(self):
+        token = uuid.uuid4().hex
+        with self.assertRaises(LookupError):
+            increment_counter('marketplace.Missing', str(self.product.pk), 'views_count', 1, token)
+
+        self.assertIsNone(cache.get(TOKEN_KEY.format(token=token)))
+
+    @override_settings(COUNTER_BUFFERING=False)
+    def test_unbuffered_bump_applies_on_commit(self):
+        self.bump()
+
+        self.assertEqual(self.views_count(), 2)
+
+    @override_settings(COUNTER_BUFFERING=True)
+    def test_buffered_bumps_wait_for_the_flush(self):
+        for _ in range(3):
+            self.bump()
+        self.assertEqual(self.views_count(), 1)
+
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(self.views_count(), 4)
+
+        # The flushed windows are not applied again
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.views_count(), 4)
+
+    @override_settings(COUNTER_BUFFERING=True)
+    def test_buffered_negative_delta_floors_at_zero(self):
+        self.bump(-5)
+        self.flush()
+
+        self.assertEqual(self.views_count(), 0)
+
+
+class ImageVariantTests(TestCase):
+    """Responsive sizes are generated after commit; URLs fall back to the original until then"""
+
+    def setUp(self):
+        use_temporary_media_root(self)
+        seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.product = Product.objects.create(
+            seller=seller, category=Category.objects.create(name='Metals'), title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo',
+            status=Product.ACTIVE
+        )
+
+    def create_image(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=upload)
+        image.refresh_from_db()
+        return image
+
+    def test_variants_are_generated_for_every_size_and_format(self):
+        image = self.create_image(image_upload(size=(2000, 1000)))
+
+        self.assertEqual(image.variants['source'], image.image.name)
+        for size_name, max_side in settings.IMAGE_VARIANT_SIZES.items():
+            entry = image.variants[size_name]
+            self.assertEqual(entry['width'], min(max_side, 2000))
+            self.assertEqual(entry['height'], min(max_side, 2000) // 2)
+            for fmt in ('webp', 'jpeg'):
+                self.assertTrue(default_storage.exists(entry[fmt]))
+                with default_storage.open(entry[fmt]) as variant:
+                    self.assertEqual(Image.open(variant).format, fmt.upper())
+
+    def test_transparent_image_gets_a_white_jpeg_background(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (40, 40), (0, 0, 0, 0)).save(buffer, 'PNG')
+        image = self.create_image(SimpleUploadedFile('clear.png', buffer.getvalue()))
+
+        with default_storage.open(image.variants['thumbnail']['jpeg']) as variant:
+            self.assertEqual(Image.open(variant).convert('RGB').getpixel((0, 0)), (255, 255, 255))
+
+    def test_undecodable_image_is_marked_failed_and_falls_back(self):
+        with self.assertLogs('jaddid.images', 'WARNING'):
+            image = self.create_image(SimpleUploadedFile('broken.png', b'not an image'))
+
+        self.assertEqual(image.variants, {'source': image.image.name, 'failed': True})
+        self.assertEqual(variant_url(image.image, image.variants, 'medium'), image.image.url)
+
+    def test_urls_fall_back_to_the_original_until_generated(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            image = ProductImage.objects.create(product=self.product, image=image_upload())
+
+        urls = variant_urls(image.image, image.variants)
+        self.assertEqual(set(urls), set(settings.IMAGE_VARIANT_SIZES))
+        self.assertEqual(urls['thumbnail'], {'webp': image.image.url, 'jpeg': image.image.url})
+
+        request = RequestFactory().get('/')
+        self.assertEqual(
+            variant_url(image.image, image.variants, 'large', 'webp', request),
+            f'http://testserver{image.image.url}'
+        )
+        self.assertIsNone(variant_url(ProductImage().image, {}, 'large'))
+
+    def test_generated_variant_url_points_at_the_variant(self):
+        image = self.create_image(image_upload())
+
+        self.assertEqual(
+            variant_url(image.image, image.variants, 'thumbnail', 'webp'),
+            default_storage.url(image.variants['thumbnail']['webp'])
+        )
+
+
+class ImageUploadTests(TestCase):
+    """Uploads are bounded, stored without metadata and deduplicated by stored bytes"""
+
+    def setUp(self):
+        use_temporary_media_root(self)
+        self.seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.category = Category.objects.create(name='Metals')
+        self.product = self.create_product()
+
+    def create_product(self):
+        return Product.objects.create(
+            seller=self.seller, category=self.category, title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo',
+            status=Product.ACTIVE
+        )
+
+    def save(self, *uploads, product=None):
+        return save_images(ProductImage, 'product', product or self.product, list(uploads))
+
+    def stored(self, row):
+        with default_storage.open(row.image.name) as stored:
+            data = stored.read()
+        self.assertEqual(row.content_hash, hashlib.sha256(data).hexdigest())
+        return data, Image.open(BytesIO(data))
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=100)
+    def test_oversized_file_is_rejected(self):
+        with self.assertRaisesMessage(serializers.ValidationError, 'cannot exceed'):
+            BoundedImageField().run_validation(image_upload())
+
+    @override_settings(MAX_IMAGE_PIXELS=100)
+    def test_pixel_bomb_is_rejected_from_the_header(self):
+        with self.assertRaisesMessage(serializers.ValidationError, 'Image dimensions'):
+            BoundedImageField().run_validation(image_upload(size=(20, 20)))
+
+    def test_non_image_is_rejected(self):
+        with self.assertRaisesMessage(serializers.ValidationError, 'Upload a valid image'):
+            BoundedImageField().run_validation(SimpleUploadedFile('notes.png', b'plain text'))
+
+    def test_jpeg_exif_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Secret Camera'
+        row, = self.save(image_upload('photo.jpg', image_format='JPEG', exif=exif))
+
+        data, image = self.stored(row)
+        self.assertNotIn('exif', image.info)
+        self.assertNotIn(b'Secret Camera', data)
+
+    def test_png_text_chunks_are_stripped(self):
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Author', 'Sara Ali')
+        row, = self.save(image_upload(pnginfo=text))
+
+        data, image = self.stored(row)
+        self.assertEqual(image.text, {})
+        self.assertNotIn(b'Sara Ali', data)
+
+    def test_gif_comment_is_stripped_and_frames_kept(self):
+        frames = [Image.new('RGB', (10, 10), (80 * i, 0, 0)) for i in range(3)]
+        buffer = BytesIO()
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], comment=b'Sara Ali')
+        row, = self.save(SimpleUploadedFile('anim.gif', buffer.getvalue()))
+
+        data, image = self.stored(row)
+        self.assertNotIn('comment', image.info)
+        self.assertNotIn(b'Sara Ali', data)
+        self.assertEqual(image.n_frames, 3)
+
+    def test_clean_upload_is_stored_as_is(self):
+        upload = image_upload()
+        row, = self.save(upload)
+
+        data, _ = self.stored(row)
+        upload.seek(0)
+        self.assertEqual(data, upload.read())
+
+    def test_same_bytes_share_one_file(self):
+        other = self.create_product()
+        first, = self.save(image_upload('a.png'))
+        second, = self.save(image_upload('b.png'), product=other)
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.content_hash, second.content_hash)
+
+    def test_uploads_differing_only_in_metadata_are_deduplicated(self):
+        uploads = []
+        for author in ('Sara Ali', 'Omar Ali'):
+            text = PngImagePlugin.PngInfo()
+            text.add_text('Author', author)
+            uploads.append(image_upload(pnginfo=text))
+        rows = self.save(*uploads)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(self.save(uploads[1]), [])
+        self.assertEqual(self.product.images.count(), 1)
+
+    @override_settings(MAX_UPLOAD_IMAGES=2)
+    def test_image_limit_counts_existing_images(self):
+        self.save(image_upload(size=(10, 10)), image_upload(size=(20, 20)))
+        client = APIClient()
+        client.force_authenticate(self.seller)
+
+        response = client.patch(
+            reverse('marketplace:product-detail', kwargs={'pk': self.product.pk}),
+            {'uploaded_images': [image_upload(size=(30, 30))]},
+            format='multipart'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('uploaded_images', response.data)
+        self.assertEqual(self.product.images.count(), 2)
+
+
+class MediaStorageTests(TestCase):
+    """Content-addressed files are shared, served with immutable headers and swept when unreferenced"""
+
+    def setUp(self):
+        use_temporary_media_root(self)
+        self.client = APIClient()
+
+    def store(self, data=b'scrap copper', name='notes.txt', age=None):
+        name = default_storage.save(name, ContentFile(data))
+        if age is not None:
+            past = time.time() - age.total_seconds()
+            os.utime(default_storage.path(name), (past, past))
+        return name
+
+    def get(self, name, **headers):
+        return self.client.get(reverse('media', kwargs={'path': name}), **headers)
+
+    def test_equal_bytes_get_one_name(self):
+        name = self.store(name='a.txt')
+
+        self.assertEqual(hashed_digest(name), hashlib.sha256(b'scrap copper').hexdigest())
+        self.assertEqual(self.store(name='b.txt'), name)
+        self.assertEqual(default_storage.listdir(os.path.dirname(name))[1], [os.path.basename(name)])
+
+    def test_reused_file_is_touched(self):
+        name = self.store(age=timedelta(days=2))
+        self.store()
+
+        self.assertEqual(sweep_unreferenced(default_storage), [])
+        self.assertTrue(default_storage.exists(name))
+
+    def test_delete_keeps_shared_files(self):
+        name = self.store()
+        default_storage.delete(name)
+
+        self.assertTrue(default_storage.exists(name))
+
+    def test_sweep_removes_only_old_unreferenced_files(self):
+        seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        product = Product.objects.create(
+            seller=seller, category=Category.objects.create(name='Metals'), title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo'
+        )
+        old = timedelta(days=2)
+        image = self.store(b'image', 'photo.png', age=old)
+        variant = self.store(b'variant', 'photo.webp', age=old)
+        ProductImage.objects.create(product=product, image=image, variants={'thumbnail': {'webp': variant}})
+        orphan = self.store(b'orphan', age=old)
+        fresh = self.store(b'fresh')
+        legacy = default_storage.path('products/legacy.png')
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, 'wb') as file:
+            file.write(b'legacy')
+        os.utime(legacy, (0, 0))
+
+        self.assertEqual(sweep_unreferenced(default_storage, dry_run=True), [orphan])
+        self.assertTrue(default_storage.exists(orphan))
+
+        stdout = StringIO()
+        call_command('sweep_media', stdout=stdout, stderr=StringIO())
+        self.assertEqual(stdout.getvalue().split(), [orphan])
+        self.assertFalse(default_storage.exists(orphan))
+        for name in (image, variant, fresh, 'products/legacy.png'):
+            self.assertTrue(default_storage.exists(name))
+
+    @override_settings(DEBUG=True)
+    def test_hashed_file_is_served_with_immutable_headers(self):
+        name = self.store()
+
+        response = self.get(name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'scrap copper')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], f'"{hashed_digest(name)}"')
+
+        response = self.get(name, HTTP_IF_NONE_MATCH=f'"{hashed_digest(name)}"')
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(DEBUG=True)
+    def test_missing_and_escaping_paths_are_not_found(self):
+        self.assertEqual(self.get('00/00/missing.txt').status_code, 404)
+        self.assertEqual(self.get('../manage.py').status_code, 404)
+
+    def test_media_is_not_served_in_production_without_accel_redirect(self):
+        self.assertEqual(self.get(self.store()).status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_production_hands_the_file_to_nginx(self):
+        name = self.store()
+
+        response = self.get(name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class ListingImportTests(TestCase):
+    """Bulk imports create or update every valid row and report the others by line"""
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        category = Category.objects.create(name='Metals')
+        self.copper = Material.objects.create(name='Copper', category=category, default_unit='ton')
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def row(self, **fields):
+        return {
+            'material': 'copper', 'title': 'Copper scrap', 'description': 'Clean wire',
+            'quantity': '2.5', 'unit': 'kg', 'price_per_unit': '100.00', 'location': 'Cairo',
+            **fields
+        }
+
+    def post(self, data, **kwargs):
+        return self.client.post(reverse('marketplace:material-listing-bulk'), data, **kwargs)
+
+    def test_valid_rows_are_created(self):
+        response = self.post([
+            self.row(external_id='a-1', unit=''),
+            self.row(external_id='a-2', material=str(self.copper.pk), status=MaterialListing.ACTIVE),
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 0))
+        first = MaterialListing.objects.get(external_id='a-1')
+        self.assertEqual((first.seller, first.material, first.unit), (self.seller, self.copper, 'ton'))
+        self.assertIsNone(first.published_at)
+        self.assertIsNotNone(MaterialListing.objects.get(external_id='a-2').published_at)
+
+    def test_row_errors_are_reported_by_line(self):
+        response = self.post([
+            self.row(material='unobtainium'),
+            self.row(title=''),
+            'not an object',
+            self.row(external_id='dup'),
+            self.row(external_id='dup'),
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['line'] for result in results], [1, 2, 3, 4, 5])
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['error', 'error', 'error', 'created', 'error']
+        )
+        self.assertIn('material', results[0]['errors'])
+        self.assertIn('title', results[1]['errors'])
+        self.assertIn('row', results[2]['errors'])
+        self.assertIn('external_id', results[4]['errors'])
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 4))
+
+    def test_import_without_valid_rows_fails_and_writes_nothing(self):
+        response = self.post([self.row(quantity='lots')], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertFalse(MaterialListing.objects.exists())
+
+    def test_rows_with_a_known_external_id_update_it(self):
+        self.post([self.row(external_id='a-1')], format='json')
+
+        response = self.post([
+            {'external_id': 'a-1', 'price_per_unit': '120.00'},
+            self.row(external_id='a-2'),
+        ], format='json')
+
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        listing = MaterialListing.objects.get(external_id='a-1')
+        self.assertEqual(listing.price_per_unit, Decimal('120.00'))
+        self.assertEqual(listing.title, 'Copper scrap')
+        self.assertEqual(MaterialListing.objects.count(), 2)
+
+    def test_csv_file_is_imported(self):
+        content = (
+            'material,title,description,quantity,unit,price_per_unit,location,external_id\n'
+            'Copper,Copper scrap,Clean wire,2.5,kg,100.00,Cairo,c-1\n'
+            'Copper,Copper scrap,Clean wire,-1,kg,100.00,Cairo,c-2\n'
+        )
+        upload = SimpleUploadedFile('listings.csv', content.encode(), content_type='text/csv')
+        response = self.post({'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error'])
+        self.assertEqual(response.data['results'][1]['line'], 3)
+
+    @override_settings(LISTING_IMPORT_MAX_ROWS=2)
+    def test_oversized_import_is_rejected(self):
+        response = self.post([self.row() for _ in range(3)], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MaterialListing.objects.exists())
+
+
+class SeedingTests(TestCase):
+    """The seeder and the benchmark runner, at a scale small enough for the suite"""
+
+    def seed(self, **options):
+        call_command(
+            'seed_marketplace', users=5, batch_size=3, **options,
+            stdout=StringIO(), stderr=StringIO()
+        )
+
+    def row_counts(self):
+        return {
+            model.__name__: model.objects.count()
+            for model in (User, MaterialListing, Product, ProductImage, Order, Message)
+        }
+
+    def test_seed_command_is_reproducible(self):
+        use_temporary_media_root(self)
+
+        self.seed()
+        counts = self.row_counts()
+        self.assertEqual(counts, {
+            'User': 5, 'MaterialListing': 10, 'Product': 10,
+            'ProductImage': 10, 'Order': 10, 'Message': 25,
+        })
+
+        # Same seed, same primary keys: a re-run inserts nothing
+        self.seed()
+        self.assertEqual(self.row_counts(), counts)
+
+    def test_run_benchmarks_reports_seeded_scenarios(self):
+        use_temporary_media_root(self)
+        self.seed()
+
+        stdout = StringIO()
+        call_command(
+            'run_benchmarks', 'listing-list', 'listing-detail', 'order-list',
+            iterations=2, warmup=0, stdout=stdout
+        )
+
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report['rows']['listings'], 10)
+        self.assertEqual(set(report['results']), {'listing-list', 'listing-detail', 'order-list'})
+        for result in report['results'].values():
+            self.assertNotIn('error', result)
+            self.assertGreater(result['queries'], 0)
+
+    def test_run_benchmarks_needs_seeded_data(self):
+        with self.assertRaisesMessage(CommandError, 'seed_marketplace'):
+            call_command('run_benchmarks', iterations=1, stdout=StringIO())
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Catalog reads go to a replica, except for users who just wrote.
+
+    A TransactionTestCase, because reads inside a transaction always stay on
+    the primary and TestCase wraps every test in one.
+    """
+    REPLICAS = ('replica_a', 'replica_b')
+
+    def setUp(self):
+        cache.clear()
+        mirror_replicas(self, *self.REPLICAS)
+        self.reads = record_read_aliases(self)
+
+        self.user = User.objects.create_user(email='buyer@example.com', password='Str0ng-pass!')
+        seller = User.objects.create_user(email='seller@example.com', password='Str0ng-pass!')
+        self.product = Product.objects.create(
+            seller=seller, category=Category.objects.create(name='Metals'), title='Copper wire',
+            description='Scrap copper', price=Decimal('100.00'), quantity=3, location='Cairo',
+            status=Product.ACTIVE
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def favorite(self):
+        return self.client.post(
+            reverse('marketplace:favorite-list'), {'product_id': str(self.product.pk)}, format='json'
+        )
+
+    def list_products(self):
+        del self.reads[:]
+        response = self.client.get(reverse('marketplace:product-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        return set(self.reads)
+
+    def test_router_uses_the_request_replica_outside_transactions(self):
+        def route():
+            self.assertEqual(Product.objects.all().db, DEFAULT_DB_ALIAS)
+            use_replica(AnonymousUser())
+            self.assertIn(Product.objects.all().db, self.REPLICAS)
+            with transaction.atomic():
+                self.assertEqual(Product.objects.all().db, DEFAULT_DB_ALIAS)
+            self.assertEqual(ReplicaRouter().db_for_write(Product), DEFAULT_DB_ALIAS)
+
+        copy_context().run(route)
+
+    def test_catalog_reads_use_a_replica(self):
+        reads = self.list_products()
+        self.assertTrue(reads)
+        self.assertLessEqual(reads, set(self.REPLICAS))
+
+    def test_writer_reads_from_primary_until_the_pin_expires(self):
+        self.assertEqual(self.favorite().status_code, 201)
+        self.assertTrue(cache.get(PIN_KEY.format(user_id=self.user.pk)))
+
+        self.assertEqual(self.list_products(), {DEFAULT_DB_ALIAS})
+
+        expired = time.time() + settings.REPLICA_PIN_SECONDS + 1
+        with mock.patch('time.time', return_value=expired):
+            reads = self.list_products()
+        self.assertLessEqual(reads, set(self.REPLICAS))
+
+    def test_failed_write_does_not_pin(self):
+        Favorite.objects.create(user=self.user, product=self.product)
+        self.assertEqual(self.favorite().status_code, 400)
+        self.assertLessEqual(self.list_products(), set(self.REPLICAS))
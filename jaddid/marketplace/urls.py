@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CategoryViewSet, MaterialViewSet, MaterialListingViewSet,
     ProductViewSet, CartViewSet, FavoriteViewSet,
-    OrderViewSet, ReviewViewSet, MessageViewSet, ReportViewSet
+    OrderViewSet, ReviewViewSet, MessageViewSet, ReportViewSet,
+    SellerViewSet
 )
+from . import async_views
 
 app_name = 'marketplace'
 
@@ -20,7 +23,19 @@ router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'reviews', ReviewViewSet, basename='review')
 router.register(r'messages', MessageViewSet, basename='message')
 router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'sellers', SellerViewSet, basename='seller')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_VIEWS:
+    # Native async versions, listed first so they shadow the DRF actions
+    urlpatterns += [
+        path('messages/poll/', async_views.poll, name='message-poll-async'),
+        path('messages/stream/', async_views.stream, name='message-stream-async'),
+        path('messages/unread_count/', async_views.unread_count, name='message-unread-count-async'),
+        path('messages/inbox/', async_views.inbox, name='message-inbox-async'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
@@ -1,3 +1,8 @@
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Avg, Count
 from django.utils import timezone
@@ -5,6 +10,8 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import (
@@ -22,9 +29,45 @@ from .serializers import (
     OrderSerializer, ReviewSerializer, MessageSerializer, ReportSerializer
 )
 from .permissions import IsSellerOrReadOnly, IsOwnerOrReadOnly
+from .renderers import EventStreamRenderer
+from .counters import bump_counter
+from .notifications import (
+    get_snapshot, parse_version, wait_for_change, event_stream
+)
+from .stats import get_seller_profile
+from .exports import (
+    MATERIAL_LISTING_COLUMNS, ORDER_COLUMNS, PRODUCT_COLUMNS
+)
+from jaddid.exports import EXPORT_RENDERERS, export_format, export_response
+from jaddid.bulk import FORMATS, RowError, detect_format, iter_rows, text_stream
+from jaddid.routing import ReplicaReadMixin
+from .importer import import_listings
+from .inventory import apply_inventory_changes
+from . import queries
+
 
+def inventory_update(request, model):
+    """Shared body of the products/listings `inventory` actions"""
+    changes = request.data
+    if isinstance(changes, dict):
+        changes = changes.get('changes')
+    if not isinstance(changes, list) or not changes:
+        return Response(
+            {'error': 'Send a non-empty list of changes'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    max_items = settings.INVENTORY_UPDATE_MAX_ITEMS
+    if len(changes) > max_items:
+        return Response(
+            {'error': f'At most {max_items} changes per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(apply_inventory_changes(model, request.user.pk, changes))
+
+
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Category CRUD operations
     - List all categories
@@ -34,19 +77,29 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    query_budget = {'list': 4, 'retrieve': 2, 'tree': 2, 'products': 3, 'default': 6}
+    replica_actions = ('list', 'retrieve', 'products', 'tree')
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'name_ar', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
     
+    def get_queryset(self):
+        return queries.with_product_counts(super().get_queryset())
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve', 'tree'):
+            context['category_children'] = queries.category_children()
+        return context
+    
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
         """Get all products in a category"""
         category = self.get_object()
-        products = Product.objects.filter(
-            category=category,
-            status='active'
-        ).select_related('seller', 'category')
+        products = queries.for_list(
+            Product.objects.filter(category=category, status='active'), request.user
+        )
         
         serializer = ProductListSerializer(
             products,
@@ -58,12 +111,12 @@ class CategoryViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def tree(self, request):
         """Get category tree structure"""
-        root_categories = self.queryset.filter(parent__isnull=True)
+        root_categories = self.get_queryset().filter(parent__isnull=True)
         serializer = self.get_serializer(root_categories, many=True)
         return Response(serializer.data)
 
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Material (Master Data) CRUD operations
     - List all materials
@@ -73,20 +126,24 @@ class MaterialViewSet(viewsets.ModelViewSet):
     queryset = Material.objects.filter(is_active=True).select_related('category')
     serializer_class = MaterialSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    query_budget = {'list': 2, 'retrieve': 1, 'listings': 3, 'default': 6}
+    replica_actions = ('list', 'retrieve', 'listings')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'is_active']
     search_fields = ['name', 'name_ar', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
     
+    def get_queryset(self):
+        return queries.with_listing_counts(super().get_queryset())
+    
     @action(detail=True, methods=['get'])
     def listings(self, request, pk=None):
         """Get all active listings for this material"""
         material = self.get_object()
-        listings = MaterialListing.objects.filter(
-            material=material,
-            status='active'
-        ).select_related('seller', 'material')
+        listings = queries.for_list(
+            MaterialListing.objects.filter(material=material, status='active'), request.user
+        )
         
         serializer = MaterialListingListSerializer(
             listings,
@@ -96,7 +153,7 @@ class MaterialViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class MaterialListingViewSet(viewsets.ModelViewSet):
+class MaterialListingViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Material Listing CRUD operations
     - List all material listings (public)
@@ -106,8 +163,10 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
     """
     queryset = MaterialListing.objects.all().select_related(
         'seller', 'material', 'material__category'
-    ).prefetch_related('images', 'reviews')
+    )
     permission_classes = [IsAuthenticatedOrReadOnly, IsSellerOrReadOnly]
+    query_budget = {'list': 3, 'retrieve': 3, 'my_listings': 3, 'reviews': 2, 'default': 12}
+    replica_actions = ('list', 'retrieve', 'reviews')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['material', 'condition', 'status', 'seller']
     search_fields = ['title', 'title_ar', 'description', 'location', 'material__name']
@@ -123,6 +182,10 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queries.for_list(queryset, self.request.user)
+        elif self.action == 'retrieve':
+            queryset = queries.for_detail(queryset, self.request.user)
         
         # Filter by status for non-owners
         if self.action == 'list':
@@ -131,7 +194,7 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
             else:
                 # Show user's own listings regardless of status
                 queryset = queryset.filter(
-                    Q(status='active') | Q(seller=self.request.user)
+                    Q(status='active') | Q(seller_id=self.request.user.pk)
                 )
         
         # Filter by price range
@@ -155,15 +218,15 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Increment view count when retrieving a listing"""
         instance = self.get_object()
+        bump_counter(instance, 'views_count')
         instance.views_count += 1
-        instance.save(update_fields=['views_count'])
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_listings(self, request):
         """Get current user's material listings"""
-        listings = self.queryset.filter(seller=request.user)
+        listings = queries.for_list(self.queryset.filter(seller_id=request.user.pk), request.user)
         page = self.paginate_queryset(listings)
         if page is not None:
             serializer = MaterialListingListSerializer(page, many=True, context={'request': request})
@@ -171,28 +234,106 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
         serializer = MaterialListingListSerializer(listings, many=True, context={'request': request})
         return Response(serializer.data)
     
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[IsAuthenticated],
+        parser_classes=[JSONParser, MultiPartParser, FormParser]
+    )
+    def bulk(self, request):
+        """
+        Create or update many listings at once.
+        Accepts a JSON list (or {"listings": [...]}) or a CSV/JSONL `file`.
+        Rows with an existing `external_id` update that listing.
+        """
+        max_rows = settings.LISTING_IMPORT_MAX_ROWS
+        upload = request.FILES.get('file')
+        if upload is not None:
+            fmt = request.data.get('format') or detect_format(upload.name)
+            if fmt not in FORMATS:
+                return Response(
+                    {'error': f"format must be one of: {', '.join(FORMATS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = []
+            for row in iter_rows(text_stream(upload), fmt):
+                rows.append(row)
+                if len(rows) > max_rows:
+                    break
+        else:
+            data = request.data
+            if isinstance(data, dict):
+                data = data.get('listings')
+            if not isinstance(data, list):
+                return Response(
+                    {'error': 'Send a list of listings or a CSV/JSONL file'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = [
+                (number, row if isinstance(row, dict) else RowError('Each item must be an object'))
+                for number, row in enumerate(data, start=1)
+            ]
+
+        if not rows:
+            return Response({'error': 'No listings provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > max_rows:
+            return Response(
+                {'error': f'At most {max_rows} listings per import'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = import_listings(request.user.pk, rows)
+        except IntegrityError:
+            return Response(
+                {'error': 'Listings changed during the import, please retry'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        response_status = status.HTTP_200_OK if result['created'] or result['updated'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)
+    
+    @action(detail=False, methods=['patch'], permission_classes=[IsAuthenticated])
+    def inventory(self, request):
+        """Batch update price/quantity/status of the user's listings"""
+        return inventory_update(request, MaterialListing)
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=EXPORT_RENDERERS
+    )
+    def export(self, request):
+        """Stream the current user's listings (all listings for staff) as CSV or JSON Lines"""
+        listings = MaterialListing.objects.all()
+        if not request.user.is_staff:
+            listings = listings.filter(seller_id=request.user.pk)
+        listings = self.filter_queryset(listings)
+        return export_response(
+            listings, MATERIAL_LISTING_COLUMNS, export_format(request), 'material-listings'
+        )
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def toggle_favorite(self, request, pk=None):
         """Add or remove listing from user's favorites"""
         listing = self.get_object()
         favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
+            user_id=request.user.pk,
             material_listing=listing
         )
         
         if not created:
             # Already favorited, so remove it
             favorite.delete()
-            listing.favorites_count = max(0, listing.favorites_count - 1)
-            listing.save(update_fields=['favorites_count'])
+            bump_counter(listing, 'favorites_count', -1)
             return Response(
                 {'detail': 'Removed from favorites'},
                 status=status.HTTP_200_OK
             )
         else:
             # Newly favorited
-            listing.favorites_count += 1
-            listing.save(update_fields=['favorites_count'])
+            bump_counter(listing, 'favorites_count')
             return Response(
                 {'detail': 'Added to favorites'},
                 status=status.HTTP_201_CREATED
@@ -202,7 +343,7 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
     def reviews(self, request, pk=None):
         """Get reviews for this listing"""
         listing = self.get_object()
-        reviews = listing.reviews.filter(is_approved=True)
+        reviews = listing.reviews.filter(is_approved=True).select_related('reviewer', 'product')
         serializer = ReviewSerializer(reviews, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -212,7 +353,7 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
         listing = self.get_object()
         
         # Only owner can publish
-        if listing.seller != request.user:
+        if listing.seller_id != request.user.pk:
             return Response(
                 {'detail': 'You do not have permission to publish this listing'},
                 status=status.HTTP_403_FORBIDDEN
@@ -232,7 +373,7 @@ class MaterialListingViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Product CRUD operations
     - List all products (public)
@@ -240,10 +381,10 @@ class ProductViewSet(viewsets.ModelViewSet):
     - Create product (authenticated users)
     - Update/Delete (owner only)
     """
-    queryset = Product.objects.all().select_related(
-        'seller', 'category'
-    ).prefetch_related('images', 'reviews')
+    queryset = Product.objects.all().select_related('seller', 'category')
     permission_classes = [IsAuthenticatedOrReadOnly, IsSellerOrReadOnly]
+    query_budget = {'list': 3, 'retrieve': 4, 'my_products': 3, 'reviews': 2, 'default': 12}
+    replica_actions = ('list', 'retrieve', 'reviews')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'condition', 'status', 'seller']
     search_fields = ['title', 'title_ar', 'description', 'location']
@@ -259,6 +400,10 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queries.for_list(queryset, self.request.user)
+        elif self.action == 'retrieve':
+            queryset = queries.for_detail(queryset, self.request.user)
         
         # Filter by status for non-owners
         if self.action == 'list':
@@ -267,7 +412,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             else:
                 # Show user's own products regardless of status
                 queryset = queryset.filter(
-                    Q(status='active') | Q(seller=self.request.user)
+                    Q(status='active') | Q(seller_id=self.request.user.pk)
                 )
         
         # Filter by price range
@@ -284,8 +429,8 @@ class ProductViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Increment view count when retrieving a product"""
         instance = self.get_object()
+        bump_counter(instance, 'views_count')
         instance.views_count += 1
-        instance.save(update_fields=['views_count'])
         
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -293,7 +438,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_products(self, request):
         """Get current user's products"""
-        products = self.queryset.filter(seller=request.user)
+        products = queries.for_list(self.queryset.filter(seller_id=request.user.pk), request.user)
         page = self.paginate_queryset(products)
         
         if page is not None:
@@ -303,26 +448,43 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ProductListSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=False, methods=['patch'], permission_classes=[IsAuthenticated])
+    def inventory(self, request):
+        """Batch update price/quantity/status of the user's products"""
+        return inventory_update(request, Product)
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=EXPORT_RENDERERS
+    )
+    def export(self, request):
+        """Stream the current user's products (all products for staff) as CSV or JSON Lines"""
+        products = Product.objects.all()
+        if not request.user.is_staff:
+            products = products.filter(seller_id=request.user.pk)
+        products = self.filter_queryset(products)
+        return export_response(products, PRODUCT_COLUMNS, export_format(request), 'products')
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def toggle_favorite(self, request, pk=None):
         """Add or remove product from favorites"""
         product = self.get_object()
         favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
+            user_id=request.user.pk,
             product=product
         )
         
         if not created:
             favorite.delete()
-            product.favorites_count = max(0, product.favorites_count - 1)
-            product.save(update_fields=['favorites_count'])
+            bump_counter(product, 'favorites_count', -1)
             return Response({
                 'message': 'Product removed from favorites',
                 'is_favorited': False
             })
         else:
-            product.favorites_count += 1
-            product.save(update_fields=['favorites_count'])
+            bump_counter(product, 'favorites_count')
             return Response({
                 'message': 'Product added to favorites',
                 'is_favorited': True
@@ -332,7 +494,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     def reviews(self, request, pk=None):
         """Get all reviews for a product"""
         product = self.get_object()
-        reviews = product.reviews.filter(is_approved=True).select_related('reviewer')
+        reviews = product.reviews.filter(is_approved=True).select_related('reviewer', 'product')
         serializer = ReviewSerializer(reviews, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -341,7 +503,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         """Publish a draft product"""
         product = self.get_object()
         
-        if product.seller != request.user:
+        if product.seller_id != request.user.pk:
             return Response(
                 {'error': 'You can only publish your own products'},
                 status=status.HTTP_403_FORBIDDEN
@@ -372,27 +534,24 @@ class CartViewSet(viewsets.ModelViewSet):
     """
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 7, 'default': 14}
     
     def get_queryset(self):
         """Get or create user's cart"""
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return Cart.objects.filter(user=self.request.user).prefetch_related(
-            'items__product',
-            'items__material_listing',
-            'items__product__seller',
-            'items__material_listing__seller'
-        )
+        cart, created = Cart.objects.get_or_create(user_id=self.request.user.pk)
+        return Cart.objects.filter(user_id=self.request.user.pk).select_related(
+            'user'
+        ).prefetch_related(queries.cart_items(self.request.user))
     
     def list(self, request, *args, **kwargs):
         """Get current user's cart"""
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = self.get_serializer(cart)
+        serializer = self.get_serializer(self.get_queryset().get())
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def add_item(self, request):
         """Add item to cart"""
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart, created = Cart.objects.get_or_create(user_id=request.user.pk)
         
         data = request.data.copy()
         data['cart'] = cart.id
@@ -440,7 +599,7 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def update_item(self, request):
         """Update cart item quantity"""
-        cart = Cart.objects.get(user=request.user)
+        cart = Cart.objects.get(user_id=request.user.pk)
         item_id = request.data.get('item_id')
         quantity = request.data.get('quantity')
         
@@ -478,7 +637,7 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def remove_item(self, request):
         """Remove item from cart"""
-        cart = Cart.objects.get(user=request.user)
+        cart = Cart.objects.get(user_id=request.user.pk)
         item_id = request.data.get('item_id')
         
         if not item_id:
@@ -509,7 +668,7 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def clear(self, request):
         """Clear all items from cart"""
-        cart = Cart.objects.get(user=request.user)
+        cart = Cart.objects.get(user_id=request.user.pk)
         cart.items.all().delete()
         
         cart_serializer = CartSerializer(cart, context={'request': request})
@@ -528,11 +687,12 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     """
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 6, 'retrieve': 3, 'default': 6}
     
     def get_queryset(self):
         return Favorite.objects.filter(
-            user=self.request.user
-        ).select_related('product', 'product__seller', 'product__category')
+            user_id=self.request.user.pk
+        ).prefetch_related(*queries.item_prefetches(self.request.user))
     
     def create(self, request, *args, **kwargs):
         """Add product to favorites"""
@@ -541,7 +701,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         
         # Check if already favorited
         product_id = serializer.validated_data['product_id']
-        if Favorite.objects.filter(user=request.user, product_id=product_id).exists():
+        if Favorite.objects.filter(user_id=request.user.pk, product_id=product_id).exists():
             return Response(
                 {'error': 'Product already in favorites'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -550,9 +710,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         
         # Update product favorites count
-        product = Product.objects.get(id=product_id)
-        product.favorites_count += 1
-        product.save(update_fields=['favorites_count'])
+        bump_counter(serializer.instance.product, 'favorites_count')
         
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -563,8 +721,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         product = instance.product
         
         # Update product favorites count
-        product.favorites_count = max(0, product.favorites_count - 1)
-        product.save(update_fields=['favorites_count'])
+        bump_counter(product, 'favorites_count', -1)
         
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -576,6 +733,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 2, 'retrieve': 1, 'purchases': 2, 'sales': 2, 'default': 10}
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'payment_status']
     ordering_fields = ['created_at', 'total_price']
@@ -584,13 +742,13 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Users can only see their own orders (as buyer or seller)"""
         return Order.objects.filter(
-            Q(buyer=self.request.user) | Q(seller=self.request.user)
-        ).select_related('buyer', 'seller', 'product')
+            Q(buyer_id=self.request.user.pk) | Q(seller_id=self.request.user.pk)
+        ).select_related('buyer', 'seller', 'product', 'material_listing__material')
     
     @action(detail=False, methods=['get'])
     def purchases(self, request):
         """Get user's purchases (as buyer)"""
-        orders = self.get_queryset().filter(buyer=request.user)
+        orders = self.get_queryset().filter(buyer_id=request.user.pk)
         page = self.paginate_queryset(orders)
         
         if page is not None:
@@ -603,7 +761,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def sales(self, request):
         """Get user's sales (as seller)"""
-        orders = self.get_queryset().filter(seller=request.user)
+        orders = self.get_queryset().filter(seller_id=request.user.pk)
         page = self.paginate_queryset(orders)
         
         if page is not None:
@@ -613,12 +771,23 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(orders, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        """Stream the user's orders (all orders for staff) as CSV or JSON Lines"""
+        orders = Order.objects.all()
+        if not request.user.is_staff:
+            orders = orders.filter(
+                Q(buyer_id=request.user.pk) | Q(seller_id=request.user.pk)
+            )
+        orders = self.filter_queryset(orders)
+        return export_response(orders, ORDER_COLUMNS, export_format(request), 'orders')
+    
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """Confirm an order (seller only)"""
         order = self.get_object()
         
-        if order.seller != request.user:
+        if order.seller_id != request.user.pk:
             return Response(
                 {'error': 'Only seller can confirm orders'},
                 status=status.HTTP_403_FORBIDDEN
@@ -642,7 +811,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Mark order as completed (seller only)"""
         order = self.get_object()
         
-        if order.seller != request.user:
+        if order.seller_id != request.user.pk:
             return Response(
                 {'error': 'Only seller can complete orders'},
                 status=status.HTTP_403_FORBIDDEN
@@ -673,7 +842,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = self.get_object()
         
         # Both buyer and seller can cancel
-        if order.buyer != request.user and order.seller != request.user:
+        if order.buyer_id != request.user.pk and order.seller_id != request.user.pk:
             return Response(
                 {'error': 'You are not authorized to cancel this order'},
                 status=status.HTTP_403_FORBIDDEN
@@ -692,12 +861,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Product Reviews
     """
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    query_budget = {'list': 2, 'retrieve': 1, 'my_reviews': 1, 'default': 6}
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['product', 'rating']
     ordering_fields = ['created_at', 'rating']
@@ -705,7 +875,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = Review.objects.filter(is_approved=True).select_related(
-            'reviewer', 'product'
+            'reviewer', 'product', 'material_listing'
         )
         
         # Filter by product if specified
@@ -718,7 +888,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_reviews(self, request):
         """Get current user's reviews"""
-        reviews = Review.objects.filter(reviewer=request.user)
+        reviews = Review.objects.filter(reviewer_id=request.user.pk).select_related(
+            'reviewer', 'product', 'material_listing'
+        )
         serializer = self.get_serializer(reviews, many=True)
         return Response(serializer.data)
 
@@ -729,6 +901,9 @@ class MessageViewSet(viewsets.ModelViewSet):
     """
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {
+        'list': 2, 'retrieve': 1, 'inbox': 2, 'sent': 2, 'unread_count': 2, 'default': 6
+    }
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at']
     ordering = ['-created_at']
@@ -736,13 +911,13 @@ class MessageViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Get messages sent to or by the current user"""
         return Message.objects.filter(
-            Q(sender=self.request.user) | Q(recipient=self.request.user)
-        ).select_related('sender', 'recipient', 'product')
+            Q(sender_id=self.request.user.pk) | Q(recipient_id=self.request.user.pk)
+        ).select_related('sender', 'recipient', 'product', 'material_listing')
     
     @action(detail=False, methods=['get'])
     def inbox(self, request):
         """Get received messages"""
-        messages = self.get_queryset().filter(recipient=request.user)
+        messages = self.get_queryset().filter(recipient_id=request.user.pk)
         page = self.paginate_queryset(messages)
         
         if page is not None:
@@ -755,7 +930,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def sent(self, request):
         """Get sent messages"""
-        messages = self.get_queryset().filter(sender=request.user)
+        messages = self.get_queryset().filter(sender_id=request.user.pk)
         page = self.paginate_queryset(messages)
         
         if page is not None:
@@ -770,7 +945,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         """Mark message as read"""
         message = self.get_object()
         
-        if message.recipient != request.user:
+        if message.recipient_id != request.user.pk:
             return Response(
                 {'error': 'You can only mark your own messages as read'},
                 status=status.HTTP_403_FORBIDDEN
@@ -787,11 +962,49 @@ class MessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get count of unread messages"""
-        count = self.get_queryset().filter(
-            recipient=request.user,
-            is_read=False
-        ).count()
-        return Response({'unread_count': count})
+        snapshot = get_snapshot(request.user)
+        return Response({'unread_count': snapshot['unread_count']})
+    
+    @action(detail=False, methods=['get'])
+    def poll(self, request):
+        """
+        Long-poll for unread count / order changes.
+        Pass the last seen `since` version; the request blocks until it changes
+        or `timeout` seconds pass. Returns the current snapshot, or 304 Not
+        Modified when nothing changed before the timeout.
+        """
+        since = parse_version(request.query_params.get('since'))
+        timeout = settings.NOTIFICATIONS_LONGPOLL_TIMEOUT
+        requested = parse_version(request.query_params.get('timeout'))
+        if requested is not None:
+            timeout = max(0, min(requested, timeout))
+        
+        if since is not None and wait_for_change(request.user.pk, since, timeout) == since:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        
+        return Response(get_snapshot(request.user))
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        renderer_classes=[EventStreamRenderer, JSONRenderer]
+    )
+    def stream(self, request):
+        """
+        Server-Sent Events stream of unread count / order changes.
+        Closes after NOTIFICATIONS_SYNC_STREAM_DURATION; clients reconnect with
+        Last-Event-ID. The async view (ASYNC_VIEWS) keeps streams open longer.
+        """
+        since = parse_version(
+            request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('since')
+        )
+        response = StreamingHttpResponse(
+            event_stream(request.user, since),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 
 class ReportViewSet(viewsets.ModelViewSet):
@@ -800,21 +1013,48 @@ class ReportViewSet(viewsets.ModelViewSet):
     """
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 2, 'retrieve': 1, 'my_reports': 1, 'default': 6}
     
     def get_queryset(self):
         queryset = Report.objects.all().select_related(
-            'reporter', 'product', 'resolved_by'
+            'reporter', 'product', 'material_listing', 'resolved_by'
         )
         
         # Regular users can only see their own reports
         if not self.request.user.is_staff:
-            queryset = queryset.filter(reporter=self.request.user)
+            queryset = queryset.filter(reporter_id=self.request.user.pk)
         
         return queryset
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_reports(self, request):
         """Get current user's reports"""
-        reports = Report.objects.filter(reporter=request.user)
+        reports = Report.objects.filter(reporter_id=request.user.pk).select_related(
+            'reporter', 'product', 'material_listing', 'resolved_by'
+        )
         serializer = self.get_serializer(reports, many=True)
         return Response(serializer.data)
+
+
+class SellerViewSet(viewsets.ViewSet):
+    """
+    Public seller profiles
+    - Retrieve user, profile and seller stats
+    """
+    permission_classes = [AllowAny]
+    query_budget = 3
+
+    def retrieve(self, request, pk=None):
+        """Get a seller's public profile"""
+        try:
+            seller_id = uuid.UUID(str(pk))
+        except ValueError:
+            seller_id = None
+
+        data = get_seller_profile(seller_id, request) if seller_id else None
+        if data is None:
+            return Response(
+                {'error': 'Seller not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(data)
@@ -0,0 +1,203 @@
+"""
+Concurrent-connection capacity: WSGI vs ASGI.
+
+Opens N notification long-polls at once (each one waits for the full
+timeout, like an idle browser tab) and, while they are held, times a
+cheap catalog request every PROBE_INTERVAL seconds. A sync WSGI server
+can hold only as many long-polls as it has worker threads; everything
+else, probes included, queues behind them. An ASGI server with
+ASYNC_VIEWS=True parks the long-polls on the event loop and keeps
+answering probes.
+
+Standard library only. Run it once per deployment with the same numbers:
+
+    python jaddid/manage.py issue_tokens --users 200 > loadtest/tokens.json
+
+    gunicorn jaddid.wsgi -w 4 --chdir jaddid &
+    python loadtest/concurrency.py --label "gunicorn -w 4" -c 500
+
+    ASYNC_VIEWS=True gunicorn jaddid.asgi -w 4 -k uvicorn.workers.UvicornWorker --chdir jaddid &
+    python loadtest/concurrency.py --label "uvicorn -w 4" -c 500
+
+Raise the open file limit (ulimit -n) on both sides for large -c values.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from urllib.parse import urlencode, urlsplit
+
+
+API = '/api/marketplace'
+TOKENS_FILE = os.getenv('LOADTEST_TOKENS', os.path.join(os.path.dirname(__file__), 'tokens.json'))
+
+
+class HTTPError(Exception):
+    pass
+
+
+def dechunk(body):
+    """Decode a chunked transfer-encoded body"""
+    data = b''
+    while body:
+        size, _, body = body.partition(b'\r\n')
+        size = int(size.split(b';')[0], 16)
+        if not size:
+            break
+        data, body = data + body[:size], body[size + 2:]
+    return data
+
+
+async def get(host, path, token=None, timeout=None):
+    """Minimal HTTP/1.1 GET on a fresh connection; returns (status, body)"""
+    parts = urlsplit(host)
+    secure = parts.scheme == 'https'
+
+    async def request():
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or (443 if secure else 80), ssl=secure or None
+        )
+        try:
+            lines = [
+                f'GET {path} HTTP/1.1',
+                f'Host: {parts.netloc}',
+                'Accept: application/json',
+                'Connection: close',
+            ]
+            if token:
+                lines.append(f'Authorization: Bearer {token}')
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('ascii'))
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    raw = await asyncio.wait_for(request(), timeout)
+    head, _, body = raw.partition(b'\r\n\r\n')
+    try:
+        status = int(head.split(b' ', 2)[1])
+    except (IndexError, ValueError):
+        raise HTTPError('malformed response')
+    if b'transfer-encoding: chunked' in head.lower():
+        body = dechunk(body)
+    return status, body
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(timings):
+    if not timings:
+        return None
+    return {
+        'p50_ms': round(percentile(timings, 50) * 1000, 1),
+        'p95_ms': round(percentile(timings, 95) * 1000, 1),
+        'max_ms': round(max(timings) * 1000, 1),
+    }
+
+
+async def current_versions(host, tokens):
+    """The notification version of every account, so long-polls really wait"""
+    versions = {}
+    for account in tokens:
+        status, body = await get(host, f'{API}/messages/poll/', account['access'], timeout=30)
+        if status != 200:
+            raise HTTPError(f'poll returned {status}; are the tokens still valid?')
+        versions[account['id']] = json.loads(body)['version']
+    return versions
+
+
+async def long_poll(host, account, version, hold, deadline):
+    query = urlencode({'since': version, 'timeout': hold})
+    start = time.perf_counter()
+    try:
+        status, _ = await get(host, f'{API}/messages/poll/?{query}', account['access'], timeout=deadline)
+    except asyncio.TimeoutError:
+        return 'timed_out', None
+    except (OSError, HTTPError):
+        return 'failed', None
+    # 304: the hold period passed with nothing new
+    return ('completed' if status in (200, 304) else 'failed'), time.perf_counter() - start
+
+
+async def probe(host, path, interval, stop, timings, failures):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status, _ = await get(host, path, timeout=interval * 20)
+            if status == 200:
+                timings.append(time.perf_counter() - start)
+            else:
+                failures.append(status)
+        except (asyncio.TimeoutError, OSError, HTTPError) as e:
+            failures.append(type(e).__name__)
+        await asyncio.sleep(interval)
+
+
+async def run(options):
+    with open(options.tokens, encoding='utf-8') as f:
+        tokens = json.load(f)
+    versions = await current_versions(options.host, tokens)
+
+    probe_timings, probe_failures = [], []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(
+        options.host, options.probe_path, options.probe_interval,
+        stop, probe_timings, probe_failures
+    ))
+
+    # A long-poll that is not answered within three hold periods was queued, not held
+    deadline = options.hold * 3
+    start = time.perf_counter()
+    polls = await asyncio.gather(*(
+        long_poll(options.host, account, versions[account['id']], options.hold, deadline)
+        for account in (tokens[i % len(tokens)] for i in range(options.connections))
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+
+    outcomes = [outcome for outcome, _ in polls]
+    durations = [duration for _, duration in polls if duration is not None]
+    return {
+        'label': options.label,
+        'connections': options.connections,
+        'hold_seconds': options.hold,
+        'elapsed_seconds': round(elapsed, 1),
+        'long_polls': {
+            'completed': outcomes.count('completed'),
+            # answered within one hold period + 50%, i.e. held concurrently
+            'held': sum(1 for duration in durations if duration < options.hold * 1.5),
+            'timed_out': outcomes.count('timed_out'),
+            'failed': outcomes.count('failed'),
+            'latency': summarize(durations),
+        },
+        'probes': {
+            'completed': len(probe_timings),
+            'failed': len(probe_failures),
+            'latency': summarize(probe_timings),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='http://localhost:8000')
+    parser.add_argument('-c', '--connections', type=int, default=200)
+    parser.add_argument('--hold', type=int, default=20, help='Long-poll timeout in seconds')
+    parser.add_argument('--probe-path', default=f'{API}/categories/')
+    parser.add_argument('--probe-interval', type=float, default=0.5)
+    parser.add_argument('--tokens', default=TOKENS_FILE)
+    parser.add_argument('--label', default=os.getenv('LOADTEST_LABEL', ''))
+    options = parser.parse_args()
+    print(json.dumps(asyncio.run(run(options)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
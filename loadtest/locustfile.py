@@ -0,0 +1,243 @@
+"""
+Concurrent load test of the main marketplace journeys.
+
+Buyers browse, search, open listings, favorite them, add them to the cart,
+check out and message the seller; sellers poll their sales and confirm
+pending orders. Detail, favorite and cart traffic is concentrated on a
+small set of "hot" items, so views_count/favorites_count updates, cart
+rows and order creation contend the way they do on a busy day.
+
+Run against a seeded database (see the README):
+
+    python jaddid/manage.py issue_tokens --users 500 > loadtest/tokens.json
+    locust -f loadtest/locustfile.py --host http://localhost:8000 \
+        --headless -u 200 -r 20 -t 5m --csv loadtest/results/run
+
+Locust reports throughput and error rates. With LOADTEST_DB_* (or the
+app's DB_*) variables set, PostgreSQL sessions waiting on locks are
+sampled every second and summarized when the run stops.
+"""
+import json
+import os
+import random
+import time
+
+import gevent
+from locust import HttpUser, between, events, task
+from locust.runners import MasterRunner, WorkerRunner
+
+
+API = '/api/marketplace'
+TOKENS_FILE = os.getenv('LOADTEST_TOKENS', os.path.join(os.path.dirname(__file__), 'tokens.json'))
+HOT_ITEMS = int(os.getenv('LOADTEST_HOT_ITEMS', '20'))
+LOCK_SAMPLE_INTERVAL = float(os.getenv('LOADTEST_LOCK_SAMPLE_INTERVAL', '1'))
+
+with open(TOKENS_FILE, encoding='utf-8') as f:
+    TOKENS = json.load(f)
+
+
+def results(response):
+    data = response.json()
+    return data.get('results', []) if isinstance(data, dict) else data
+
+
+def seller_id(item):
+    seller = item.get('seller')
+    return seller.get('id') if isinstance(seller, dict) else seller
+
+
+class MarketplaceUser(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        account = random.choice(TOKENS)
+        self.user_id = account['id']
+        self.client.headers['Authorization'] = f"Bearer {account['access']}"
+
+
+class Buyer(MarketplaceUser):
+    weight = 9
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        super().on_start()
+        self.listings = []
+
+    def hot_listing(self):
+        if not self.listings:
+            self.browse()
+        return random.choice(self.listings[:HOT_ITEMS]) if self.listings else None
+
+    @task(6)
+    def browse(self):
+        with self.client.get(f'{API}/material-listings/', name='browse listings', catch_response=True) as response:
+            if response.ok:
+                self.listings = results(response) or self.listings
+        self.client.get(f'{API}/products/', name='browse products')
+
+    @task(3)
+    def search(self):
+        term = random.choice(['Listing', 'Listing 1', 'Product 2', 'Cairo'])
+        self.client.get(f'{API}/material-listings/', params={'search': term}, name='search listings')
+
+    @task(5)
+    def view_detail(self):
+        item = self.hot_listing()
+        if item:
+            self.client.get(f"{API}/material-listings/{item['id']}/", name='listing detail')
+
+    @task(2)
+    def favorite(self):
+        item = self.hot_listing()
+        if item:
+            self.client.post(
+                f"{API}/material-listings/{item['id']}/toggle_favorite/", name='toggle favorite'
+            )
+
+    @task(2)
+    def add_to_cart(self):
+        item = self.hot_listing()
+        if item:
+            self.client.post(f'{API}/cart/add_item/', json={
+                'material_listing_id': item['id'],
+                'quantity': 1,
+            }, name='add to cart')
+
+    @task(1)
+    def checkout(self):
+        item = self.hot_listing()
+        if not item or seller_id(item) == self.user_id:
+            return
+        self.client.post(f'{API}/orders/', json={
+            'material_listing_id': item['id'],
+            'quantity': 1,
+            'delivery_address': 'Load test',
+        }, name='checkout')
+
+    @task(1)
+    def message_seller(self):
+        item = self.hot_listing()
+        if not item or seller_id(item) == self.user_id:
+            return
+        self.client.post(f'{API}/messages/', json={
+            'recipient_id': seller_id(item),
+            'material_listing_id': item['id'],
+            'subject': 'Is this still available?',
+            'message': 'Load test message',
+        }, name='message seller')
+
+    @task(2)
+    def notifications(self):
+        self.client.get(f'{API}/messages/unread_count/', name='unread count')
+
+
+class Seller(MarketplaceUser):
+    weight = 1
+    wait_time = between(2, 5)
+
+    @task(3)
+    def sales(self):
+        self.client.get(f'{API}/orders/sales/', name='seller sales')
+
+    @task(1)
+    def confirm_pending(self):
+        response = self.client.get(
+            f'{API}/orders/sales/', params={'status': 'pending'}, name='seller pending sales'
+        )
+        if not response.ok:
+            return
+        for order in results(response)[:1]:
+            self.client.post(f"{API}/orders/{order['id']}/confirm/", name='confirm order')
+
+
+class LockSampler:
+    """Samples pg_stat_activity for sessions waiting on heavyweight locks"""
+
+    QUERY = """
+        SELECT count(*) FILTER (WHERE wait_event_type = 'Lock'),
+               count(*) FILTER (WHERE state = 'active')
+        FROM pg_stat_activity
+        WHERE datname = current_database() AND pid <> pg_backend_pid()
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.greenlet = None
+
+    @staticmethod
+    def connect():
+        import psycopg2
+
+        def env(name, default=None):
+            return os.getenv(f'LOADTEST_{name}', os.getenv(name, default))
+
+        return psycopg2.connect(
+            dbname=env('DB_NAME'), user=env('DB_USER'), password=env('DB_PASSWORD'),
+            host=env('DB_HOST'), port=env('DB_PORT', '5432'),
+        )
+
+    def start(self):
+        if not (os.getenv('LOADTEST_DB_NAME') or os.getenv('DB_NAME')):
+            return
+        connection = self.connect()
+        connection.autocommit = True
+
+        def loop():
+            with connection, connection.cursor() as cursor:
+                while True:
+                    cursor.execute(self.QUERY)
+                    waiting, active = cursor.fetchone()
+                    self.samples.append((time.time(), waiting, active))
+                    gevent.sleep(LOCK_SAMPLE_INTERVAL)
+
+        self.greenlet = gevent.spawn(loop)
+
+    def stop(self):
+        if self.greenlet is None:
+            return None
+        self.greenlet.kill()
+        if not self.samples:
+            return None
+
+        waiting = [sample[1] for sample in self.samples]
+        active = [sample[2] for sample in self.samples]
+        return {
+            'samples': len(self.samples),
+            'lock_waiting_max': max(waiting),
+            'lock_waiting_mean': round(sum(waiting) / len(waiting), 2),
+            'samples_with_lock_waits': sum(1 for value in waiting if value),
+            'active_sessions_max': max(active),
+        }
+
+
+sampler = LockSampler()
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    # Sample once per run, not once per distributed worker
+    if not isinstance(environment.runner, WorkerRunner):
+        sampler.start()
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner):
+        return
+
+    total = environment.stats.total
+    summary = {
+        # e.g. "gunicorn -w 4", to tell runs across worker counts apart
+        'label': os.getenv('LOADTEST_LABEL'),
+        'requests': total.num_requests,
+        'failures': total.num_failures,
+        'error_rate': round(total.fail_ratio, 4),
+        'rps': round(total.total_rps, 2),
+        'p50_ms': total.get_response_time_percentile(0.5),
+        'p95_ms': total.get_response_time_percentile(0.95),
+        'p99_ms': total.get_response_time_percentile(0.99),
+        'lock_waits': sampler.stop(),
+    }
+    if isinstance(environment.runner, MasterRunner):
+        summary['workers'] = environment.runner.worker_count
+    print(json.dumps(summary, indent=2))